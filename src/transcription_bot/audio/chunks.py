@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+from itertools import pairwise
+from pathlib import Path
+
+import ffmpeg
+
+from transcription_bot.audio.preprocess import CODECS, SAMPLE_RATE
+from transcription_bot.audio.run import run_ffmpeg
+from transcription_bot.audio.vad import Interval
+from transcription_bot.types import AudioCodec
+
+_SEARCH_WINDOW = 0.25
+"""Fraction of the chunk length either side of the target cut point searched for a silence."""
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A piece of a longer recording, transcribed on its own."""
+
+    start: float
+    end: float
+
+    core_start: float
+    core_end: float
+    """Segments are taken from this chunk only within its core. Outside the core, the chunk overlaps its neighbours."""
+
+
+def plan_cuts(duration: float, silences: list[Interval], chunk_s: float) -> list[float]:
+    """
+    Choose where to cut a recording into pieces of about `chunk_s` seconds.
+
+    Each cut is placed in the middle of the longest silence near the target cut point, or at the target if there is none.
+    The last piece may be up to 50% longer than `chunk_s`, to avoid a very short one.
+    """
+    cuts = []
+    position = 0.0
+    while duration - position > chunk_s * 1.5:
+        target = position + chunk_s
+        low, high = target - chunk_s * _SEARCH_WINDOW, target + chunk_s * _SEARCH_WINDOW
+        nearby = [(s, e) for s, e in silences if low <= (s + e) / 2 <= high]
+        if nearby:
+            start, end = max(nearby, key=lambda silence: silence[1] - silence[0])
+            position = (start + end) / 2
+        else:
+            position = target
+        cuts.append(position)
+    return cuts
+
+
+def plan_chunks(
+    duration: float, silences: list[Interval], chunk_s: float, overlap_s: float
+) -> list[Chunk]:
+    """Split a recording into chunks cut at silences, which overlap their neighbours by `overlap_s` seconds."""
+    bounds = [0.0, *plan_cuts(duration, silences, chunk_s), duration]
+    half = overlap_s / 2
+    return [
+        Chunk(
+            start=max(0.0, core_start - half),
+            end=min(duration, core_end + half),
+            core_start=core_start,
+            core_end=core_end,
+        )
+        for core_start, core_end in pairwise(bounds)
+    ]
+
+
+async def _cut(
+    source: Path, destination: Path, start: float, end: float, codec: AudioCodec
+) -> Path:
+    destination.parent.mkdir(exist_ok=True)
+    await run_ffmpeg(
+        ffmpeg.input(str(source), ss=start, t=end - start)
+        .audio.output(str(destination), ac=1, ar=SAMPLE_RATE, **CODECS[codec][1])
+        .overwrite_output()
+    )
+    return destination
+
+
+async def cut_audio(source: Path, chunk: Chunk, index: int, codec: AudioCodec) -> Path:
+    """
+    Cut a chunk out of an audio file, as mono 16 kHz audio.
+
+    The output is written to a subdirectory next to `source`.
+    """
+    suffix = CODECS[codec][0]
+    destination = source.parent / "chunks" / f"{source.stem}_{index:03d}{suffix}"
+    return await _cut(source, destination, chunk.start, chunk.end, codec)
+
+
+async def cut_start(source: Path, duration: float, codec: AudioCodec) -> Path:
+    """
+    Cut the first `duration` seconds of an audio file, as mono 16 kHz audio, e.g. to probe its language.
+
+    The output is written to a subdirectory next to `source`.
+    """
+    destination = source.parent / "probe" / f"{source.stem}{CODECS[codec][0]}"
+    return await _cut(source, destination, 0, duration, codec)
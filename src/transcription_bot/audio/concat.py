@@ -0,0 +1,43 @@
+from itertools import accumulate
+from pathlib import Path
+
+import ffmpeg
+
+from transcription_bot.audio.preprocess import CODECS, SAMPLE_RATE
+from transcription_bot.audio.run import run_ffmpeg
+from transcription_bot.types import AudioCodec
+
+
+def part_offsets(durations: list[float], gap_s: float) -> list[float]:
+    """Return where each recording starts in the audio joined by `join_audio`."""
+    return list(accumulate((d + gap_s for d in durations[:-1]), initial=0.0))
+
+
+async def join_audio(
+    sources: list[Path],
+    durations: list[float],
+    destination_dir: Path,
+    codec: AudioCodec,
+    gap_s: float,
+) -> Path:
+    """
+    Join recordings into one mono 16 kHz file, separated by `gap_s` of silence.
+
+    Each recording is padded or trimmed to exactly its duration plus the gap, so they start at `part_offsets`.
+    """
+    suffix, options = CODECS[codec]
+    destination = destination_dir / f"joined{suffix}"
+    streams = [
+        ffmpeg.input(str(source))
+        .audio.filter("aresample", SAMPLE_RATE)
+        .filter("aformat", channel_layouts="mono")
+        .filter("apad", whole_dur=duration + gap_s)
+        .filter("atrim", end=duration + gap_s)
+        for source, duration in zip(sources, durations, strict=True)
+    ]
+    await run_ffmpeg(
+        ffmpeg.concat(*streams, v=0, a=1)
+        .output(str(destination), ac=1, ar=SAMPLE_RATE, **options)
+        .overwrite_output()
+    )
+    return destination
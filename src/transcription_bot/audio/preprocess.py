@@ -0,0 +1,126 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import ffmpeg
+
+from transcription_bot.audio.run import probe, run_ffmpeg
+from transcription_bot.audio.vad import (
+    Interval,
+    OffsetMap,
+    VadOptions,
+    detect_silences,
+    select_filter_expr,
+    speech_intervals,
+)
+from transcription_bot.types import AudioCodec
+
+_logger = logging.getLogger(__name__)
+
+CODECS: dict[AudioCodec, tuple[str, dict[str, Any]]] = {
+    "opus": (".ogg", {"acodec": "libopus", "audio_bitrate": "32k"}),
+    "flac": (".flac", {"acodec": "flac"}),
+}
+"""File suffix and ffmpeg output options for each codec."""
+
+SAMPLE_RATE = 16000
+"""Whisper resamples everything to 16 kHz mono, so anything more is wasted bytes."""
+
+
+def has_video_stream(probe: dict[str, Any]) -> bool:
+    """Return whether the ffprobe output contains a video stream. Cover art in audio files is not counted."""
+    return any(
+        stream["codec_type"] == "video"
+        and not stream.get("disposition", {}).get("attached_pic")
+        for stream in probe["streams"]
+    )
+
+
+def should_extract_audio(probe: dict[str, Any], size: int, min_bytes: int) -> bool:
+    """Extract audio from videos, or from audio files of at least `min_bytes`. Small audio files are uploaded as-is."""
+    return has_video_stream(probe) or size >= min_bytes
+
+
+@dataclass(frozen=True)
+class PreparedAudio:
+    """Audio ready for upload."""
+
+    path: Path
+
+    offset_map: OffsetMap | None = None
+    """Set if silences were trimmed, to map transcript timestamps back to the original file."""
+
+
+async def extract_audio(
+    source: Path, codec: AudioCodec, keep: list[Interval] | None = None
+) -> Path:
+    """
+    Demux the audio track of a media file and transcode it to mono 16 kHz audio.
+
+    `keep`: If provided, only these intervals of the audio are kept.
+
+    The output is written to a subdirectory next to `source`, keeping the same stem.
+    """
+    suffix, options = CODECS[codec]
+    destination = source.parent / "audio" / f"{source.stem}{suffix}"
+    destination.parent.mkdir(exist_ok=True)
+    stream = ffmpeg.input(str(source)).audio
+    if keep:
+        stream = stream.filter("aselect", select_filter_expr(keep)).filter(
+            "asetpts", "N/SR/TB"
+        )
+    await run_ffmpeg(
+        stream.output(
+            str(destination), ac=1, ar=SAMPLE_RATE, **options
+        ).overwrite_output()
+    )
+    return destination
+
+
+async def _detect_speech(
+    source: Path, description: dict[str, Any], vad: VadOptions
+) -> list[Interval] | None:
+    """Return the intervals to keep, or None if there is no silence worth trimming."""
+    duration = float(description["format"]["duration"])
+    silences = await detect_silences(source, duration, vad)
+    keep = speech_intervals(silences, duration, vad.keep_silence_s)
+    if keep == [(0.0, duration)]:
+        return None
+    _logger.info(
+        "Trimming silences from %s: %.1fs -> %.1fs",
+        source,
+        duration,
+        sum(end - start for start, end in keep),
+    )
+    return keep
+
+
+async def preprocess_audio(
+    source: Path,
+    codec: AudioCodec,
+    min_bytes: int,
+    vad: VadOptions | None = None,
+) -> PreparedAudio:
+    """
+    Extract and compress the audio track of a media file, if it is worthwhile.
+
+    `vad`: If provided, silences are shortened as well.
+
+    Returns the audio to upload: either the compressed audio, or `source` if it is already small audio without silences to trim.
+    """
+    description = await probe(source)
+    keep = await _detect_speech(source, description, vad) if vad else None
+    size = source.stat().st_size
+    if not keep and not should_extract_audio(description, size, min_bytes):
+        _logger.info("Skipping audio extraction for %s (%s bytes)", source, size)
+        return PreparedAudio(source)
+
+    destination = await extract_audio(source, codec, keep)
+    _logger.info(
+        "Extracted audio from %s: %s -> %s bytes",
+        source,
+        size,
+        destination.stat().st_size,
+    )
+    return PreparedAudio(destination, OffsetMap(keep) if keep else None)
@@ -0,0 +1,61 @@
+"""
+Run ffmpeg and ffprobe as asynchronous subprocesses.
+
+They are separate processes already, so they need no process pool to keep the event loop responsive.
+"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+import ffmpeg
+
+
+async def _communicate(args: list[str]) -> tuple[bytes, bytes]:
+    """
+    Run a command, and return its stdout and stderr. The process is killed if cancelled.
+
+    Raises `ffmpeg.Error` if it fails, or `FileNotFoundError` if the binary is missing.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode:
+        raise ffmpeg.Error(args[0], stdout, stderr)
+    return stdout, stderr
+
+
+async def run_ffmpeg(stream: Any) -> str:
+    """Run an ffmpeg-python output stream, and return ffmpeg's log."""
+    _, stderr = await _communicate([str(arg) for arg in ffmpeg.compile(stream)])
+    return stderr.decode(errors="replace")
+
+
+async def probe(source: Path | str) -> dict[str, Any]:
+    """Return ffprobe's description of the format and streams of a media file, either a local path or a URL."""
+    stdout, _ = await _communicate(
+        [
+            "ffprobe",
+            "-show_format",
+            "-show_streams",
+            "-of",
+            "json",
+            str(source),
+        ]
+    )
+    return json.loads(stdout)
+
+
+async def get_duration_s(source: Path | str) -> float:
+    """Return the duration of a media file, either a local path or a URL."""
+    return float((await probe(source))["format"]["duration"])
@@ -0,0 +1,121 @@
+import bisect
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from itertools import accumulate
+from pathlib import Path
+
+import ffmpeg
+
+from transcription_bot.audio.run import run_ffmpeg
+
+type Interval = tuple[float, float]
+"""(start, end) in seconds."""
+
+_SILENCE_START = re.compile(r"silence_start: (?P<t>-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end: (?P<t>-?[\d.]+)")
+
+
+@dataclass(frozen=True)
+class VadOptions:
+    """Options for silence detection with ffmpeg's silencedetect filter."""
+
+    noise_db: float = -35
+    """Audio quieter than this is considered silence."""
+
+    min_silence_s: float = 2
+    """Silences shorter than this are kept."""
+
+    keep_silence_s: float = 0.5
+    """Detected silences are shortened to this length, rather than removed completely."""
+
+
+@dataclass(frozen=True)
+class OffsetMap:
+    """
+    Maps timestamps in trimmed audio back to timestamps in the original audio.
+
+    The trimmed audio is the kept `intervals` of the original audio, concatenated.
+    """
+
+    intervals: list[Interval]
+    """Kept intervals, in original time."""
+
+    @cached_property
+    def _trimmed_starts(self) -> list[float]:
+        """Where each interval starts in trimmed time."""
+        return list(
+            accumulate((end - start for start, end in self.intervals[:-1]), initial=0.0)
+        )
+
+    @property
+    def trimmed_duration(self) -> float:
+        """Length of the trimmed audio."""
+        return sum(end - start for start, end in self.intervals)
+
+    def to_original(self, t: float) -> float:
+        """Convert a timestamp in the trimmed audio to one in the original audio."""
+        if not self.intervals:
+            return t
+        starts = self._trimmed_starts
+        i = max(0, bisect.bisect_right(starts, t) - 1)
+        start, end = self.intervals[i]
+        return min(start + (t - starts[i]), end)
+
+
+def parse_silencedetect(stderr: str, duration: float) -> list[Interval]:
+    """Parse the silences logged by ffmpeg's silencedetect filter. A silence still open at the end lasts until `duration`."""
+    silences = []
+    start = None
+    for line in stderr.splitlines():
+        if match := _SILENCE_START.search(line):
+            start = max(0.0, float(match["t"]))
+        elif (match := _SILENCE_END.search(line)) and start is not None:
+            silences.append((start, float(match["t"])))
+            start = None
+    if start is not None:
+        silences.append((start, duration))
+    return silences
+
+
+def speech_intervals(
+    silences: list[Interval], duration: float, keep_silence_s: float
+) -> list[Interval]:
+    """
+    Return the intervals to keep, after shortening each silence to `keep_silence_s`.
+
+    Half of the kept silence stays on each side of the speech around it. Leading and trailing silences are removed completely.
+    """
+    pad = keep_silence_s / 2
+    kept = []
+    position = 0.0
+    for start, end in silences:
+        cut_start = start + pad if start > 0 else 0.0
+        cut_end = end - pad if end < duration else duration
+        if cut_end <= cut_start:
+            continue
+        if cut_start > position:
+            kept.append((position, cut_start))
+        position = cut_end
+    if position < duration:
+        kept.append((position, duration))
+    return kept
+
+
+async def detect_silences(
+    source: Path, duration: float, options: VadOptions
+) -> list[Interval]:
+    """Detect silences in a media file."""
+    log = await run_ffmpeg(
+        ffmpeg.input(str(source))
+        .audio.filter(
+            "silencedetect", noise=f"{options.noise_db}dB", d=options.min_silence_s
+        )
+        .output("-", format="null")
+    )
+    return parse_silencedetect(log, duration)
+
+
+def select_filter_expr(intervals: list[Interval]) -> str:
+    """Return an aselect filter expression keeping only `intervals`."""
+    return "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in intervals)
@@ -0,0 +1,253 @@
+import json
+import sqlite3
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Literal
+
+from transcription_bot.audio.chunks import Chunk
+from transcription_bot.audio.vad import OffsetMap
+from transcription_bot.cache.sqlite import SqliteStore
+from transcription_bot.transcribers.chunked import UploadedChunk
+from transcription_bot.transcribers.router import Backend
+
+type JobStage = Literal["download", "transcription", "minutes"]
+
+
+@dataclass(frozen=True)
+class StoredJob:
+    """A job which had not finished when it was last saved."""
+
+    chat_id: int
+    message_id: int
+    """The message with the file."""
+    reply_msg_id: int
+    """The message showing the job's progress."""
+    stage: JobStage
+    cache_key: str | None
+    filename: str | None
+    url: str | None
+    """URL of the uploaded file, once uploaded."""
+    offset_map: OffsetMap | None
+    backend: Backend
+    """Backend the file is transcribed with, to re-attach to its predictions with the same transcriber."""
+    chunks: list[UploadedChunk]
+    predictions: list[str | None]
+    """Id of the prediction for each chunk, or for the whole file. None for chunks not sent yet."""
+    hedges: list[str]
+    """Ids of the hedges of those predictions, which are not re-attached to."""
+    transcript: str | None
+    """Set once the transcript has been sent, while minutes are generated."""
+
+
+def _dump_chunks(chunks: list[UploadedChunk]) -> str:
+    return json.dumps([{"url": c.url, "chunk": asdict(c.chunk)} for c in chunks])
+
+
+def _load_chunks(data: str) -> list[UploadedChunk]:
+    return [UploadedChunk(c["url"], Chunk(**c["chunk"])) for c in json.loads(data)]
+
+
+def _load_job(row: sqlite3.Row) -> StoredJob:
+    return StoredJob(
+        chat_id=row["chat_id"],
+        message_id=row["message_id"],
+        reply_msg_id=row["reply_msg_id"],
+        stage=row["stage"],
+        cache_key=row["cache_key"],
+        filename=row["filename"],
+        url=row["url"],
+        offset_map=OffsetMap([tuple(i) for i in json.loads(row["offset_map"])])
+        if row["offset_map"]
+        else None,
+        backend=row["backend"],
+        chunks=_load_chunks(row["chunks"]),
+        predictions=json.loads(row["predictions"]),
+        hedges=json.loads(row["hedges"]),
+        transcript=row["transcript"],
+    )
+
+
+class JobStore(SqliteStore):
+    """
+    Jobs in progress, keyed by the message with the file.
+
+    Predictions keep running on Replicate if the bot restarts, so they are saved to be re-attached to on startup.
+    Jobs which joined another request's job are attached to its owner, so they follow the owner's upload and predictions.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        chat_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        reply_msg_id INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        cache_key TEXT,
+        filename TEXT,
+        url TEXT,
+        offset_map TEXT,
+        backend TEXT NOT NULL DEFAULT 'thomasmol',
+        chunks TEXT NOT NULL DEFAULT '[]',
+        predictions TEXT NOT NULL DEFAULT '[]',
+        hedges TEXT NOT NULL DEFAULT '[]',
+        transcript TEXT,
+        owner_chat_id INTEGER,
+        owner_message_id INTEGER,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (chat_id, message_id)
+    );
+    """
+
+    async def add(
+        self, chat_id: int, message_id: int, reply_msg_id: int, cache_key: str | None
+    ) -> None:
+        """Save a job which is starting to download its file."""
+        await self._run(
+            lambda db: db.execute(
+                """
+                INSERT OR REPLACE INTO jobs (chat_id, message_id, reply_msg_id, stage, cache_key, created_at)
+                VALUES (?, ?, ?, 'download', ?, ?)
+                """,
+                (chat_id, message_id, reply_msg_id, cache_key, time.time()),
+            )
+        )
+
+    async def attach(
+        self, chat_id: int, message_id: int, owner: tuple[int, int]
+    ) -> None:
+        """Attach a job to the job of the request it joined, copying its progress so far."""
+        await self._run(
+            lambda db: db.execute(
+                """
+                UPDATE jobs SET (stage, filename, url, offset_map, backend, chunks, predictions, owner_chat_id, owner_message_id) = (
+                    SELECT stage, filename, url, offset_map, backend, chunks, predictions, chat_id, message_id
+                    FROM jobs WHERE chat_id = ? AND message_id = ?
+                )
+                WHERE chat_id = ? AND message_id = ?
+                AND EXISTS (SELECT 1 FROM jobs WHERE chat_id = ? AND message_id = ?)
+                """,
+                (*owner, chat_id, message_id, *owner),
+            )
+        )
+
+    async def set_uploaded(  # noqa: PLR0913
+        self,
+        chat_id: int,
+        message_id: int,
+        filename: str,
+        url: str | None,
+        offset_map: OffsetMap | None,
+        chunks: list[UploadedChunk],
+        backend: Backend = "thomasmol",
+    ) -> None:
+        """Save where the file was uploaded, once it is being transcribed, and by which backend."""
+        await self._run(
+            lambda db: db.execute(
+                """
+                UPDATE jobs SET stage = 'transcription', filename = ?, url = ?, offset_map = ?, backend = ?, chunks = ?, predictions = ?
+                WHERE (chat_id = ? AND message_id = ?) OR (owner_chat_id = ? AND owner_message_id = ?)
+                """,
+                (
+                    filename,
+                    url,
+                    json.dumps(offset_map.intervals) if offset_map else None,
+                    backend,
+                    _dump_chunks(chunks),
+                    json.dumps([None] * max(1, len(chunks))),
+                    chat_id,
+                    message_id,
+                    chat_id,
+                    message_id,
+                ),
+            )
+        )
+
+    async def set_prediction(
+        self, chat_id: int, message_id: int, index: int, pred_id: str
+    ) -> None:
+        """Save the id of the prediction created for chunk `index`, or 0 for the whole file."""
+
+        def set_prediction(db: sqlite3.Connection) -> None:
+            rows = db.execute(
+                """
+                SELECT chat_id, message_id, predictions FROM jobs
+                WHERE (chat_id = ? AND message_id = ?) OR (owner_chat_id = ? AND owner_message_id = ?)
+                """,
+                (chat_id, message_id, chat_id, message_id),
+            ).fetchall()
+            for row in rows:
+                predictions = json.loads(row["predictions"])
+                predictions[index] = pred_id
+                db.execute(
+                    "UPDATE jobs SET predictions = ? WHERE chat_id = ? AND message_id = ?",
+                    (json.dumps(predictions), row["chat_id"], row["message_id"]),
+                )
+
+        await self._run(set_prediction)
+
+    async def add_hedge(self, chat_id: int, message_id: int, pred_id: str) -> None:
+        """Save the id of a hedge, sent for a prediction still starting."""
+        await self._run(
+            lambda db: db.execute(
+                """
+                UPDATE jobs SET hedges = json_insert(hedges, '$[#]', ?)
+                WHERE (chat_id = ? AND message_id = ?) OR (owner_chat_id = ? AND owner_message_id = ?)
+                """,
+                (pred_id, chat_id, message_id, chat_id, message_id),
+            )
+        )
+
+    async def set_transcript(
+        self, chat_id: int, message_id: int, transcript: str
+    ) -> None:
+        """Save the transcript, once it is sent and minutes are being generated."""
+        await self._run(
+            lambda db: db.execute(
+                """
+                UPDATE jobs SET stage = 'minutes', transcript = ?
+                WHERE chat_id = ? AND message_id = ?
+                """,
+                (transcript, chat_id, message_id),
+            )
+        )
+
+    async def remove(self, chat_id: int, message_id: int) -> None:
+        """Forget a finished job."""
+        await self._run(
+            lambda db: db.execute(
+                "DELETE FROM jobs WHERE chat_id = ? AND message_id = ?",
+                (chat_id, message_id),
+            )
+        )
+
+    @asynccontextmanager
+    async def track(self, chat_id: int, message_id: int) -> AsyncIterator[None]:
+        """
+        Forget the job once the context exits, whether it succeeded or failed.
+
+        If the job is cancelled, e.g. because the bot is shutting down, it is kept to be resumed.
+        """
+        try:
+            yield
+        except Exception:
+            await self.remove(chat_id, message_id)
+            raise
+        await self.remove(chat_id, message_id)
+
+    async def unfinished(self) -> list[StoredJob]:
+        """Return all saved jobs, oldest first."""
+        rows = await self._run(
+            lambda db: db.execute("SELECT * FROM jobs ORDER BY created_at").fetchall()
+        )
+        return [_load_job(row) for row in rows]
+
+    async def get(self, chat_id: int, message_id: int) -> StoredJob | None:
+        """Return the saved job of a message, if it had not finished."""
+        row = await self._run(
+            lambda db: db.execute(
+                "SELECT * FROM jobs WHERE chat_id = ? AND message_id = ?",
+                (chat_id, message_id),
+            ).fetchone()
+        )
+        return _load_job(row) if row else None
@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+
+class SqliteStore:
+    """
+    A SQLite database shared by the whole process.
+
+    Queries are blocking, so they run in a thread, one at a time.
+    """
+
+    _SCHEMA: str = ""
+    """Statements run when the database is opened."""
+
+    def __init__(self, path: Path) -> None:
+        """Open the database, creating it and its tables if they do not exist."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._connection:
+            self._connection.executescript(self._SCHEMA)
+
+    def _transaction[T](self, f: Callable[[sqlite3.Connection], T]) -> T:
+        with self._lock, self._connection:
+            return f(self._connection)
+
+    async def _run[T](self, f: Callable[[sqlite3.Connection], T]) -> T:
+        """Run `f` in a transaction, in a thread."""
+        return await asyncio.to_thread(self._transaction, f)
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+
+class SqliteCache(SqliteStore):
+    """
+    A cache in the table `_TABLE`, with a `key` primary key and `created_at` and `accessed_at` columns.
+
+    Entries expire after `ttl_s` seconds. Beyond `max_entries`, the least recently used entries are evicted.
+    """
+
+    _TABLE: str = ""
+
+    def __init__(self, path: Path, ttl_s: float, max_entries: int) -> None:
+        """Open the cache at `path`."""
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        super().__init__(path)
+
+    def _get(self, db: sqlite3.Connection, key: str) -> sqlite3.Row | None:
+        """Return the row of an entry, or None if it is missing or expired. Marks it as used."""
+        now = time.time()
+        row = db.execute(
+            f"SELECT * FROM {self._TABLE} WHERE key = ? AND created_at > ?",  # noqa: S608
+            (key, now - self.ttl_s),
+        ).fetchone()
+        if row:
+            db.execute(
+                f"UPDATE {self._TABLE} SET accessed_at = ? WHERE key = ?",  # noqa: S608
+                (now, key),
+            )
+        return row
+
+    def _put(self, db: sqlite3.Connection, values: dict[str, Any]) -> None:
+        """Insert an entry with the columns in `values`, replacing any with the same key, and evict old entries."""
+        now = time.time()
+        values = values | {"created_at": now, "accessed_at": now}
+        db.execute(
+            f"INSERT OR REPLACE INTO {self._TABLE} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",  # noqa: S608
+            tuple(values.values()),
+        )
+        db.execute(
+            f"DELETE FROM {self._TABLE} WHERE created_at <= ?",  # noqa: S608
+            (now - self.ttl_s,),
+        )
+        db.execute(
+            f"""
+            DELETE FROM {self._TABLE} WHERE key NOT IN (
+                SELECT key FROM {self._TABLE} ORDER BY accessed_at DESC LIMIT ?
+            )
+            """,  # noqa: S608
+            (self.max_entries,),
+        )
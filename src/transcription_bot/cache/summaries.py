@@ -0,0 +1,34 @@
+import logging
+
+from transcription_bot.cache.sqlite import SqliteCache
+
+_logger = logging.getLogger(__name__)
+
+
+class SummaryCache(SqliteCache):
+    """
+    Minutes generated for transcripts, keyed by a hash of everything the minutes depend on.
+
+    Entries expire after `ttl_s` seconds. Beyond `max_entries`, the least recently used entries are evicted.
+    """
+
+    _TABLE = "summaries"
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS summaries (
+        key TEXT PRIMARY KEY,
+        minutes TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS summaries_accessed_at ON summaries (accessed_at);
+    """
+
+    async def get(self, key: str) -> str | None:
+        """Return the cached minutes, or None if they are missing or expired."""
+        row = await self._run(lambda db: self._get(db, key))
+        _logger.info("Summary cache %s for %s", "hit" if row else "miss", key)
+        return row["minutes"] if row else None
+
+    async def put(self, key: str, minutes: str) -> None:
+        """Cache minutes, replacing any existing entry, and evict old entries."""
+        await self._run(lambda db: self._put(db, {"key": key, "minutes": minutes}))
@@ -0,0 +1,70 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from transcription_bot.cache.sqlite import SqliteCache
+from transcription_bot.handlers.types import FileMessage
+
+_logger = logging.getLogger(__name__)
+
+
+def media_key(message: FileMessage) -> str | None:
+    """
+    Return a key identifying the media in a message, or None if it has none.
+
+    Document ids are unique across Telegram and stay the same when a file is forwarded, so re-sent files have the same key.
+    """
+    return f"document:{message.document.id}" if message.document else None
+
+
+@dataclass(frozen=True)
+class CachedTranscript:
+    """A previously processed recording."""
+
+    transcript: str
+    raw_output: Any
+    """Output of the transcription model, before processing."""
+
+
+class TranscriptCache(SqliteCache):
+    """
+    Transcripts and model outputs of processed recordings, keyed by `media_key`. Their minutes are cached by `SummaryCache`.
+
+    Entries expire after `ttl_s` seconds. Beyond `max_entries`, the least recently used entries are evicted.
+    """
+
+    _TABLE = "transcripts"
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS transcripts (
+        key TEXT PRIMARY KEY,
+        transcript TEXT NOT NULL,
+        raw_output TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS transcripts_accessed_at ON transcripts (accessed_at);
+    """
+
+    async def get(self, key: str) -> CachedTranscript | None:
+        """Return the cached entry, or None if it is missing or expired."""
+        row = await self._run(lambda db: self._get(db, key))
+        _logger.info("Transcript cache %s for %s", "hit" if row else "miss", key)
+        return (
+            CachedTranscript(row["transcript"], json.loads(row["raw_output"]))
+            if row
+            else None
+        )
+
+    async def put(self, key: str, transcript: str, raw_output: Any) -> None:
+        """Cache a transcript, replacing any existing entry, and evict old entries."""
+        await self._run(
+            lambda db: self._put(
+                db,
+                {
+                    "key": key,
+                    "transcript": transcript,
+                    "raw_output": json.dumps(raw_output),
+                },
+            )
+        )
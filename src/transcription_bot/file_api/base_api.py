@@ -1,14 +1,48 @@
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable, Coroutine
 from pathlib import Path
+from typing import Any
+
+type ProgressCallback = Callable[[int, int], Coroutine[Any, Any, None]]
+"""Called with (transferred bytes, total bytes)."""
 
 
 class BaseApi(ABC):
     """Base API class for classes providing file storage operations."""
 
     @abstractmethod
-    def upload_file(self, source_file: Path, destination_name: str) -> str:
-        """Upload a file to the storage."""
+    async def upload_file(
+        self,
+        source_file: Path,
+        destination_name: str,
+        progress_cb: ProgressCallback | None = None,
+    ) -> str:
+        """Upload a file to the storage. Returns the URL of the uploaded file."""
+
+    @abstractmethod
+    async def upload_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        destination_name: str,
+        length: int | None = None,
+        progress_cb: ProgressCallback | None = None,
+    ) -> str:
+        """
+        Upload chunks to the storage as they arrive, without buffering the whole object.
+
+        `length`: Total size in bytes, if known.
+
+        Returns the URL of the uploaded file.
+        """
 
     @abstractmethod
-    def download_file(self, object_name: str, destination_path: Path) -> None:
+    async def download_file(self, object_name: str, destination_path: Path) -> None:
         """Download a file from the storage."""
+
+    @abstractmethod
+    async def exists(self, object_name: str) -> bool:
+        """Return whether an object exists in the storage."""
+
+    @abstractmethod
+    async def delete(self, object_name: str) -> None:
+        """Delete an object from the storage."""
@@ -1,35 +1,157 @@
+import asyncio
 import copy
 import json
 import logging
+import os
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
 from functools import partial
 from pathlib import Path
 
+import certifi
+import urllib3
 from minio import Minio
+from minio.error import S3Error
+from urllib3.util import Retry, Timeout
 
-from .base_api import BaseApi
+from .base_api import BaseApi, ProgressCallback
 from .utils import apply_recursively
 
 _logger = logging.getLogger(__name__)
 
+_STREAM_PART_SIZE = 8 * 1024 * 1024
+"""Multipart part size for streamed uploads. Minio requires at least 5 MiB."""
+
+
+class StreamAbortedError(Exception):
+    """The producer of a streamed upload failed, so the upload was aborted."""
+
+
+class _StreamReader:
+    """
+    File-like object read by Minio on a worker thread, fed with chunks from the event loop.
+
+    The queue is bounded, so at most `maxsize` chunks are buffered before the producer waits for the upload to catch up.
+    A `None` chunk marks the end of the stream, and an exception aborts the upload.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        queue: asyncio.Queue[bytes | BaseException | None],
+    ) -> None:
+        self.loop = loop
+        self.queue = queue
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = asyncio.run_coroutine_threadsafe(
+                self.queue.get(), self.loop
+            ).result()
+            if isinstance(chunk, BaseException):
+                raise StreamAbortedError from chunk
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+
+        n = len(self._buffer) if size < 0 else size
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+
+class _LoopProgress:
+    """
+    Minio progress object which forwards progress to a coroutine callback on the event loop.
+
+    Minio calls `set_meta` and `update` from the uploading thread.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        progress_cb: ProgressCallback,
+        total: int | None = None,
+    ) -> None:
+        self.loop = loop
+        self.progress_cb = progress_cb
+        self.total = total
+        self.transferred = 0
+
+    def set_meta(self, object_name: str, total_length: int) -> None:  # noqa: ARG002
+        if self.total is None and total_length > 0:
+            self.total = total_length
+
+    def update(self, length: int) -> None:
+        self.transferred += length
+        future = asyncio.run_coroutine_threadsafe(
+            self.progress_cb(self.transferred, self.total or self.transferred),
+            self.loop,
+        )
+        future.add_done_callback(_log_progress_error)
+
+
+def _log_progress_error(future: Future[None]) -> None:
+    """Log an error raised by a progress callback, which is otherwise lost as nothing awaits it."""
+    if not future.cancelled() and (e := future.exception()):
+        _logger.error("Progress callback failed", exc_info=e)
+
 
 class FileApi(BaseApi):
     """Minio File Storage operations."""
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         host: str,
         access_key: str,
         secret_key: str,
         bucket_name: str,
         default_policy: dict,
+        pool_size: int = 10,
+        max_workers: int = 4,
     ) -> None:
-        """Initialize the FileApi client to perform Minio File Storage operations. Creates the bucket if it did not exist."""
+        """
+        Initialize the FileApi client to perform Minio File Storage operations. Creates the bucket if it did not exist.
+
+        Blocking: construct this once at startup and share it.
+
+        `pool_size`: Maximum number of pooled connections kept open to Minio.
+        `max_workers`: Maximum number of blocking Minio calls run at once. Further calls wait for a free thread.
+        """
         self.host = host
         self.bucket_name = bucket_name
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="minio"
+        )
         self.default_policy = FileApi._construct_policy(default_policy, bucket_name)
-        self.client = Minio(str(host), access_key=access_key, secret_key=secret_key)
+        self.client = Minio(
+            str(host),
+            access_key=access_key,
+            secret_key=secret_key,
+            http_client=FileApi._construct_http_client(pool_size),
+        )
         self._create_bucket_if_not_exists()
 
+    @staticmethod
+    def _construct_http_client(pool_size: int) -> urllib3.PoolManager:
+        """Return the Minio default HTTP client, but with a configurable pool size."""
+        timeout = timedelta(minutes=5).seconds
+        return urllib3.PoolManager(
+            timeout=Timeout(connect=timeout, read=timeout),
+            maxsize=pool_size,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=Retry(
+                total=5,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504],
+            ),
+        )
+
     @staticmethod
     def _replace_bucket_name(val: str, bucket_name: str) -> str:
         return val.format(bucket=bucket_name)
@@ -66,18 +188,38 @@ class FileApi(BaseApi):
             _logger.info("Bucket %s already exists, skipping creation", bucket_name)
         self._set_bucket_policy()
 
-    def upload_file(self, source_file: Path, destination_name: str) -> str:
+    async def _run[T](self, f: Callable[..., T], *args: object, **kwargs: object) -> T:
+        """Run a blocking Minio call on the bounded thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(f, *args, **kwargs)
+        )
+
+    async def upload_file(
+        self,
+        source_file: Path,
+        destination_name: str,
+        progress_cb: ProgressCallback | None = None,
+    ) -> str:
         """
         Upload a file to the bucket on this class.
 
+        `progress_cb`: Called on the event loop with the bytes uploaded so far.
+
         Returns the Minio URL of the uploaded file.
         """
-        self.client.fput_object(
+        progress = (
+            _LoopProgress(asyncio.get_running_loop(), progress_cb)
+            if progress_cb
+            else None
+        )
+        await self._run(
+            self.client.fput_object,
             self.bucket_name,
             destination_name,
             str(source_file),
+            progress=progress,
         )
-        logging.info(
+        _logger.info(
             "Uploaded file %s as object %s to bucket %s",
             source_file,
             destination_name,
@@ -85,6 +227,95 @@ class FileApi(BaseApi):
         )
         return self._construct_minio_url(destination_name)
 
-    def download_file(self, object_name: str, destination_path: Path) -> None:
+    async def upload_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        destination_name: str,
+        length: int | None = None,
+        progress_cb: ProgressCallback | None = None,
+        max_buffered_chunks: int = 16,
+    ) -> str:
+        """
+        Upload chunks to the bucket as a multipart upload while they are still being produced.
+
+        `length`: Total size in bytes, if known.
+        `progress_cb`: Called on the event loop with the bytes uploaded so far.
+        `max_buffered_chunks`: Chunks buffered in memory before the producer waits for the upload.
+
+        Returns the Minio URL of the uploaded file.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[bytes | BaseException | None] = asyncio.Queue(
+            maxsize=max_buffered_chunks
+        )
+        progress = _LoopProgress(loop, progress_cb, length) if progress_cb else None
+        upload = asyncio.ensure_future(
+            self._run(
+                self.client.put_object,
+                self.bucket_name,
+                destination_name,
+                _StreamReader(loop, queue),
+                length if length is not None else -1,
+                part_size=_STREAM_PART_SIZE,
+                progress=progress,
+            )
+        )
+
+        async def feed() -> None:
+            async for chunk in chunks:
+                await queue.put(chunk)
+            await queue.put(None)
+
+        def abort(exc: BaseException) -> None:
+            """Unblock the reader so Minio aborts the multipart upload."""
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(exc)
+
+        feeder = asyncio.ensure_future(feed())
+        try:
+            await asyncio.wait({upload, feeder}, return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError as e:
+            feeder.cancel()
+            abort(e)
+            # The upload fails with StreamAbortedError in the background
+            upload.add_done_callback(lambda t: t.exception())
+            raise
+
+        if feeder.done() and (exc := feeder.exception()):
+            abort(exc)
+            await asyncio.gather(upload, return_exceptions=True)
+            raise exc
+
+        if not feeder.done():
+            # The upload failed first, stop consuming chunks
+            feeder.cancel()
+        await upload
+
+        _logger.info(
+            "Streamed object %s to bucket %s", destination_name, self.bucket_name
+        )
+        return self._construct_minio_url(destination_name)
+
+    async def download_file(self, object_name: str, destination_path: Path) -> None:
         """Download a file from the bucket."""
-        self.client.fget_object(self.bucket_name, object_name, str(destination_path))
+        await self._run(
+            self.client.fget_object,
+            self.bucket_name,
+            object_name,
+            str(destination_path),
+        )
+
+    async def exists(self, object_name: str) -> bool:
+        """Return whether the object exists in the bucket."""
+        try:
+            await self._run(self.client.stat_object, self.bucket_name, object_name)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return False
+            raise
+        return True
+
+    async def delete(self, object_name: str) -> None:
+        """Delete an object from the bucket. Does nothing if it does not exist."""
+        await self._run(self.client.remove_object, self.bucket_name, object_name)
@@ -0,0 +1,86 @@
+"""
+Transcribe bursts of voice messages in a chat as one prediction.
+
+Voice messages arriving within a short window of each other are joined, with silence between them, and sent as a single file,
+paying the per-prediction overhead once. The transcript is split back into one per message by its timestamps.
+"""
+
+import asyncio
+import logging
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+from transcription_bot.handlers.types import FileMessage
+from transcription_bot.transcribers.replicate.thomasmol import Segment
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class VoiceBatch:
+    """Voice messages of one chat, transcribed together."""
+
+    key: str
+    """Identifies the batch's job, shared by the handlers of its messages."""
+    messages: list[FileMessage] = field(default_factory=list)
+    texts: dict[int, str] = field(default_factory=dict)
+    """Transcript of each message by id, once transcribed."""
+    closed: asyncio.Event = field(default_factory=asyncio.Event)
+    """Set once no more messages are added."""
+
+
+class VoiceBatcher:
+    """Collects voice messages into a batch per chat, until none has arrived for `window_s` or the batch is full."""
+
+    def __init__(self, window_s: float, max_messages: int) -> None:
+        """`max_messages`: The batch is closed as soon as it has this many messages."""
+        self.window_s = window_s
+        self.max_messages = max_messages
+        self._open: dict[int, VoiceBatch] = {}
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+
+    def _close(self, chat_id: int) -> None:
+        batch = self._open.pop(chat_id)
+        self._timers.pop(chat_id).cancel()
+        _logger.info("Closed batch %s of %s messages", batch.key, len(batch.messages))
+        batch.closed.set()
+
+    async def join(self, message: FileMessage) -> VoiceBatch:
+        """Add a voice message to its chat's batch, and wait for the batch to close. Every message of the batch gets the same one."""
+        chat_id = message.chat_id or 0
+        batch = self._open.get(chat_id)
+        if not batch:
+            batch = VoiceBatch(f"voice-batch:{chat_id}:{message.id}")
+            self._open[chat_id] = batch
+        batch.messages.append(message)
+
+        if timer := self._timers.pop(chat_id, None):
+            timer.cancel()
+        self._timers[chat_id] = asyncio.get_running_loop().call_later(
+            self.window_s, self._close, chat_id
+        )
+        if len(batch.messages) >= self.max_messages:
+            self._close(chat_id)
+
+        await batch.closed.wait()
+        return batch
+
+
+def split_segments(segments: list[Segment], offsets: list[float]) -> list[str]:
+    """
+    Split the transcript of joined recordings into one per recording.
+
+    Words are assigned to the recording their midpoint falls in, so segments spanning two recordings are split too.
+    Segments without word timestamps are assigned as a whole.
+
+    `offsets`: Where each recording starts in the joined audio, ascending.
+    """
+    parts: list[list[str]] = [[] for _ in offsets]
+    for segment in segments:
+        pieces = [(w.start, w.end, w.word) for w in segment.words] or [
+            (segment.start, segment.end, segment.text)
+        ]
+        for start, end, text in pieces:
+            index = max(bisect_right(offsets, (start + end) / 2) - 1, 0)
+            parts[index].append(text.strip())
+    return [" ".join(p for p in part if p) for part in parts]
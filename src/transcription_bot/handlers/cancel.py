@@ -1,4 +1,7 @@
 import logging
+import uuid
+from collections.abc import Callable, Coroutine
+from typing import Any
 
 from telethon import events
 from telethon.events import StopPropagation
@@ -10,6 +13,33 @@ from .utils import get_sender_name
 
 _logger = logging.getLogger(__name__)
 
+_cancel_callbacks: dict[str, Callable[[], Coroutine[Any, Any, None]]] = {}
+"""Cancel button data for jobs which are not a single prediction, mapped to how to cancel them."""
+
+
+def register_cancel_callback(cb: Callable[[], Coroutine[Any, Any, None]]) -> str:
+    """
+    Register a callback to cancel a job.
+
+    Returns the data to attach to the cancel button. Pressing it calls `cb` instead of cancelling a prediction by id.
+    """
+    token = uuid.uuid4().hex
+    _cancel_callbacks[token] = cb
+    return token
+
+
+def unregister_cancel_callback(token: str) -> None:
+    """Forget a cancel callback, once its job is done."""
+    _cancel_callbacks.pop(token, None)
+
+
+async def cancel_job(data: str) -> None:
+    """Cancel the job of a cancel button, given its data."""
+    if cb := _cancel_callbacks.pop(data, None):
+        await cb()
+    else:
+        await ThomasmolTranscriber.cancel(data)
+
 
 async def handle_cancel(event: events.CallbackQuery.Event) -> None:
     """Handle cancel callbacks for predictions."""
@@ -24,7 +54,7 @@ async def handle_cancel(event: events.CallbackQuery.Event) -> None:
     _logger.info("Received callback data from %s: %s", sender, data)
 
     try:
-        await ThomasmolTranscriber.cancel(data.decode())
+        await cancel_job(data.decode())
     except Exception as e:  # noqa: BLE001
         await notify_error(
             message,
@@ -1,46 +1,97 @@
+import asyncio
 import logging
 import tempfile
-from collections.abc import Callable, Coroutine
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, cast
+from typing import cast
 from zoneinfo import ZoneInfo
 
+import ffmpeg
 from humanize import naturalsize
 from python_utils import athrottle, format_hhmmss
 from telethon import TelegramClient
-from telethon.custom import Message
 from telethon.tl.custom.file import File
-
-from transcription_bot.file_api.base_api import BaseApi
-from transcription_bot.handlers.types import DownloadFailedError
-from transcription_bot.handlers.utils import (
-    ffprobe_get_duration_s,
-    is_other_user,
+from telethon.types import Document
+
+from transcription_bot.audio.chunks import cut_audio, cut_start, plan_chunks
+from transcription_bot.audio.preprocess import PreparedAudio, preprocess_audio
+from transcription_bot.audio.run import get_duration_s
+from transcription_bot.audio.vad import OffsetMap, VadOptions, detect_silences
+from transcription_bot.file_api.base_api import BaseApi, ProgressCallback
+from transcription_bot.handlers.parallel_download import download_parallel
+from transcription_bot.handlers.queue import Stages, queued
+from transcription_bot.handlers.types import (
+    DownloadFailedError,
+    FileMessage,
+    ProgressMessage,
 )
+from transcription_bot.handlers.utils import is_other_user
 from transcription_bot.settings import Settings
+from transcription_bot.transcribers.chunked import UploadedChunk
 
-from .utils import get_sender_name, on_update
+from .utils import get_sender_name
 
 _logger = logging.getLogger(__name__)
 
+_STREAM_REQUEST_SIZE = 512 * 1024
+"""Chunk size requested from Telegram when streaming. This is the maximum Telegram allows."""
+
+
+def destination_name(path: Path) -> str:
+    """Suffix the current timestamp to the filename, for the destination filename."""
+    now = datetime.now(tz=ZoneInfo(Settings.TZ)).isoformat().replace(":", "-")
+    return f"{path.stem}_{now}{path.suffix or ""}"
+
+
+@dataclass(frozen=True)
+class DownloadedFile:
+    """A file downloaded from a message and uploaded to file storage."""
+
+    url: str | None
+    """URL of the uploaded file. None if it was only uploaded in chunks."""
+
+    filename: str
+    """Path.stem of the downloaded file."""
+
+    offset_map: OffsetMap | None = None
+    """Set if silences were trimmed from the uploaded audio."""
+
+    chunks: list[UploadedChunk] = field(default_factory=list)
+    """Set if the recording is long enough to be transcribed in chunks."""
+
+    duration_s: float | None = None
+    """Duration of the original recording, if known."""
+
+    probe_url: str | None = None
+    """Set if the recording is long enough to probe its language first. URL of its start, uploaded separately."""
+
 
 class DownloadHandler:
     """A method class which performs downloads from messages, uploads to Minio and then updates the user."""
 
-    def __init__(self, message: Message, reply_msg: Message, api: BaseApi) -> None:
+    def __init__(
+        self,
+        message: FileMessage,
+        reply_msg: ProgressMessage,
+        api: BaseApi,
+        stages: Stages | None = None,
+    ) -> None:
         """
         Create a new handler for transcription requests.
 
         `message`: The message to process.
-        `temp_dir`: A tempo
+        `reply_msg`: The message to keep updated with progress.
+        `api`: File storage to upload to.
+        `stages`: Limits how many files are downloaded and preprocessed at once. If not provided, there is no limit.
         """
         self.message = message
         self.reply_msg = reply_msg
         self.api = api
+        self.stages = stages
 
     @staticmethod
-    def should_handle_message(message: Message) -> bool:
+    def should_handle_message(message: FileMessage) -> bool:
         """Check if  message has media attached."""
         # webm files are considered documents
         return bool(
@@ -53,6 +104,9 @@ class DownloadHandler:
     def _get_file_name(self, file: File) -> str:
         return f"'{file.name}'" if file.name else "voice message"
 
+    def _get_destination_name(self, path: Path) -> str:
+        return destination_name(path)
+
     async def _upload_file(self, path: Path) -> str:
         """
         Upload file using a BaseApi class.
@@ -61,53 +115,187 @@ class DownloadHandler:
 
         Returns url to uploaded file.
         """
-        now = datetime.now(tz=ZoneInfo(Settings.TZ)).isoformat().replace(":", "-")
-        destination_name = f"{path.stem}_{now}{path.suffix or ""}"
+        destination_name = self._get_destination_name(path)
         orig_reply_txt = str(self.reply_msg.text)
-        await self.reply_msg.edit(orig_reply_txt + "\nUploading...")
-        url = self.api.upload_file(path, destination_name)
+        prefix = orig_reply_txt + "\nUploading..."
+        await self.reply_msg.edit(prefix)
+        url = await self.api.upload_file(
+            path,
+            destination_name,
+            progress_cb=self._on_progress_update(self.reply_msg, prefix),
+        )
         await self.reply_msg.edit(orig_reply_txt + "\nUpload complete.")
         return url
 
-    async def download(self) -> tuple[str, str]:
+    async def download(self) -> DownloadedFile:
         """
         Start downloading content from a message, then uploads it to Minio.
 
-        Returns tuple of [Minio URL of the uploaded file, Path.stem of the downloaded file.].
-
         Keeps the user informed of progress.
 
         Raises NoMediaFileError if there was no media in the message, or DownloadFailedError if download was unsuccessful.
         """
+        download_stage = self.stages.download if self.stages else None
+        if Settings.STREAM_UPLOADS:
+            async with queued(download_stage, self.message, self.reply_msg):
+                return await self._stream_file()
+
         with tempfile.TemporaryDirectory() as temp_dir:
-            dl_path = await self._download_file(Path(temp_dir))
-            return (await self._upload_file(dl_path), dl_path.stem)
+            async with queued(download_stage, self.message, self.reply_msg):
+                dl_path, duration_s = await self._download_file(Path(temp_dir))
+            async with queued(
+                self.stages.preprocess if self.stages else None,
+                self.message,
+                self.reply_msg,
+            ):
+                prepared = await self._preprocess(dl_path)
+                chunks, probe_url = await asyncio.gather(
+                    self._upload_chunks(prepared.path),
+                    self._upload_probe(prepared.path, duration_s),
+                )
+            return DownloadedFile(
+                # Chunks are transcribed instead of the whole file
+                None if chunks else await self._upload_file(prepared.path),
+                dl_path.stem,
+                prepared.offset_map,
+                chunks,
+                duration_s,
+                probe_url,
+            )
+
+    async def download_to(self, dl_dir: Path) -> Path:
+        """
+        Download the file from a message into `dl_dir`, without uploading it, e.g. to join it with others first.
+
+        Keeps the user informed of progress, and notifies me, as `download` does.
+
+        Raises DownloadFailedError if download was unsuccessful.
+        """
+        async with queued(
+            self.stages.download if self.stages else None, self.message, self.reply_msg
+        ):
+            path, _ = await self._download_file(dl_dir)
+        return path
+
+    async def _upload_chunks(self, path: Path) -> list[UploadedChunk]:
+        """
+        Split a long recording into chunks at silences, and upload them for concurrent transcription.
+
+        Returns no chunks if chunking is disabled, or the recording is short enough to transcribe in one go.
+        """
+        if not Settings.CHUNK_TRANSCRIPTION:
+            return []
+
+        duration = await get_duration_s(path)
+        if duration < Settings.CHUNK_S * 1.5:
+            return []
+
+        silences = await detect_silences(
+            path, duration, VadOptions(Settings.VAD_NOISE_DB, min_silence_s=0.5)
+        )
+        chunks = plan_chunks(
+            duration, silences, Settings.CHUNK_S, Settings.CHUNK_OVERLAP_S
+        )
+        await self.reply_msg.edit(
+            f"{self.reply_msg.text}\nSplitting into {len(chunks)} parts..."
+        )
+        paths = await asyncio.gather(
+            *(
+                cut_audio(path, chunk, i, Settings.PREPROCESS_CODEC)
+                for i, chunk in enumerate(chunks)
+            )
+        )
+        urls = await asyncio.gather(
+            *(self.api.upload_file(p, self._get_destination_name(p)) for p in paths)
+        )
+        return [
+            UploadedChunk(url, chunk) for url, chunk in zip(urls, chunks, strict=True)
+        ]
+
+    async def _upload_probe(self, path: Path, duration_s: float) -> str | None:
+        """
+        Cut and upload the start of a long recording, to detect its language and speakers before transcribing all of it.
 
-    def _on_download_update(
+        Returns None if probing is disabled or failed, or the recording is too short to be worth probing.
+        """
+        if not Settings.PROBE_S or duration_s < Settings.PROBE_MIN_S:
+            return None
+
+        try:
+            clip = await cut_start(path, Settings.PROBE_S, Settings.PREPROCESS_CODEC)
+            return await self.api.upload_file(clip, self._get_destination_name(clip))
+        except Exception:
+            _logger.exception("Failed to upload a probe of %s, not probing it", path)
+            return None
+
+    async def _preprocess(self, path: Path) -> PreparedAudio:
+        """
+        Extract and compress the audio track, and optionally trim silences, to cut upload and transcription time.
+
+        Falls back to the original file if preprocessing fails.
+        """
+        if not Settings.PREPROCESS_AUDIO:
+            return PreparedAudio(path)
+
+        await self.reply_msg.edit(f"{self.reply_msg.text}\nExtracting audio...")
+        vad = (
+            VadOptions(
+                Settings.VAD_NOISE_DB,
+                Settings.VAD_MIN_SILENCE_S,
+                Settings.VAD_KEEP_SILENCE_S,
+            )
+            if Settings.VAD_TRIM
+            else None
+        )
+        try:
+            return await preprocess_audio(
+                path,
+                Settings.PREPROCESS_CODEC,
+                Settings.PREPROCESS_MIN_BYTES,
+                vad,
+            )
+        # OSError if ffmpeg is not installed
+        except (ffmpeg.Error, OSError):
+            _logger.exception("Failed to preprocess %s, uploading it as-is", path)
+            return PreparedAudio(path)
+
+    def _on_progress_update(
         self,
-        message: Message,
+        message: ProgressMessage,
         prefix: str | None = None,
         delay: float = 3,
-    ) -> Callable[[int, int], Coroutine[Any, Any, None]]:
+    ) -> ProgressCallback:
         """
-        Edits a telegram message with the download progress.
+        Edits a telegram message with the download or upload progress.
 
         `message`: The message to update.
-        `prefix`: Optional prefix included before the download progress.
+        `prefix`: Optional prefix included before the progress.
         `delay`: Max frequency of updates (throttled)
 
-        For use with message.download_media as progress_callback.
+        For use with message.download_media as progress_callback, or BaseApi.upload_file as progress_cb.
         """
 
         @athrottle(delay=delay)
         async def _handler(received_bytes: int, total: int) -> None:
             text = f"{prefix or ""}\n{naturalsize(received_bytes)}/{naturalsize(total)} ({received_bytes/total*100:.1f}%)"
-            await on_update(message, text)
+            await message.edit(text, parse_mode="html")
 
         return _handler
 
-    async def _download_file(self, dl_dir: Path) -> Path:
-        """Download file from the message, keeping the user updated. Also notifies me."""
+    def _should_download_parallel(self, file: File) -> bool:
+        """Only large documents are worth the extra connections. Small files such as voice notes are downloaded sequentially."""
+        return (
+            Settings.DOWNLOAD_CONNECTIONS > 1
+            and self.message.document is not None
+            and (file.size or 0) >= Settings.PARALLEL_DOWNLOAD_MIN_BYTES
+        )
+
+    async def _download_file(self, dl_dir: Path) -> tuple[Path, float]:
+        """
+        Download file from the message, keeping the user updated. Also notifies me.
+
+        Returns the path and duration of the file.
+        """
         message = self.message
 
         file = cast(File, message.file)
@@ -121,20 +309,79 @@ class DownloadHandler:
         await self.reply_msg.edit(prefix)
 
         # Download file
-        dl_path_str = cast(
-            str | None,
-            await message.download_media(
-                file=dl_dir / file_name,
-                progress_callback=self._on_download_update(self.reply_msg, prefix),
-            ),
+        progress_cb = self._on_progress_update(self.reply_msg, prefix)
+        dl_path = None
+        if self._should_download_parallel(file):
+            try:
+                dl_path = await download_parallel(
+                    cast(TelegramClient, message.client),
+                    cast(Document, message.document),
+                    dl_dir / (file.name or f"{file_name}{file.ext or ""}"),
+                    Settings.DOWNLOAD_CONNECTIONS,
+                    progress_cb,
+                )
+            except Exception:
+                _logger.exception("Parallel download failed, retrying sequentially")
+
+        if not dl_path:
+            dl_path_str = cast(
+                str | None,
+                await message.download_media(
+                    file=dl_dir / file_name,
+                    progress_callback=progress_cb,
+                ),
+            )
+
+            if dl_path_str is None:
+                raise DownloadFailedError
+
+            dl_path = Path(dl_path_str)
+
+        duration_s = file.duration or await get_duration_s(dl_path)
+        await self._on_received(file_name, file_size, duration_s)
+
+        return dl_path, duration_s
+
+    async def _stream_file(self) -> DownloadedFile:
+        """
+        Download file from the message while uploading it, without writing it to disk.
+
+        Memory use is bounded by the upload buffer, regardless of file size. Also notifies me.
+        """
+        message = self.message
+        file = cast(File, message.file)
+
+        file_size = self._get_file_size(file)
+        file_name = self._get_file_name(file).strip("' ")
+        path = Path(file.name or f"{file_name}{file.ext or ""}")
+
+        prefix = f"Downloading and uploading {file_name}, ({file_size})..."
+        _logger.info(prefix)
+        await self.reply_msg.edit(prefix)
+
+        client = cast(TelegramClient, message.client)
+        url = await self.api.upload_stream(
+            client.iter_download(message.media, request_size=_STREAM_REQUEST_SIZE),
+            self._get_destination_name(path),
+            length=file.size,
+            progress_cb=self._on_progress_update(self.reply_msg, prefix),
         )
 
-        if dl_path_str is None:
-            raise DownloadFailedError
+        # Nothing on disk to probe, but ffprobe can read the uploaded object
+        duration_s = file.duration or await get_duration_s(url)
+        await self._on_received(file_name, file_size, duration_s)
 
-        dl_path = Path(dl_path_str)
+        return DownloadedFile(url, path.stem, duration_s=duration_s)
 
-        duration_s = file.duration or ffprobe_get_duration_s(dl_path)
+    async def _on_received(
+        self, file_name: str, file_size: str, duration_s: float
+    ) -> None:
+        """
+        Inform the user the file was received, and send it to me.
+
+        Telegram's copy of the media is sent, instead of uploading the recording again.
+        """
+        message = self.message
         duration = format_hhmmss(duration_s)
 
         prefix = f"Downloaded {file_name} ({duration}, {file_size})."
@@ -149,8 +396,6 @@ class DownloadHandler:
             await cast(TelegramClient, message.client).send_message(
                 Settings.MY_USERNAME.get_secret_value(),
                 log_msg,
-                file=dl_path.open("rb"),  # noqa: ASYNC230
+                file=message.media,  # pyright: ignore[reportArgumentType]
                 silent=True,
             )
-
-        return dl_path
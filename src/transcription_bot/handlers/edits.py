@@ -0,0 +1,220 @@
+"""
+Send all message edits through one scheduler, so concurrent jobs do not get the account throttled.
+
+Edits are rate limited per chat and globally with token buckets. Only the latest pending text of each message is sent,
+and edits which would not change the message are skipped. On a FloodWait, edits are deferred until it ends instead of being dropped.
+"""
+
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from telethon import errors
+
+from transcription_bot.handlers.types import ChatMessage
+
+_logger = logging.getLogger(__name__)
+
+type _MessageKey = tuple[int | None, int]
+"""(chat id, message id)"""
+
+_MAX_SENT_TEXTS = 10_000
+"""Texts of messages edited least recently are forgotten beyond this."""
+
+_MAX_CHATS = 1_000
+"""Beyond this many chats, the rate limits of chats whose bucket has refilled are forgotten, as they are no longer limited."""
+
+
+@dataclass
+class TokenBucket:
+    """Allows `rate` events per second on average, in bursts of up to `capacity`."""
+
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    updated: float = 0
+
+    def __post_init__(self) -> None:
+        """Start full."""
+        self.tokens = self.capacity
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Return how long until a token is available."""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def full(self, now: float) -> bool:
+        """Return whether the bucket has refilled to capacity."""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def take(self, now: float) -> None:
+        """Use a token. Check `wait_time` first."""
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass
+class _Edit:
+    message: ChatMessage
+    text: str
+    kwargs: dict[str, Any]
+
+
+class EditScheduler:
+    """Sends message edits in the background, within Telegram's rate limits."""
+
+    def __init__(
+        self, rate_per_s: float, chat_rate_per_s: float, chat_burst: int = 3
+    ) -> None:
+        """
+        Prepare a scheduler. Call `start` to start sending edits.
+
+        `rate_per_s`: Edits per second across all chats.
+        `chat_rate_per_s`: Edits per second in a single chat, in bursts of up to `chat_burst`.
+        """
+        self.rate_per_s = rate_per_s
+        self.chat_rate_per_s = chat_rate_per_s
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(rate_per_s, max(1.0, rate_per_s))
+        self._chats: dict[int | None, TokenBucket] = {}
+        self._pending: dict[_MessageKey, _Edit] = {}
+        self._sending: set[_MessageKey] = set()
+        self._sent: dict[_MessageKey, str] = {}
+        self._resume_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._sent_any = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._sends: set[asyncio.Task[None]] = set()
+
+    def start(self) -> None:
+        """Start sending edits in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop sending edits. Pending edits are dropped."""
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    @staticmethod
+    def _key(message: ChatMessage) -> _MessageKey:
+        return message.chat_id, message.id
+
+    def edit(self, message: ChatMessage, text: str, **kwargs: Any) -> None:
+        """
+        Edit a message in the background, replacing any edit of it which has not been sent yet.
+
+        `kwargs`: Passed to `Message.edit`.
+        """
+        key = self._key(message)
+        if key not in self._pending and self._sent.get(key) == text:
+            return
+        self._pending[key] = _Edit(message, text, kwargs)
+        self._wakeup.set()
+
+    def discard(self, message: ChatMessage) -> None:
+        """Drop the pending edit of a message, e.g. before deleting it."""
+        self._pending.pop(self._key(message), None)
+
+    async def flush(self, message: ChatMessage) -> None:
+        """Wait until the pending edit of a message, if any, has been sent, e.g. so that a reply to it comes after the edit."""
+        key = self._key(message)
+        while key in self._pending or key in self._sending:
+            self._sent_any.clear()
+            await self._sent_any.wait()
+
+    def _remember(self, key: _MessageKey, text: str) -> None:
+        self._sent.pop(key, None)
+        self._sent[key] = text
+        while len(self._sent) > _MAX_SENT_TEXTS:
+            del self._sent[next(iter(self._sent))]
+
+    async def _send(self, key: _MessageKey, edit: _Edit) -> None:
+        try:
+            await edit.message.edit(edit.text, **edit.kwargs)
+            self._remember(key, edit.text)
+        except errors.MessageNotModifiedError:
+            self._remember(key, edit.text)
+        except errors.FloodWaitError as e:
+            _logger.warning("FloodWait for %ss, deferring edits", e.seconds)
+            self._resume_at = asyncio.get_running_loop().time() + e.seconds
+            # Retry later, unless a newer edit replaced it meanwhile
+            self._pending.setdefault(key, edit)
+        except errors.RPCError:
+            _logger.exception("Failed to edit message")
+        finally:
+            self._sending.discard(key)
+            self._sent_any.set()
+            self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: int | None, now: float) -> TokenBucket:
+        if chat_id not in self._chats:
+            if len(self._chats) >= _MAX_CHATS:
+                self._chats = {c: b for c, b in self._chats.items() if not b.full(now)}
+            self._chats[chat_id] = TokenBucket(
+                self.chat_rate_per_s, self.chat_burst, updated=now
+            )
+        return self._chats[chat_id]
+
+    def _next(self, now: float) -> tuple[_MessageKey | None, float]:
+        """Return the oldest edit which can be sent now, or else how long until one can."""
+        wait = max(self._resume_at - now, self._global.wait_time(now))
+        if wait > 0:
+            return None, wait
+
+        for key in [k for k, e in self._pending.items() if self._sent.get(k) == e.text]:
+            del self._pending[key]
+
+        wait = float("inf")
+        for key in self._pending:
+            if key in self._sending:
+                continue
+            chat_wait = self._chat_bucket(key[0], now).wait_time(now)
+            if chat_wait == 0:
+                return key, 0
+            wait = min(wait, chat_wait)
+        return None, wait
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            key, wait = self._next(now)
+            if key is None:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), None if wait == float("inf") else wait
+                    )
+                continue
+
+            edit = self._pending.pop(key)
+            self._global.take(now)
+            self._chat_bucket(key[0], now).take(now)
+            self._sending.add(key)
+            task = asyncio.create_task(self._send(key, edit))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+
+class ScheduledMessage:
+    """A message whose edits are sent by an `EditScheduler`, so editing it never waits for rate limits."""
+
+    def __init__(self, message: ChatMessage, edits: EditScheduler) -> None:
+        """Wrap `message`, sending its edits through `edits`."""
+        self.message = message
+        self.text = str(message.text)
+        self._edits = edits
+
+    async def edit(self, text: str, **kwargs: Any) -> None:
+        """Edit the message in the background. See `EditScheduler.edit`."""
+        self.text = text
+        self._edits.edit(self.message, text, **kwargs)
@@ -1,113 +1,533 @@
+import asyncio
 import logging
 import tempfile
 import time
+from collections.abc import Callable, Coroutine
 from functools import partial
 from pathlib import Path
-from typing import cast
+from typing import TYPE_CHECKING, Any, cast
 
 from python_utils import format_hhmmss
-from telethon import Button
+from telethon import TelegramClient
 from telethon.custom import Message
 from telethon.events import StopPropagation
 
-from transcription_bot.file_api.minio_api import FileApi
-from transcription_bot.file_api.policy import Policy
-from transcription_bot.handlers.summary import generate_summary
-from transcription_bot.handlers.types import TranscriptionFailedError
-from transcription_bot.handlers.utils import (
-    notify_error,
+from transcription_bot.audio.concat import join_audio, part_offsets
+from transcription_bot.audio.run import get_duration_s
+from transcription_bot.cache.jobs import StoredJob
+from transcription_bot.cache.transcripts import media_key
+from transcription_bot.handlers.summary import ProgressCallback, generate_summary
+from transcription_bot.handlers.types import (
+    ChatMessage,
+    DownloadFailedError,
+    FileMessage,
+    ProgressMessage,
+    TranscriptionFailedError,
 )
+from transcription_bot.handlers.utils import notify_error
+from transcription_bot.services import Services
 from transcription_bot.settings import Settings
-from transcription_bot.transcribers.base import BaseTranscriber
+from transcription_bot.transcribers.base import BaseTranscriber, ResumableTranscriber
+from transcription_bot.transcribers.chunked import (
+    ChunkedTranscriber,
+    PredictionCallback,
+)
+from transcription_bot.transcribers.replicate.probe import probe
 from transcription_bot.transcribers.replicate.thomasmol import (
+    Output,
     ThomasmolParamsWithoutUrl,
     ThomasmolTranscriber,
 )
+from transcription_bot.transcribers.router import Backend
+from transcription_bot.types import PredictionStatus
+
+from .batch import VoiceBatch, split_segments
+from .download import DownloadedFile, DownloadHandler, destination_name
+from .edits import ScheduledMessage
+from .queue import queued
+from .single_flight import CancelCallback, JobOwner, SharedJob
+from .utils import notify_me, text_file
 
-from .download import DownloadHandler
-from .utils import notify_me, on_update
+if TYPE_CHECKING:
+    from telethon.hints import FileLike
 
 _logger = logging.getLogger(__name__)
 
+_MAX_PREVIEW_CHARS = 4000
+"""Only the end of minutes being generated is shown, as Telegram messages are limited to 4096 characters."""
+
+
+def _job_owner(message: ChatMessage) -> JobOwner:
+    """Return the chat and id of a message, which identify its saved job. Messages handled by the bot are always in a chat."""
+    return cast(int, message.chat_id), message.id
+
 
 async def _log_progress(
-    progress: str, reply_msg: Message, limit_lines: int = 3
+    progress: str, reply_msg: ProgressMessage, limit_lines: int = 3
 ) -> None:
     text = progress.splitlines()[-limit_lines:]
     progress_msg = f"Processing...\n<pre>{text}</pre>"
-    await on_update(reply_msg, progress_msg)
+    await reply_msg.edit(progress_msg, parse_mode="html")
+
+
+async def _wait_for_transcript(
+    job: SharedJob[tuple[str, str]],
+    cancel: CancelCallback,
+    get_result: Callable[[], Coroutine[Any, Any, tuple[str | None, PredictionStatus]]],
+) -> str:
+    """
+    Show a cancel button to each subscriber while waiting for the transcript.
+
+    `cancel`: Cancels the prediction, once every subscriber has cancelled.
+
+    Raises `StopPropagation` if job result is `canceled`.
+    """
+    await job.show_cancel_button(cancel)
+    try:
+        result, status = await get_result()
+    finally:
+        await job.hide_cancel_button()
+
+    if not result:
+        if status == "canceled":
+            await job.edit("Cancelled transcription.")
+            raise StopPropagation
+        msg = f"{status=}"
+        raise TranscriptionFailedError(msg)
+
+    return result
 
 
 async def _get_transcript(
     transcriber: BaseTranscriber,
-    reply_msg: Message,
+    job: SharedJob[tuple[str, str]],
     url: str,
+    pred_id: str | None,
+    on_created: PredictionCallback | None,
 ) -> str:
     """
     Transcribe and diarize an audio file that was uploaded to file storage.
 
+    `pred_id`: Prediction sent before the bot restarted, to re-attach to instead of sending a new job, if the transcriber is resumable.
+    `on_created`: Called with the id of the new prediction, if one is sent. None if it need not be saved.
+
     Returns the transcript.
 
     Raises `StopPropagation` if job result is `canceled`.
     """
-    pred_id = await transcriber.send_job(
-        url,
-        log_cb=partial(_log_progress, reply_msg=reply_msg),
+    log_cb = partial(_log_progress, reply_msg=job)
+    if pred_id and isinstance(transcriber, ResumableTranscriber):
+        await transcriber.attach(pred_id, log_cb=log_cb)
+    else:
+        pred_id = await transcriber.send_job(url, log_cb=log_cb)
+        if on_created:
+            await on_created(0, pred_id)
+    return await _wait_for_transcript(
+        job, partial(transcriber.cancel, pred_id), transcriber.get_result
     )
-    cancel_msg = cast(
-        Message,
-        await reply_msg.reply(
-            "Transcribing...", buttons=[Button.inline("Cancel", pred_id)]
+
+
+async def _get_transcript_chunked(
+    transcriber: ChunkedTranscriber,
+    job: SharedJob[tuple[str, str]],
+    predictions: list[str | None] | None,
+    on_created: PredictionCallback,
+) -> str:
+    """
+    Transcribe and diarize a recording that was uploaded in chunks.
+
+    `predictions`: Predictions sent before the bot restarted, to re-attach to.
+    `on_created`: Called with the index and id of each new prediction.
+
+    Returns the stitched transcript.
+
+    Raises `StopPropagation` if job result is `canceled`.
+    """
+    transcriber.send_jobs(
+        log_cb=partial(
+            _log_progress, reply_msg=job, limit_lines=len(transcriber.chunks)
         ),
+        predictions=predictions,
+        on_created=on_created,
     )
-    result, status = await transcriber.get_result()
+    return await _wait_for_transcript(job, transcriber.cancel, transcriber.get_result)
 
-    await cancel_msg.delete()
-    if not result:
-        if status == "canceled":
-            await reply_msg.edit("Cancelled transcription.")
-            raise StopPropagation
-        msg = f"{status=}"
-        raise TranscriptionFailedError(msg)
 
-    return result
+async def _download(
+    message: FileMessage, reply_msg: ProgressMessage, services: Services
+) -> DownloadedFile:
+    """
+    Download the file attached to the message, and upload it to file storage.
+
+    Raises `DownloadFailedError` if either fails.
+    """
+    try:
+        handler = DownloadHandler(
+            message,
+            reply_msg,
+            services.file_api,
+            services.stages,
+        )
+        downloaded = await handler.download()
+
+    except Exception as e:
+        raise DownloadFailedError from e
+    return downloaded
+
 
+async def _send_text(
+    message: FileMessage, text: str, filename: str, log_msg: str
+) -> None:
+    """
+    Reply with `text` as a file named `filename`, and notify me at the same time.
+
+    The file is uploaded once from memory, and the upload is sent to both.
+    """
+    file: FileLike = text_file(text, filename)
+    if isinstance(message, Message):
+        # Messages relayed from a worker are sent by the front-end, which cannot send the worker's uploads
+        file = await cast(TelegramClient, message.client).upload_file(
+            file, file_name=filename
+        )
+    await asyncio.gather(message.reply(file=file), notify_me(message, log_msg, file))
 
-def _prepare_api_and_transcriber() -> tuple[FileApi, BaseTranscriber]:
-    api = FileApi(
-        host=Settings.MINIO_HOST,
-        access_key=Settings.MINIO_ACCESS_KEY.get_secret_value(),
-        bucket_name=Settings.MINIO_BUCKET,
-        secret_key=Settings.MINIO_SECRET_KEY.get_secret_value(),
-        default_policy=Policy.public_read_only(),
+
+async def _transcribe(
+    message: FileMessage,
+    services: Services,
+    cache_key: str | None,
+    job: SharedJob[tuple[str, str]],
+) -> tuple[str, str]:
+    """
+    Download, transcribe and cache the file attached to the message.
+
+    `job`: Shared with later requests for the same file, which subscribe to its progress.
+
+    Returns the transcript and the name of the downloaded file.
+    """
+    downloaded = await _download(message, job, services)
+    _logger.info("Filename from user: %s", downloaded.filename)
+    params = (
+        await _probe(services, downloaded.probe_url, job)
+        if downloaded.probe_url
+        else None
+    )
+    # Chunks are stitched by their segments, which only thomasmol outputs.
+    # The other backends are set up for English only; of the recordings long enough to be probed,
+    # only voice notes up to ROUTER_FAST_VOICE_MAX_S may be routed to them.
+    backend: Backend = (
+        "thomasmol"
+        if downloaded.chunks or (params and params.language != "en")
+        else services.router.choose(
+            downloaded.duration_s, voice=message.voice is not None
+        )
     )
-    transcriber: BaseTranscriber = ThomasmolTranscriber(
-        Settings.MODEL_VERSION,
-        ThomasmolParamsWithoutUrl(),
+    await services.job_store.set_uploaded(
+        *_job_owner(message),
+        downloaded.filename,
+        downloaded.url,
+        downloaded.offset_map,
+        downloaded.chunks,
+        backend,
+    )
+    return await _transcribe_uploaded(
+        message, services, cache_key, downloaded, backend, None, job, params
     )
-    return api, transcriber
 
 
-async def _download(
-    message: Message, reply_msg: Message, api: FileApi
+async def _probe(
+    services: Services,
+    probe_url: str,
+    job: SharedJob[tuple[str, str]],
+) -> ThomasmolParamsWithoutUrl | None:
+    """
+    Detect the language, and optionally the number of speakers, of a long recording from a clip of its start.
+
+    Returns None if the probe failed, to transcribe with the default parameters.
+
+    Not queued in the transcription stage: the probe is short, and bounded by PROBE_TIMEOUT_S,
+    so it should not wait behind whole recordings, nor hold a slot the recording itself then waits for.
+    """
+    await job.edit(f"{job.text}\nDetecting language...")
+    return await probe(
+        services.make_probe_transcriber(),
+        probe_url,
+        Settings.PROBE_TIMEOUT_S,
+        speakers=Settings.PROBE_SPEAKERS,
+    )
+
+
+async def _transcribe_uploaded(  # noqa: PLR0913
+    message: FileMessage,
+    services: Services,
+    cache_key: str | None,
+    downloaded: DownloadedFile,
+    backend: Backend,
+    predictions: list[str | None] | None,
+    job: SharedJob[tuple[str, str]],
+    params: ThomasmolParamsWithoutUrl | None = None,
 ) -> tuple[str, str]:
     """
-    Download the file attached to the message.
+    Transcribe and cache a file uploaded to file storage.
+
+    `backend`: Transcribes the file, unless it was uploaded in chunks. Its latency is recorded for routing later jobs.
+
+    `predictions`: Predictions sent before the bot restarted, to re-attach to instead of sending new jobs.
 
-    Returns tuple of [Minio URL, Path.stem of the downloaded file]
+    `params`: Parameters of thomasmol predictions, as detected by a probe. Defaults to `ThomasmolParamsWithoutUrl()`.
+
+    Returns the transcript and the name of the downloaded file.
     """
-    try:
-        handler = DownloadHandler(message, reply_msg, api)
-        url, filename = await handler.download()
+    filename = downloaded.filename
+    on_created = partial(services.job_store.set_prediction, *_job_owner(message))
+    on_hedged = partial(services.job_store.add_hedge, *_job_owner(message))
+
+    # Generate transcript
+    start = time.time()
+    transcriber: BaseTranscriber | ChunkedTranscriber
+    async with queued(services.stages.transcribe, message, job):
+        if downloaded.chunks:
+            transcriber = services.make_chunked_transcriber(
+                downloaded.chunks, downloaded.offset_map, params, on_hedged
+            )
+            transcript = await _get_transcript_chunked(
+                transcriber, job, predictions, on_created
+            )
+        else:
+            transcriber = services.make_transcriber(
+                downloaded.offset_map, backend, params, on_hedged
+            )
+            transcript = await _get_transcript(
+                transcriber,
+                job,
+                cast(str, downloaded.url),
+                predictions[0] if predictions else None,
+                on_created,
+            )
+            if downloaded.duration_s and (timings := transcriber.timings):
+                services.router.record(backend, downloaded.duration_s, timings)
+
+    if cache_key:
+        try:
+            await services.transcript_cache.put(
+                cache_key, transcript, transcriber.raw_output
+            )
+        except Exception:
+            _logger.exception("Failed to cache transcript")
+
+    done_txt = f"Transcription done in {format_hhmmss(time.time() - start)}. Sending transcript..."
+    await job.edit(done_txt)
+    return transcript, filename
+
+
+async def _run_transcription(
+    message: FileMessage,
+    reply_msg: ChatMessage,
+    services: Services,
+    cache_key: str | None,
+    work: Callable[[SharedJob[tuple[str, str]]], Coroutine[Any, Any, tuple[str, str]]],
+) -> tuple[str, str]:
+    """
+    Run `work`, or join the job already transcribing the same file, and notify the user of errors.
 
+    Returns the transcript and the name of the downloaded file.
+    """
+    try:
+        return await services.jobs.run(
+            cache_key,
+            reply_msg,
+            work,
+            owner=_job_owner(message),
+            # Its saved job follows the owner's, to be resumed at the same stage
+            on_join=partial(services.job_store.attach, *_job_owner(message)),
+        )
+    except StopPropagation:
+        raise
     except Exception as e:
-        await notify_error(message, "Encountered error:", e)
+        err_msg = (
+            "Encountered error:"
+            if isinstance(e, DownloadFailedError)
+            else "Transcription failed"
+        )
+        await notify_error(message, err_msg, e)
         raise StopPropagation from e
-    return url, filename
 
 
-async def main_handler(message: Message) -> None:
-    """Handle all incoming messages, including /start and audio/video files."""
+def _minutes_preview(partial_minutes: str) -> str:
+    if not partial_minutes:
+        return "Generating minutes..."
+    return f"Generating minutes...\n\n{partial_minutes[-_MAX_PREVIEW_CHARS:]}"
+
+
+async def _generate_minutes(
+    message: FileMessage,
+    reply_msg: ProgressMessage,
+    services: Services,
+    transcript: str,
+    on_progress: ProgressCallback,
+) -> str | None:
+    """Generate minutes of the transcript, once it is their turn. Returns None if generation failed."""
+    async with queued(services.stages.summary, message, reply_msg):
+        return await generate_summary(
+            services.openai,
+            transcript,
+            on_progress if Settings.STREAM_MINUTES else None,
+            services.summary_cache,
+        )
+
+
+async def _send_minutes(  # noqa: PLR0913
+    message: FileMessage,
+    reply_msg: ChatMessage,
+    services: Services,
+    transcript: str,
+    filename: str,
+    send_transcript: Callable[[], Coroutine[Any, Any, None]] | None = None,
+) -> None:
+    """
+    Generate minutes of the transcript, or take them from the summary cache, and send them.
+
+    If enabled, the minutes are shown as they are generated, then replaced by the file.
+
+    `reply_msg`: Shows the position in the queue, if minutes have to wait their turn.
+    `send_transcript`: Sends the transcript while the minutes are generated, so generation does not wait for the upload.
+
+    Raises `StopPropagation` if generation failed.
+    """
+    gen_minutes_msg: ChatMessage | None = None
+    partial_minutes = ""
+
+    def show_progress(text: str) -> None:
+        nonlocal partial_minutes
+        partial_minutes = text
+        if gen_minutes_msg:
+            services.edits.edit(
+                gen_minutes_msg, _minutes_preview(text), parse_mode=None
+            )
+
+    generation = asyncio.create_task(
+        _generate_minutes(
+            message,
+            ScheduledMessage(reply_msg, services.edits),
+            services,
+            transcript,
+            show_progress,
+        )
+    )
+    try:
+        if send_transcript:
+            await send_transcript()
+        if not generation.done():
+            # After the transcript, so the messages are in order
+            gen_minutes_msg = cast(
+                ChatMessage,
+                await message.reply(_minutes_preview(partial_minutes), parse_mode=None),
+            )
+        minutes = await generation
+    finally:
+        generation.cancel()
+        # Also if generation failed, so no preview is left behind
+        if gen_minutes_msg:
+            services.edits.discard(gen_minutes_msg)
+            await gen_minutes_msg.delete()
+
+    # Only reported now, so the error comes after the transcript
+    if not minutes:
+        await notify_error(message, "Failed to generate minutes!")
+        raise StopPropagation
+    await _send_text(message, minutes, f"{filename}_minutes.txt", "Completed summary.")
+
+
+async def _deliver(
+    message: FileMessage,
+    reply_msg: ChatMessage,
+    services: Services,
+    transcript: str,
+    filename: str,
+) -> None:
+    """Send the transcript while generating minutes, then send the minutes."""
+
+    async def send_transcript() -> None:
+        await _send_text(
+            message,
+            transcript,
+            f"{filename}.txt",
+            "Completed transcription.",
+        )
+        await services.job_store.set_transcript(*_job_owner(message), transcript)
+
+    await _send_minutes(
+        message, reply_msg, services, transcript, filename, send_transcript
+    )
+
+
+async def _cancel_hedges(hedges: list[str]) -> None:
+    """Cancel hedges sent before a restart. Only their predictions are re-attached to, so they would otherwise run for nothing."""
+    for pred_id in hedges:
+        try:
+            await ThomasmolTranscriber.cancel(pred_id)
+        except Exception:
+            _logger.exception("Failed to cancel hedge %s", pred_id)
+
+
+async def resume_job(
+    message: FileMessage, reply_msg: ChatMessage, stored: StoredJob, services: Services
+) -> None:
+    """
+    Finish a job interrupted by a restart, re-attaching to its predictions instead of transcribing the file again.
+
+    Jobs interrupted while downloading are not resumed, as nothing was uploaded yet: the user is asked to send the file again.
+    """
+    async with services.job_store.track(stored.chat_id, stored.message_id):
+        match stored.stage:
+            case "download":
+                services.edits.edit(
+                    reply_msg,
+                    "The bot restarted before your file was uploaded. Please send it again.",
+                )
+            case "transcription":
+                await _cancel_hedges(stored.hedges)
+                downloaded = DownloadedFile(
+                    stored.url,
+                    cast(str, stored.filename),
+                    stored.offset_map,
+                    stored.chunks,
+                )
+                services.edits.edit(reply_msg, "Resuming transcription...")
+                transcript, filename = await _run_transcription(
+                    message,
+                    reply_msg,
+                    services,
+                    stored.cache_key,
+                    partial(
+                        _transcribe_uploaded,
+                        message,
+                        services,
+                        stored.cache_key,
+                        downloaded,
+                        stored.backend,
+                        stored.predictions,
+                    ),
+                )
+                await _deliver(message, reply_msg, services, transcript, filename)
+            case "minutes":
+                await _send_minutes(
+                    message,
+                    reply_msg,
+                    services,
+                    cast(str, stored.transcript),
+                    cast(str, stored.filename),
+                )
+
+
+async def main_handler(message: Message, services: Services) -> None:
+    """
+    Handle all incoming messages, including /start and audio/video files.
+
+    Files are queued for workers if they are enabled, or else handled by `handle_file`.
+
+    `services`: Shared clients, bound at registration.
+    """
     if not DownloadHandler.should_handle_message(message):
         reply_msg = cast(
             Message,
@@ -119,50 +539,142 @@ async def main_handler(message: Message) -> None:
         raise StopPropagation
 
     reply_msg = cast(Message, await message.reply("Processing...", silent=True))
+    if services.relay:
+        await services.relay.enqueue(message, reply_msg)
+        return
+    if services.voice_batches and message.voice:
+        batch = await services.voice_batches.join(message)
+        if len(batch.messages) > 1:
+            await handle_voice_batch(message, reply_msg, batch, services)
+            return
+    await handle_file(message, reply_msg, services)
 
-    api, transcriber = _prepare_api_and_transcriber()
 
-    url, filename = await _download(message, reply_msg, api)
-    _logger.info("Filename from user: %s", filename)
+async def handle_file(
+    message: FileMessage, reply_msg: ChatMessage, services: Services
+) -> None:
+    """
+    Transcribe the file attached to a message, and generate minutes.
 
-    # Generate transcript
-    start = time.time()
-    try:
-        transcript = await _get_transcript(
-            transcriber,
+    Files which were transcribed before are answered from the transcript cache.
+    Files which are still being transcribed for another request share its job.
+    Jobs are saved until done, to be resumed if the bot restarts.
+
+    `reply_msg`: Kept updated with the job's progress.
+    """
+    cache_key = media_key(message)
+    cached = await services.transcript_cache.get(cache_key) if cache_key else None
+    if cached:
+        transcript = cached.transcript
+        file_name = message.file.name if message.file else None
+        filename = Path(file_name).stem if file_name else "transcript"
+        services.edits.edit(reply_msg, "Transcribed before. Sending transcript...")
+        send_transcript = partial(
+            _send_text,
+            message,
+            transcript,
+            f"{filename}.txt",
+            "Sent cached transcription.",
+        )
+        # Minutes generated before are taken from the summary cache
+        await _send_minutes(
+            message, reply_msg, services, transcript, filename, send_transcript
+        )
+        return
+
+    await services.job_store.add(*_job_owner(message), reply_msg.id, cache_key)
+    async with services.job_store.track(*_job_owner(message)):
+        transcript, filename = await _run_transcription(
+            message,
             reply_msg,
-            url,
+            services,
+            cache_key,
+            partial(_transcribe, message, services, cache_key),
         )
-    except StopPropagation:
-        raise
-    except Exception as e:
-        await notify_error(message, "Transcription failed", e)
-        raise StopPropagation from e
+        await _deliver(message, reply_msg, services, transcript, filename)
 
-    done_txt = f"Transcription done in {format_hhmmss(time.time() - start)}. Sending transcript..."
-    await reply_msg.edit(done_txt)
 
-    # Send transcript
+async def _transcribe_batch(
+    batch: VoiceBatch, services: Services, job: SharedJob[tuple[str, str]]
+) -> tuple[str, str]:
+    """
+    Join the voice messages of a batch, transcribe them as one file, and split the transcript into `batch.texts`.
+
+    Returns the joined transcript, and a name for it.
+    """
+    first = batch.messages[0]
+    await job.edit(f"Transcribing {len(batch.messages)} voice messages together...")
     with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as temp_dir:
-        f = Path(temp_dir) / f"{filename}.txt"
-        f.write_text(transcript)
-        await message.reply(file=f)
+        dirs = [Path(temp_dir) / str(m.id) for m in batch.messages]
+        for d in dirs:
+            d.mkdir()
+        sources = await asyncio.gather(
+            *(
+                DownloadHandler(m, job, services.file_api, services.stages).download_to(
+                    d
+                )
+                for m, d in zip(batch.messages, dirs, strict=True)
+            )
+        )
+        # Telegram rounds durations to whole seconds, too coarse to split the transcript by
+        durations = await asyncio.gather(*(get_duration_s(p) for p in sources))
+        async with queued(services.stages.preprocess, first, job):
+            joined = await join_audio(
+                sources,
+                durations,
+                Path(temp_dir),
+                Settings.PREPROCESS_CODEC,
+                Settings.VOICE_BATCH_GAP_S,
+            )
+        url = await services.file_api.upload_file(
+            joined, destination_name(Path(f"voice_messages{joined.suffix}"))
+        )
 
-        # Notify me
-        log_msg = f"Completed transcription: {done_txt}"
-        await notify_me(message, log_msg, f)
+    # Splitting needs the segments, which only thomasmol outputs
+    transcriber = services.make_transcriber()
+    async with queued(services.stages.transcribe, first, job):
+        transcript = await _get_transcript(transcriber, job, url, None, None)
 
-    # Generate minutes
-    gen_minutes_msg = cast(Message, await message.reply("Generating minutes..."))
-    minutes = await generate_summary(transcript)
-    if not minutes:
-        await notify_error(message, "Failed to generate minutes!")
-        raise StopPropagation
+    segments = Output.model_validate(transcriber.raw_output).segments
+    texts = split_segments(
+        segments, part_offsets(durations, Settings.VOICE_BATCH_GAP_S)
+    )
+    # Not cached per message: split by timestamps, they may differ from transcribing the message alone
+    for message, text in zip(batch.messages, texts, strict=True):
+        batch.texts[message.id] = text or "(No speech detected)"
 
-    # Send minutes
-    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as temp_dir:
-        f = Path(temp_dir) / f"{filename}_minutes.txt"
-        f.write_text(minutes)
-        await gen_minutes_msg.delete()
-        await message.reply(file=f)
-        await notify_me(message, "Completed summary.", f)
+    await job.edit("Transcription done. Sending transcripts...")
+    return transcript, "voice_messages"
+
+
+async def handle_voice_batch(
+    message: FileMessage, reply_msg: ChatMessage, batch: VoiceBatch, services: Services
+) -> None:
+    """
+    Transcribe a voice message together with the rest of its batch, and reply with its own transcript.
+
+    The handler of every message in the batch calls this: they share one job, whose progress is mirrored to each reply message.
+    Minutes of the whole batch are sent once, in reply to its last message.
+    """
+    await services.job_store.add(*_job_owner(message), reply_msg.id, None)
+    async with services.job_store.track(*_job_owner(message)):
+        transcript, filename = await _run_transcription(
+            message,
+            reply_msg,
+            services,
+            batch.key,
+            partial(_transcribe_batch, batch, services),
+        )
+        send_transcript = partial(
+            _send_text,
+            message,
+            batch.texts[message.id],
+            "voice message.txt",
+            "Completed transcription.",
+        )
+        if message is not batch.messages[-1]:
+            await send_transcript()
+            return
+        await _send_minutes(
+            message, reply_msg, services, transcript, filename, send_transcript
+        )
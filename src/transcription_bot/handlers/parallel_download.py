@@ -0,0 +1,82 @@
+"""
+Download Telegram media with several requests in flight at once.
+
+A single `download_media` call waits for each part before requesting the next, which caps throughput for large files.
+Here the file is split into contiguous ranges of parts, each fetched by its own `iter_download`, so the requests of all ranges are pipelined.
+"""
+
+import asyncio
+import logging
+import math
+from pathlib import Path
+from typing import BinaryIO
+
+from telethon import TelegramClient
+from telethon.types import Document
+
+from transcription_bot.file_api.base_api import ProgressCallback
+
+_logger = logging.getLogger(__name__)
+
+PART_SIZE = 512 * 1024
+"""Bytes requested per GetFileRequest. This is the maximum Telegram allows."""
+
+
+def split_parts(size: int, connections: int, part_size: int = PART_SIZE) -> list[range]:
+    """Split a file of `size` bytes into contiguous ranges of part indices, at most one per connection."""
+    n_parts = math.ceil(size / part_size)
+    per_connection = max(1, math.ceil(n_parts / connections))
+    return [
+        range(start, min(start + per_connection, n_parts))
+        for start in range(0, n_parts, per_connection)
+    ]
+
+
+async def download_parallel(
+    client: TelegramClient,
+    document: Document,
+    path: Path,
+    connections: int,
+    progress_cb: ProgressCallback | None = None,
+) -> Path:
+    """
+    Download a document to `path`, fetching `connections` ranges of it at once.
+
+    `progress_cb`: Called with the total bytes received so far, in the same way as `download_media`'s progress_callback.
+
+    If the download fails, the partial file is deleted.
+    """
+    size = document.size
+    ranges = split_parts(size, connections)
+    received = 0
+
+    async def download_range(parts: range, f: BinaryIO) -> None:
+        nonlocal received
+        offset = parts.start * PART_SIZE
+        async for chunk in client.iter_download(
+            document,
+            offset=offset,
+            limit=len(parts),
+            request_size=PART_SIZE,
+            file_size=size,
+        ):
+            f.seek(offset)
+            f.write(chunk)
+            offset += len(chunk)
+            received += len(chunk)
+            if progress_cb:
+                await progress_cb(received, size)
+
+    _logger.info("Downloading %s bytes in %s ranges", size, len(ranges))
+    try:
+        with path.open("wb") as f:
+            f.truncate(size)
+            # Cancels the other ranges if one fails
+            async with asyncio.TaskGroup() as tg:
+                for parts in ranges:
+                    tg.create_task(download_range(parts, f))
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+    return path
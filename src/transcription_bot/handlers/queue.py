@@ -0,0 +1,166 @@
+"""
+Limit how many jobs run each stage of the pipeline at once, fairly across senders.
+
+Jobs waiting for a stage are admitted round-robin by sender, so one user sending many files does not hold up everyone else.
+Waiting jobs are told their position in the queue, which is updated as the queue drains.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Coroutine
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from transcription_bot.handlers.types import FileMessage, ProgressMessage
+
+_logger = logging.getLogger(__name__)
+
+type PositionCallback = Callable[[int], Coroutine[Any, Any, None]]
+"""Called with the 1-based position of a job in the queue, whenever it changes."""
+
+
+@dataclass(eq=False)
+class _Waiter:
+    sender: int
+    admitted: asyncio.Future[None]
+    on_position: PositionCallback | None
+    position: int = 0
+
+
+class FairStage:
+    """A stage of the pipeline, run by at most `concurrency` jobs at once."""
+
+    def __init__(self, name: str, concurrency: int) -> None:
+        """`name`: Shown to users waiting in the queue."""
+        self.name = name
+        self.concurrency = concurrency
+        self._running = 0
+        self._queues: dict[int, deque[_Waiter]] = {}
+        """Waiting jobs of each sender. The sender admitted next is first."""
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    @property
+    def waiting(self) -> int:
+        """Number of jobs waiting to run the stage."""
+        return sum(len(q) for q in self._queues.values())
+
+    def _order(self) -> list[_Waiter]:
+        """Return the waiting jobs, in the order they will be admitted."""
+        queues = list(self._queues.values())
+        longest = max(map(len, queues), default=0)
+        return [q[i] for i in range(longest) for q in queues if i < len(q)]
+
+    def _notify_positions(self) -> None:
+        for position, waiter in enumerate(self._order(), start=1):
+            if waiter.position == position or not waiter.on_position:
+                continue
+            waiter.position = position
+            task = asyncio.create_task(waiter.on_position(position))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _admit(self) -> None:
+        while self._running < self.concurrency and self._queues:
+            sender = next(iter(self._queues))
+            queue = self._queues.pop(sender)
+            waiter = queue.popleft()
+            if queue:
+                # To the back of the rotation
+                self._queues[sender] = queue
+            if waiter.admitted.done():
+                # Cancelled, but its task has not run yet to leave the queue
+                continue
+            self._running += 1
+            waiter.admitted.set_result(None)
+        self._notify_positions()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Remove a cancelled waiter from the queue, unless `_admit` already skipped it."""
+        queue = self._queues.get(waiter.sender)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.sender]
+        self._notify_positions()
+
+    def _release(self) -> None:
+        self._running -= 1
+        self._admit()
+
+    @asynccontextmanager
+    async def slot(
+        self, sender: int, on_position: PositionCallback | None = None
+    ) -> AsyncIterator[None]:
+        """
+        Wait for a turn to run the stage, and hold it while in the context.
+
+        `sender`: Jobs are admitted round-robin across senders.
+        `on_position`: Called while waiting, whenever the job's position in the queue changes.
+        """
+        if self._running < self.concurrency and not self._queues:
+            self._running += 1
+        else:
+            waiter = _Waiter(
+                sender, asyncio.get_running_loop().create_future(), on_position
+            )
+            self._queues.setdefault(sender, deque()).append(waiter)
+            _logger.info("Waiting for %s, %s in queue", self.name, self.waiting)
+            self._notify_positions()
+            try:
+                await waiter.admitted
+            except asyncio.CancelledError:
+                if waiter.admitted.cancelled():
+                    self._remove(waiter)
+                else:
+                    # Admitted just as it was cancelled
+                    self._release()
+                raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+
+@dataclass(frozen=True)
+class Stages:
+    """The stages of the pipeline which are limited."""
+
+    download: FairStage
+    preprocess: FairStage
+    transcribe: FairStage
+    summary: FairStage
+
+
+@asynccontextmanager
+async def queued(
+    stage: FairStage | None, message: FileMessage, reply_msg: ProgressMessage
+) -> AsyncIterator[None]:
+    """
+    Wait for a turn to run `stage` for the sender of `message`, showing the position in the queue in `reply_msg`.
+
+    Once admitted, `reply_msg` is restored. If `stage` is None, the stage is not limited.
+    """
+    if not stage:
+        yield
+        return
+
+    text = str(reply_msg.text)
+    waited = admitted = False
+
+    async def show_position(position: int) -> None:
+        nonlocal waited
+        if admitted:
+            return
+        waited = True
+        await reply_msg.edit(
+            f"{text}\nPosition {position} in queue for {stage.name}..."
+        )
+
+    async with stage.slot(message.sender_id or 0, show_position):
+        admitted = True
+        if waited:
+            await reply_msg.edit(text)
+        yield
@@ -1,23 +1,28 @@
 import logging
+from functools import partial
 
 from telethon import TelegramClient, events
 
+from transcription_bot.services import Services
+
 from .cancel import handle_cancel
 from .main import main_handler
 
 logger = logging.getLogger(__name__)
 
 
-def register_handlers(client: TelegramClient) -> None:
+def register_handlers(client: TelegramClient, services: Services) -> None:
     """
     Register Telethon handlers.
 
+    `services`: Shared clients created at startup, bound to handlers which need them.
+
     Registered handlers will be called in order, so add the most specific ones first.
 
     Raise a StopPropagation if no further handlers should handle the message.
     """
     client.add_event_handler(
-        main_handler,
+        partial(main_handler, services=services),
         events.NewMessage(
             incoming=True,
         ),
@@ -0,0 +1,63 @@
+import asyncio
+import contextlib
+import logging
+from typing import cast
+
+from telethon import TelegramClient
+from telethon.custom import Message
+from telethon.events import StopPropagation
+
+from transcription_bot.cache.jobs import StoredJob
+from transcription_bot.services import Services
+
+from .main import resume_job
+
+_logger = logging.getLogger(__name__)
+
+_tasks: set[asyncio.Task[None]] = set()
+
+
+async def _resume(
+    client: TelegramClient, services: Services, stored: StoredJob
+) -> None:
+    messages = cast(
+        list[Message | None],
+        await client.get_messages(
+            stored.chat_id, ids=[stored.message_id, stored.reply_msg_id]
+        ),
+    )
+    message, reply_msg = messages if len(messages) == 2 else (None, None)  # noqa: PLR2004
+    if not message or not reply_msg:
+        _logger.warning(
+            "Messages of job %s/%s were deleted, dropping it",
+            stored.chat_id,
+            stored.message_id,
+        )
+        await services.job_store.remove(stored.chat_id, stored.message_id)
+        return
+
+    _logger.info(
+        "Resuming job %s/%s at %s", stored.chat_id, stored.message_id, stored.stage
+    )
+    with contextlib.suppress(StopPropagation):
+        await resume_job(message, reply_msg, stored, services)
+
+
+def _log_failure(task: asyncio.Task[None]) -> None:
+    if not task.cancelled() and (e := task.exception()):
+        _logger.error("Failed to resume job", exc_info=e)
+
+
+async def resume_jobs(client: TelegramClient, services: Services) -> None:
+    """
+    Resume the jobs which had not finished when the bot last stopped, in the background.
+
+    Call once the client is connected.
+    """
+    jobs = await services.job_store.unfinished()
+    _logger.info("Resuming %s unfinished jobs", len(jobs))
+    for stored in jobs:
+        task = asyncio.create_task(_resume(client, services, stored))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        task.add_done_callback(_log_failure)
@@ -0,0 +1,191 @@
+"""
+Share one job between every request for the same media.
+
+If a file is sent again while it is still being transcribed, the new request subscribes to the running job instead of starting another prediction.
+"""
+
+import asyncio
+import logging
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass, field
+from typing import Any, cast
+
+from telethon import Button
+from telethon.events import StopPropagation
+
+from .cancel import register_cancel_callback, unregister_cancel_callback
+from .edits import EditScheduler
+from .types import ChatMessage
+
+_logger = logging.getLogger(__name__)
+
+type CancelCallback = Callable[[], Coroutine[Any, Any, None]]
+
+type JobOwner = tuple[int, int]
+"""(chat id, message id) of the request which started a job."""
+
+type JoinCallback = Callable[[JobOwner], Coroutine[Any, Any, None]]
+"""Called with the owner of the job a request joins."""
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    reply_msg: ChatMessage
+    cancelled: asyncio.Event = field(default_factory=asyncio.Event)
+    cancel_msg: ChatMessage | None = None
+    cancel_token: str | None = None
+
+
+class SharedJob[T]:
+    """
+    A job shared by every request for the same media.
+
+    The job is given this object in place of a reply message: edits are mirrored to the reply message of each subscriber.
+    """
+
+    def __init__(
+        self, text: str, edits: EditScheduler, owner: JobOwner | None = None
+    ) -> None:
+        """
+        Prepare a job. Call `start` to run it.
+
+        `text`: Initial text of the reply messages.
+        `edits`: Sends the edits of the reply messages.
+        `owner`: The request which started the job.
+        """
+        self.text = text
+        self.owner = owner
+        self._edits = edits
+        self._subscribers: list[_Subscriber] = []
+        self._cancel: CancelCallback | None = None
+        self.task: asyncio.Task[T]
+
+    @property
+    def _active(self) -> list[_Subscriber]:
+        return [s for s in self._subscribers if not s.cancelled.is_set()]
+
+    def start(self, work: Callable[["SharedJob[T]"], Coroutine[Any, Any, T]]) -> None:
+        """Run the job in the background."""
+        self.task = asyncio.create_task(work(self))
+        # The result may be left unretrieved if every subscriber cancelled
+        self.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def subscribe(self, reply_msg: ChatMessage) -> _Subscriber:
+        """Mirror progress to another reply message."""
+        subscriber = _Subscriber(reply_msg)
+        self._subscribers.append(subscriber)
+        if reply_msg.text != self.text:
+            self._edits.edit(reply_msg, self.text)
+        if self._cancel:
+            await self._show_cancel_button(subscriber)
+        return subscriber
+
+    async def edit(self, text: str, **kwargs: Any) -> None:
+        """
+        Edit the reply message of every subscriber which has not cancelled.
+
+        The edits are sent in the background, so this never waits for rate limits.
+        """
+        self.text = text
+        for subscriber in self._active:
+            self._edits.edit(subscriber.reply_msg, text, **kwargs)
+
+    async def _show_cancel_button(self, subscriber: _Subscriber) -> None:
+        subscriber.cancel_token = register_cancel_callback(
+            lambda: self._unsubscribe(subscriber)
+        )
+        subscriber.cancel_msg = cast(
+            ChatMessage,
+            await subscriber.reply_msg.reply(
+                "Transcribing...",
+                buttons=[Button.inline("Cancel", subscriber.cancel_token)],
+            ),
+        )
+
+    async def show_cancel_button(self, cancel: CancelCallback) -> None:
+        """
+        Reply to each subscriber with a cancel button.
+
+        `cancel`: Cancels the job. Called once every subscriber has pressed their button.
+        """
+        self._cancel = cancel
+        await asyncio.gather(*(self._show_cancel_button(s) for s in self._active))
+
+    async def hide_cancel_button(self) -> None:
+        """Delete the cancel buttons, once the job can no longer be cancelled."""
+        self._cancel = None
+        for subscriber in self._subscribers:
+            if subscriber.cancel_token:
+                unregister_cancel_callback(subscriber.cancel_token)
+        await asyncio.gather(
+            *(s.cancel_msg.delete() for s in self._active if s.cancel_msg)
+        )
+
+    async def _unsubscribe(self, subscriber: _Subscriber) -> None:
+        subscriber.cancelled.set()
+        if self._active:
+            _logger.info("Subscriber cancelled, %s remaining", len(self._active))
+        elif self._cancel:
+            await self._cancel()
+
+    async def wait(self, subscriber: _Subscriber) -> T:
+        """
+        Wait for the job's result.
+
+        Raises `StopPropagation` if the subscriber cancelled, even if the job continues for others.
+        """
+        cancelled = asyncio.create_task(subscriber.cancelled.wait())
+        try:
+            await asyncio.wait(
+                (self.task, cancelled), return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            cancelled.cancel()
+        if subscriber.cancelled.is_set():
+            raise StopPropagation
+        return self.task.result()
+
+
+class SingleFlight[T]:
+    """In-flight jobs, keyed by media identity."""
+
+    def __init__(self, edits: EditScheduler) -> None:
+        """
+        Start with no jobs.
+
+        `edits`: Sends the edits of reply messages.
+        """
+        self._edits = edits
+        self._jobs: dict[str, SharedJob[T]] = {}
+
+    async def run(
+        self,
+        key: str | None,
+        reply_msg: ChatMessage,
+        work: Callable[[SharedJob[T]], Coroutine[Any, Any, T]],
+        owner: JobOwner | None = None,
+        on_join: JoinCallback | None = None,
+    ) -> T:
+        """
+        Run `work`, or subscribe to the job already running for `key`.
+
+        `key`: Identifies the media. If None, the job is not shared.
+        `reply_msg`: Kept updated with the job's progress.
+        `work`: Given the job, to update the reply messages through.
+        `owner`: Identifies this request, if it starts the job.
+        `on_join`: Called with the owner of the running job, if this request joins it instead.
+        """
+        job = self._jobs.get(key) if key else None
+        if job:
+            _logger.info("Joining in-flight job for %s", key)
+            if on_join and job.owner:
+                await on_join(job.owner)
+            subscriber = await job.subscribe(reply_msg)
+        else:
+            job = SharedJob[T](str(reply_msg.text), self._edits, owner)
+            subscriber = await job.subscribe(reply_msg)
+            job.start(work)
+            if key:
+                self._jobs[key] = job
+                job.task.add_done_callback(lambda _: self._jobs.pop(key, None))
+        return await job.wait(subscriber)
@@ -1,24 +1,259 @@
+"""
+Generate minutes of a transcript with an OpenAI-compatible API.
+
+Transcripts too long for one completion are split into chunks at speaker turns. The chunks are summarized concurrently (map),
+then the notes are combined into minutes (reduce), so latency is about one chunk and one reduce call for most meetings.
+Notes too long for one completion are first combined in groups, as many times as needed, so each call stays within the chunk size.
+
+The minutes can be streamed as they are generated, to show progress long before they are complete.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from collections.abc import Callable
+from typing import TYPE_CHECKING, cast
+
 from openai import AsyncOpenAI
 
+from transcription_bot.cache.summaries import SummaryCache
 from transcription_bot.settings import Settings
 
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
+_logger = logging.getLogger(__name__)
+
+type ProgressCallback = Callable[[str], None]
+"""Called with the minutes generated so far, or with the progress of the chunks before that."""
+
 _MODEL_PROMPT = "{text}\nWrite detailed minutes for the above meeting."
 
+_MAP_PROMPT = (
+    "{text}\nThe above is part {part} of {parts} of a meeting transcript. "
+    "Write detailed notes of the discussion, decisions and action items in this part."
+)
+
+_COMBINE_PROMPT = (
+    "{notes}\nThe above are notes of consecutive parts of one meeting. "
+    "Combine them into one set of detailed notes of the discussion, decisions and action items."
+)
+
+_REDUCE_PROMPT = (
+    "{notes}\nThe above are notes of consecutive parts of one meeting. "
+    "Write detailed minutes for the whole meeting."
+)
+
+_CHARS_PER_TOKEN = 3
+"""
+Rough length of a token, to size chunks without a tokenizer.
+
+English averages about 4 characters a token, and most other languages fewer, so this overestimates tokens rather than overflow the context.
+"""
+
+_TURN_SEPARATOR = "\n\n"
+"""Separates speaker turns in a transcript."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in `text`. Errs on the high side, especially for English."""
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def _split_turn(turn: str, max_chars: int) -> list[str]:
+    """Split a turn too long for a chunk at word boundaries."""
+    pieces: list[str] = []
+    current = ""
+    for word in turn.split(" "):
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    return [*pieces, current]
+
+
+def split_transcript(transcript: str, max_tokens: int) -> list[str]:
+    """
+    Split a transcript into chunks of about `max_tokens` tokens at most, along speaker turns.
+
+    Turns longer than a chunk are split between words.
+    """
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    chunks: list[str] = []
+    current: list[str] = []
+    length = 0
+    for turn in transcript.split(_TURN_SEPARATOR):
+        for piece in _split_turn(turn, max_chars) if len(turn) > max_chars else [turn]:
+            if current and length + len(_TURN_SEPARATOR) + len(piece) > max_chars:
+                chunks.append(_TURN_SEPARATOR.join(current))
+                current, length = [], 0
+            length += len(piece) + (len(_TURN_SEPARATOR) if current else 0)
+            current.append(piece)
+    if current:
+        chunks.append(_TURN_SEPARATOR.join(current))
+    return chunks
+
+
+async def _complete(
+    client: AsyncOpenAI, prompt: str, on_progress: ProgressCallback | None = None
+) -> str | None:
+    """Return the completion of `prompt`, streaming it to `on_progress` if provided."""
+    messages: list[ChatCompletionMessageParam] = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt},
+    ]
+    if not on_progress:
+        completion = await client.chat.completions.create(
+            model=Settings.OPENAI_MODEL_NAME, messages=messages
+        )
+        return completion.choices[0].message.content
 
-async def generate_summary(transcript: str) -> str | None:
-    """Generate minutes for the transcript."""
-    client = AsyncOpenAI(
-        api_key=Settings.OPENAI_API_KEY.get_secret_value(),
-        base_url=Settings.OPENAI_BASE_URL,
+    stream = await client.chat.completions.create(
+        model=Settings.OPENAI_MODEL_NAME, messages=messages, stream=True
     )
-    completion = await client.chat.completions.create(
-        model=Settings.OPENAI_MODEL_NAME,
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {
-                "role": "user",
-                "content": _MODEL_PROMPT.format(text=transcript),
-            },
+    content = ""
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            content += chunk.choices[0].delta.content
+            on_progress(content)
+    return content or None
+
+
+def summary_key(transcript: str, chunks: int) -> str:
+    """
+    Return a key identifying the minutes of a transcript: a hash of the transcript, the model and the prompts used.
+
+    `chunks`: Number of chunks the transcript is split into. The chunk size only matters if there are several.
+    """
+    how = (
+        [_MAP_PROMPT, _COMBINE_PROMPT, _REDUCE_PROMPT, Settings.SUMMARY_CHUNK_TOKENS]
+        if chunks > 1
+        else [_MODEL_PROMPT]
+    )
+    return hashlib.sha256(
+        json.dumps([Settings.OPENAI_MODEL_NAME, *how, transcript]).encode()
+    ).hexdigest()
+
+
+async def generate_summary(
+    client: AsyncOpenAI,
+    transcript: str,
+    on_progress: ProgressCallback | None = None,
+    cache: SummaryCache | None = None,
+) -> str | None:
+    """
+    Generate minutes for the transcript, in chunks if it is long.
+
+    `client`: Shared by all summaries, to reuse its connections.
+    `on_progress`: If provided, the minutes are streamed to it as they are generated.
+    `cache`: If provided, minutes generated before for the same transcript, model and prompts are returned at once.
+    """
+    chunks = split_transcript(transcript, Settings.SUMMARY_CHUNK_TOKENS)
+    key = summary_key(transcript, len(chunks))
+    if cache and (minutes := await cache.get(key)):
+        return minutes
+
+    minutes = await _summarize(client, transcript, chunks, on_progress)
+    if cache and minutes:
+        try:
+            await cache.put(key, minutes)
+        except Exception:
+            _logger.exception("Failed to cache minutes")
+    return minutes
+
+
+def _join_notes(notes: list[str]) -> str:
+    return "\n\n".join(f"Part {i}:\n{n}" for i, n in enumerate(notes, start=1))
+
+
+def _group_notes(notes: list[str], max_tokens: int) -> list[list[str]]:
+    """
+    Group consecutive notes of about `max_tokens` tokens at most, to be combined.
+
+    Each group has two notes at least, so combining them always shortens the list, even if a note alone is too long.
+    """
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    groups: list[list[str]] = []
+    length = 0
+    for note in notes:
+        if groups and (len(groups[-1]) < 2 or length + len(note) <= max_chars):  # noqa: PLR2004
+            groups[-1].append(note)
+            length += len(note)
+        else:
+            groups.append([note])
+            length = len(note)
+    if len(groups) > 1 and len(groups[-1]) < 2:  # noqa: PLR2004
+        groups[-2].extend(groups.pop())
+    return groups
+
+
+async def _complete_all(
+    client: AsyncOpenAI,
+    prompts: list[str],
+    semaphore: asyncio.Semaphore,
+    on_done: Callable[[int], None] | None = None,
+) -> list[str] | None:
+    """Return the completions of `prompts`, run concurrently up to the semaphore. None if any failed."""
+    done = 0
+
+    async def complete(prompt: str) -> str | None:
+        nonlocal done
+        async with semaphore:
+            completion = await _complete(client, prompt)
+        done += 1
+        if on_done:
+            on_done(done)
+        return completion
+
+    completions = await asyncio.gather(*(complete(p) for p in prompts))
+    if failed := sum(not c for c in completions):
+        _logger.error("%s of %s completions failed", failed, len(completions))
+        return None
+    return cast(list[str], completions)
+
+
+async def _summarize(
+    client: AsyncOpenAI,
+    transcript: str,
+    chunks: list[str],
+    on_progress: ProgressCallback | None,
+) -> str | None:
+    if len(chunks) <= 1:
+        return await _complete(
+            client, _MODEL_PROMPT.format(text=transcript), on_progress
+        )
+
+    _logger.info("Summarizing transcript in %s chunks", len(chunks))
+    semaphore = asyncio.Semaphore(Settings.SUMMARY_CHUNK_CONCURRENCY)
+    notes = await _complete_all(
+        client,
+        [
+            _MAP_PROMPT.format(text=chunk, part=part, parts=len(chunks))
+            for part, chunk in enumerate(chunks, start=1)
         ],
+        semaphore,
+        lambda done: on_progress(
+            f"Summarized {done}/{len(chunks)} parts of the meeting..."
+        )
+        if on_progress
+        else None,
+    )
+    while (
+        notes and len(groups := _group_notes(notes, Settings.SUMMARY_CHUNK_TOKENS)) > 1
+    ):
+        _logger.info("Combining %s notes in %s groups", len(notes), len(groups))
+        if on_progress:
+            on_progress("Combining the notes of the meeting...")
+        notes = await _complete_all(
+            client,
+            [_COMBINE_PROMPT.format(notes=_join_notes(group)) for group in groups],
+            semaphore,
+        )
+    if not notes:
+        return None
+    return await _complete(
+        client, _REDUCE_PROMPT.format(notes=_join_notes(notes)), on_progress
     )
-    return completion.choices[0].message.content
@@ -1,3 +1,84 @@
+from typing import Any, Protocol
+
+from telethon.tl.custom.file import File
+from telethon.types import Document
+
+
+class ProgressMessage(Protocol):
+    """
+    A message kept updated with a job's progress.
+
+    Either a reply message, or a `SharedJob` mirroring edits to the reply message of each of its subscribers.
+    """
+
+    @property
+    def text(self) -> str:
+        """Current text of the message."""
+        ...
+
+    async def edit(self, text: str, **kwargs: Any) -> Any:
+        """Replace the text of the message."""
+        ...
+
+
+class ChatMessage(Protocol):
+    """
+    A message the bot edits, replies to or deletes.
+
+    Either a Telethon `Message`, or a `RemoteMessage` relaying these to the front-end from a worker.
+    """
+
+    @property
+    def chat_id(self) -> int | None: ...  # noqa: D102
+
+    @property
+    def id(self) -> int: ...  # noqa: D102
+
+    @property
+    def text(self) -> str | None: ...  # noqa: D102
+
+    async def edit(self, text: str, **kwargs: Any) -> Any: ...  # noqa: D102
+
+    async def reply(self, *args: Any, **kwargs: Any) -> Any: ...  # noqa: D102
+
+    async def delete(self) -> Any: ...  # noqa: D102
+
+
+class FileMessage(ChatMessage, Protocol):
+    """A message with a file sent to the bot, as used by the handlers."""
+
+    @property
+    def sender_id(self) -> int | None: ...  # noqa: D102
+
+    @property
+    def sender(self) -> Any: ...  # noqa: D102
+
+    @property
+    def client(self) -> Any: ...  # noqa: D102
+
+    @property
+    def file(self) -> File | None: ...  # noqa: D102
+
+    @property
+    def media(self) -> Any: ...  # noqa: D102
+
+    @property
+    def document(self) -> Document | None: ...  # noqa: D102
+
+    @property
+    def audio(self) -> Document | None: ...  # noqa: D102
+
+    @property
+    def voice(self) -> Document | None: ...  # noqa: D102
+
+    @property
+    def video(self) -> Document | None: ...  # noqa: D102
+
+    async def download_media(self, *args: Any, **kwargs: Any) -> Any: ...  # noqa: D102
+
+    async def get_sender(self) -> Any: ...  # noqa: D102
+
+
 class NoMediaFileError(Exception):
     """No media file found in the message."""
 
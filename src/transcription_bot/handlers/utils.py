@@ -1,31 +1,19 @@
+import io
 import logging
 import traceback
-from pathlib import Path
 from typing import cast
 
-import ffmpeg
-from telethon import TelegramClient, errors
-from telethon.custom import Message
+from telethon import TelegramClient
+from telethon.hints import FileLike
 from telethon.types import User
 
+from transcription_bot.handlers.types import FileMessage
 from transcription_bot.settings import Settings
 
 _logger = logging.getLogger(__name__)
 
 
-async def on_update(message: Message, text: str, parse_mode: str = "html") -> None:
-    """Update a telegram message with the text. Use as a callback."""
-    # Don't update the message if it is identical or Telegram will throw errors
-    try:
-        await message.edit(text, parse_mode=parse_mode)
-    except errors.FloodWaitError:
-        _logger.exception("FloodWaitError: not sending message '%s", text)
-    except errors.MessageNotModifiedError:
-        # How to get original message text?
-        pass
-
-
-def is_other_user(message: Message) -> bool:
+def is_other_user(message: FileMessage) -> bool:
     """Return whether a message is sent from another user other than myself."""
     return (
         cast(User, message.sender).username != Settings.MY_USERNAME.get_secret_value()
@@ -33,7 +21,7 @@ def is_other_user(message: Message) -> bool:
 
 
 async def notify_error(
-    message: Message,
+    message: FileMessage,
     err_msg: str,
     exc: Exception | None = None,
 ) -> None:
@@ -62,24 +50,29 @@ async def notify_error(
     await message.reply(f"Encountered error:\n\n{_err_msg}", parse_mode="html")
 
 
-def get_sender_name(message: Message) -> str:
+def get_sender_name(message: FileMessage) -> str:
     """Return a message's sender's first_name."""
     sender = message.sender
     return sender.first_name if sender else "Unknown sender"
 
 
-def ffprobe_get_duration_s(path: Path) -> float:
-    """Get duration of a media file."""
-    return float(ffmpeg.probe(path)["format"]["duration"])
+def text_file(text: str, filename: str) -> io.BytesIO:
+    """Return `text` as an in-memory file named `filename`, to send without writing it to disk."""
+    file = io.BytesIO(text.encode())
+    # Telethon takes the file name from the name attribute
+    file.name = filename
+    return file
 
 
-async def notify_me(message: Message, text: str, file: Path | None) -> None:
+async def notify_me(message: FileMessage, text: str, file: FileLike | None) -> None:
     """
     Notify me with a message, optionally including a file.
 
     Also logs the message.
 
     Includes the sender's name.
+
+    `file`: Preferably a file already uploaded or sent, e.g. the message's media, so it is not uploaded again.
     """
     if not is_other_user(message):
         return
@@ -91,6 +84,6 @@ async def notify_me(message: Message, text: str, file: Path | None) -> None:
     await cast(TelegramClient, message.client).send_message(
         Settings.MY_USERNAME.get_secret_value(),
         log_msg,
-        file=file.open("rb") if file else None,  # pyright: ignore[reportArgumentType]
+        file=file,  # pyright: ignore[reportArgumentType]
         silent=True,
     )
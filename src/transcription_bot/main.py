@@ -1,28 +1,202 @@
 """Setup client and start the bot proper."""
 
-from typing import NoReturn
+import asyncio
+import logging
+import multiprocessing
+from collections.abc import Coroutine
+from dataclasses import replace
+from functools import partial
+from typing import Any, NoReturn, cast
 
+import httpx
+import replicate
 import uvloop
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from telethon import TelegramClient
 
+from .cache.jobs import JobStore
+from .cache.summaries import SummaryCache
+from .cache.transcripts import TranscriptCache
+from .file_api.minio_api import FileApi
+from .file_api.policy import Policy
+from .handlers.batch import VoiceBatcher
+from .handlers.edits import EditScheduler
+from .handlers.queue import FairStage, Stages
 from .handlers.register import register_handlers
+from .handlers.resume import resume_jobs
+from .handlers.single_flight import SingleFlight
+from .services import Services
 from .settings import Settings
+from .transcribers.local import WhisperEngine, make_pool
+from .transcribers.replicate.base import Hedging
+from .transcribers.replicate.insanely_fast_whisper import InsanelyFastWhisper
+from .transcribers.replicate.poller import PredictionPoller
+from .transcribers.replicate.thomasmol import ThomasmolTranscriber
+from .transcribers.replicate.versions import ModelVersionCache
+from .transcribers.replicate.webhooks import WebhookReceiver
+from .transcribers.router import BackendRouter
 from .utils.logger import setup_logging
+from .workers.frontend import Relay
+from .workers.queue import SqliteJobQueue
+
+_logger = logging.getLogger(__name__)
+
+
+async def bootstrap(*, webhooks: bool = True) -> Services:
+    """
+    Create the clients shared by all handlers.
+
+    Sets up the Minio bucket and policy, and fetches the Replicate model version once, instead of on every message.
+    Starts the prediction poller and edit scheduler, and the webhook receiver if enabled.
+
+    `webhooks`: False if this process creates no predictions, so needs no webhook receiver.
+    """
+    file_api = await asyncio.to_thread(
+        FileApi,
+        host=Settings.MINIO_HOST,
+        access_key=Settings.MINIO_ACCESS_KEY.get_secret_value(),
+        bucket_name=Settings.MINIO_BUCKET,
+        secret_key=Settings.MINIO_SECRET_KEY.get_secret_value(),
+        default_policy=Policy.public_read_only(),
+        pool_size=Settings.MINIO_POOL_SIZE,
+        max_workers=Settings.MINIO_MAX_WORKERS,
+    )
+    receiver = None
+    if webhooks and Settings.REPLICATE_WEBHOOK_URL:
+        receiver = WebhookReceiver(
+            Settings.REPLICATE_WEBHOOK_URL,
+            Settings.REPLICATE_WEBHOOK_HOST,
+            Settings.REPLICATE_WEBHOOK_PORT,
+            await replicate.webhooks.default.async_secret(),
+            Settings.REPLICATE_WEBHOOK_POLL_S,
+        )
+        await receiver.start()
+
+    poller = PredictionPoller(
+        Settings.POLL_STARTING_S,
+        Settings.POLL_PROCESSING_S,
+        Settings.POLL_MAX_BACKOFF_S,
+        Settings.POLL_MAX_REQUESTS_PER_S,
+    )
+    poller.start()
+
+    edits = EditScheduler(Settings.EDIT_RATE_PER_S, Settings.EDIT_CHAT_RATE_PER_S)
+    edits.start()
+
+    services = Services(
+        file_api=file_api,
+        model_versions=ModelVersionCache(Settings.MODEL_VERSION_TTL_S),
+        transcript_cache=await asyncio.to_thread(
+            TranscriptCache,
+            Settings.TRANSCRIPT_CACHE_PATH,
+            Settings.TRANSCRIPT_CACHE_TTL_S,
+            Settings.TRANSCRIPT_CACHE_MAX_ENTRIES,
+        ),
+        summary_cache=await asyncio.to_thread(
+            SummaryCache,
+            Settings.SUMMARY_CACHE_PATH,
+            Settings.SUMMARY_CACHE_TTL_S,
+            Settings.SUMMARY_CACHE_MAX_ENTRIES,
+        ),
+        job_store=await asyncio.to_thread(JobStore, Settings.JOB_STORE_PATH),
+        openai=AsyncOpenAI(
+            api_key=Settings.OPENAI_API_KEY.get_secret_value(),
+            base_url=Settings.OPENAI_BASE_URL,
+            timeout=httpx.Timeout(Settings.OPENAI_TIMEOUT_S, connect=10),
+            max_retries=Settings.OPENAI_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=Settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=Settings.OPENAI_MAX_CONNECTIONS,
+                )
+            ),
+        ),
+        edits=edits,
+        stages=Stages(
+            download=FairStage("download", Settings.DOWNLOAD_CONCURRENCY),
+            preprocess=FairStage("processing", Settings.PREPROCESS_CONCURRENCY),
+            transcribe=FairStage("transcription", Settings.TRANSCRIBE_CONCURRENCY),
+            summary=FairStage("minutes", Settings.SUMMARY_CONCURRENCY),
+        ),
+        jobs=SingleFlight(edits),
+        router=BackendRouter(
+            Settings.ROUTER_FAST_MAX_S if Settings.FAST_WHISPER_VERSION else None,
+            Settings.ROUTER_EWMA_ALPHA,
+            Settings.LOCAL_MAX_S if Settings.LOCAL_WHISPER_MODEL else None,
+            Settings.ROUTER_FAST_VOICE_MAX_S,
+            Settings.ROUTER_EXPLORE_S,
+            Settings.ROUTER_EXPLORE_MAX_EXTRA_S,
+        ),
+        webhooks=receiver,
+        poller=poller,
+        hedging=Hedging(
+            Settings.HEDGE_AFTER_S,
+            Settings.HEDGE_MODEL_VERSION,
+            asyncio.Semaphore(Settings.HEDGE_MAX_CONCURRENT),
+        )
+        if Settings.HEDGE_AFTER_S is not None and Settings.HEDGE_MODEL_VERSION
+        else None,
+        local_pool=make_pool(
+            partial(
+                WhisperEngine,
+                Settings.LOCAL_WHISPER_MODEL,
+                Settings.LOCAL_COMPUTE_TYPE,
+                Settings.LOCAL_CPU_THREADS,
+            ),
+            Settings.LOCAL_WORKERS,
+            multiprocessing.get_context("spawn"),
+        )
+        if Settings.LOCAL_WHISPER_MODEL
+        else None,
+        voice_batches=VoiceBatcher(Settings.VOICE_BATCH_S, Settings.VOICE_BATCH_MAX)
+        if Settings.VOICE_BATCH_S
+        else None,
+    )
+
+    # Warm the cache. Not fatal: jobs will retry the fetch.
+    models = [(ThomasmolTranscriber.MODEL_NAME, Settings.MODEL_VERSION)]
+    if Settings.FAST_WHISPER_VERSION:
+        models.append((InsanelyFastWhisper.MODEL_NAME, Settings.FAST_WHISPER_VERSION))
+    if Settings.HEDGE_MODEL_VERSION:
+        models.append((ThomasmolTranscriber.MODEL_NAME, Settings.HEDGE_MODEL_VERSION))
+    for model_name, version in models:
+        try:
+            await services.model_versions.get(model_name, version)
+        except Exception:
+            _logger.exception("Failed to fetch %s version at startup", model_name)
+
+    return services
 
 
 async def main() -> NoReturn:
     """Start the bot."""
     setup_logging()
+    # Predictions are created by workers, which receive their webhooks
+    services = await bootstrap(webhooks=not Settings.JOB_QUEUE_PATH)
+    if Settings.JOB_QUEUE_PATH:
+        queue = await asyncio.to_thread(SqliteJobQueue, Settings.JOB_QUEUE_PATH)
+        services = replace(
+            services,
+            relay=Relay(queue, services.edits, Settings.JOB_QUEUE_POLL_S),
+        )
     client = TelegramClient(
         Settings.SESSION_FILE,
         Settings.API_ID,
         Settings.API_HASH.get_secret_value(),
     )
 
-    register_handlers(client)
+    register_handlers(client, services)
 
     await client.start()  # pyright:  ignore[reportGeneralTypeIssues]
-    await client.run_until_disconnected()  # pyright:  ignore[reportGeneralTypeIssues]
+    if services.relay:
+        # Jobs are run by workers, which resume those interrupted by a restart
+        await asyncio.gather(
+            cast(Coroutine[Any, Any, None], client.run_until_disconnected()),
+            services.relay.run(client),
+        )
+    else:
+        await resume_jobs(client, services)
+        await client.run_until_disconnected()  # pyright:  ignore[reportGeneralTypeIssues]
 
 
 if __name__ == "__main__":
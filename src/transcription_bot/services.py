@@ -0,0 +1,145 @@
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from functools import partial
+
+from openai import AsyncOpenAI
+
+from transcription_bot.audio.vad import OffsetMap
+from transcription_bot.cache.jobs import JobStore
+from transcription_bot.cache.summaries import SummaryCache
+from transcription_bot.cache.transcripts import TranscriptCache
+from transcription_bot.file_api.base_api import BaseApi
+from transcription_bot.handlers.batch import VoiceBatcher
+from transcription_bot.handlers.edits import EditScheduler
+from transcription_bot.handlers.queue import Stages
+from transcription_bot.handlers.single_flight import SingleFlight
+from transcription_bot.settings import Settings
+from transcription_bot.transcribers.base import BaseTranscriber
+from transcription_bot.transcribers.chunked import ChunkedTranscriber, UploadedChunk
+from transcription_bot.transcribers.local import LocalTranscriber
+from transcription_bot.transcribers.replicate.base import HedgeCallback, Hedging
+from transcription_bot.transcribers.replicate.insanely_fast_whisper import (
+    InsanelyFastWhisper,
+    ParamsWithoutUrl,
+)
+from transcription_bot.transcribers.replicate.poller import PredictionPoller
+from transcription_bot.transcribers.replicate.probe import PROBE_PARAMS
+from transcription_bot.transcribers.replicate.thomasmol import (
+    ThomasmolParamsWithoutUrl,
+    ThomasmolTranscriber,
+)
+from transcription_bot.transcribers.replicate.versions import ModelVersionCache
+from transcription_bot.transcribers.replicate.webhooks import WebhookReceiver
+from transcription_bot.transcribers.router import Backend, BackendRouter
+from transcription_bot.workers.frontend import Relay
+
+
+@dataclass(frozen=True)
+class Services:
+    """Long-lived clients shared by all handlers. Created once at startup by `main.py`."""
+
+    file_api: BaseApi
+    model_versions: ModelVersionCache
+    transcript_cache: TranscriptCache
+    summary_cache: SummaryCache
+    job_store: JobStore
+    """Jobs in progress, resumed if the bot restarts."""
+    openai: AsyncOpenAI
+    """Generates minutes. Shared, so its connections are reused."""
+    edits: EditScheduler
+    """Sends all edits of progress messages, within Telegram's rate limits."""
+    stages: Stages
+    """Limits how many jobs run each stage at once, fairly across senders."""
+    jobs: SingleFlight[tuple[str, str]]
+    """Transcriptions in progress, shared by requests for the same file. Yields (transcript, filename)."""
+    router: BackendRouter
+    """Picks the backend of each transcription, from the recent latencies of the backends."""
+    webhooks: WebhookReceiver | None = None
+    """Receives prediction events from Replicate. If None, predictions are polled."""
+    poller: PredictionPoller | None = None
+    """Polls all running predictions. If None, each job polls its own prediction."""
+    relay: Relay | None = None
+    """Queues files for worker processes. If None, files are handled in this process."""
+    hedging: Hedging | None = None
+    """Hedges thomasmol predictions slow to start. If None, they are not hedged."""
+    local_pool: Executor | None = None
+    """Processes with a Whisper engine loaded, to transcribe short recordings locally. If None, all are sent to Replicate."""
+    voice_batches: VoiceBatcher | None = None
+    """Collects bursts of voice messages in a chat, to transcribe them together. If None, each is transcribed on its own."""
+
+    def make_transcriber(
+        self,
+        offset_map: OffsetMap | None = None,
+        backend: Backend = "thomasmol",
+        params: ThomasmolParamsWithoutUrl | None = None,
+        on_hedged: HedgeCallback | None = None,
+    ) -> BaseTranscriber:
+        """
+        Return a new transcriber for a single job, reusing the cached model version.
+
+        `offset_map`: Set if silences were trimmed from the uploaded audio.
+        `backend`: As chosen by `router`.
+        `params`: For thomasmol, e.g. as detected by a probe. Defaults to `ThomasmolParamsWithoutUrl()`.
+        `on_hedged`: Called with the id of a thomasmol hedge, if one is sent.
+        """
+        if backend == "local" and self.local_pool:
+            return LocalTranscriber(
+                self.local_pool, offset_map, params.language if params else None
+            )
+        if backend == "fast_whisper" and Settings.FAST_WHISPER_VERSION:
+            # Its segments have timestamps, but only their text is rendered, so offset_map is not needed
+            return InsanelyFastWhisper(
+                Settings.FAST_WHISPER_VERSION,
+                ParamsWithoutUrl(hf_token=Settings.HF_TOKEN.get_secret_value()),
+                self.model_versions,
+                self.webhooks,
+                self.poller,
+            )
+        return self._make_thomasmol(offset_map, params, on_hedged)
+
+    def make_probe_transcriber(self) -> ThomasmolTranscriber:
+        """Return a new transcriber for a probe, detecting the language and number of speakers of a clip. Not hedged, as probes are short."""
+        return ThomasmolTranscriber(
+            Settings.MODEL_VERSION,
+            PROBE_PARAMS,
+            self.model_versions,
+            webhooks=self.webhooks,
+            poller=self.poller,
+        )
+
+    def _make_thomasmol(
+        self,
+        offset_map: OffsetMap | None = None,
+        params: ThomasmolParamsWithoutUrl | None = None,
+        on_hedged: HedgeCallback | None = None,
+    ) -> ThomasmolTranscriber:
+        return ThomasmolTranscriber(
+            Settings.MODEL_VERSION,
+            params or ThomasmolParamsWithoutUrl(),
+            self.model_versions,
+            offset_map,
+            self.webhooks,
+            self.poller,
+            self.hedging,
+            on_hedged,
+        )
+
+    def make_chunked_transcriber(
+        self,
+        chunks: list[UploadedChunk],
+        offset_map: OffsetMap | None = None,
+        params: ThomasmolParamsWithoutUrl | None = None,
+        on_hedged: HedgeCallback | None = None,
+    ) -> ChunkedTranscriber:
+        """
+        Return a new transcriber for a recording split into chunks.
+
+        `params`: Of every chunk's prediction. Defaults to `ThomasmolParamsWithoutUrl()`.
+        `on_hedged`: Called with the id of each chunk's hedge, if one is sent.
+        """
+        return ChunkedTranscriber(
+            partial(self._make_thomasmol, params=params, on_hedged=on_hedged),
+            chunks,
+            Settings.CHUNK_MAX_CONCURRENCY,
+            offset_map,
+        )
@@ -1,12 +1,16 @@
 import logging
 from pathlib import Path
+from typing import Self
 
 from pydantic import (
     SecretStr,
     field_validator,
+    model_validator,
 )
 from pydantic_settings import BaseSettings
 
+from transcription_bot.types import AudioCodec
+
 
 class _Settings(BaseSettings):
     SESSION_FILE: Path
@@ -19,10 +23,133 @@ class _Settings(BaseSettings):
     MINIO_SECRET_KEY: SecretStr
     MINIO_HOST: str
     MINIO_BUCKET: str
+    MINIO_POOL_SIZE: int = 10
+    MINIO_MAX_WORKERS: int = 4
+    """Maximum number of concurrent blocking Minio transfers."""
+    DOWNLOAD_CONNECTIONS: int = 4
+    """Ranges of large files downloaded from Telegram at once. Set to 1 to disable parallel downloads."""
+    PARALLEL_DOWNLOAD_MIN_BYTES: int = 10 * 1024 * 1024
+    STREAM_UPLOADS: bool = False
+    """Pipe downloads from Telegram straight into Minio, instead of via a temporary file."""
+    PREPROCESS_AUDIO: bool = True
+    """Extract and compress the audio track before uploading. Not applied with STREAM_UPLOADS."""
+    PREPROCESS_CODEC: AudioCodec = "opus"
+    PREPROCESS_MIN_BYTES: int = 5 * 1024 * 1024
+    """Audio files smaller than this are uploaded as-is. Videos are always preprocessed."""
+    VAD_TRIM: bool = False
+    """Shorten silences before uploading, to cut transcription time. Requires PREPROCESS_AUDIO."""
+    VAD_NOISE_DB: float = -35
+    VAD_MIN_SILENCE_S: float = 2
+    VAD_KEEP_SILENCE_S: float = 0.5
+    CHUNK_TRANSCRIPTION: bool = False
+    """Split long recordings into chunks, transcribed concurrently."""
+    CHUNK_S: int = 600
+    """Target chunk length. Recordings shorter than 1.5x this are not split."""
+    CHUNK_OVERLAP_S: float = 30
+    """Overlap between neighbouring chunks, used to match speakers across chunks."""
+    CHUNK_MAX_CONCURRENCY: int = 4
+    PROBE_S: float = 0
+    """Seconds at the start of long recordings transcribed first, to detect their language before transcribing all of it. 0 disables probing."""
+    PROBE_MIN_S: float = 900
+    """Recordings shorter than this are not probed, as the probe's own latency would outweigh a wasted prediction."""
+    PROBE_TIMEOUT_S: float = 90
+    """Recordings are transcribed with the default language if their probe takes longer."""
+    PROBE_SPEAKERS: bool = False
+    """Also fix the number of speakers to those heard in the probe, to shorten diarization. Speakers who only talk later are attributed to others."""
     MODEL_VERSION: str
+    MODEL_VERSION_TTL_S: int = 3600
+    """How long a fetched Replicate model version is reused before refreshing it."""
+    FAST_WHISPER_VERSION: str | None = None
+    """Version of vaibhavs10/incredibly-fast-whisper. If set, short recordings and voice notes use whichever backend is currently faster."""
+    ROUTER_FAST_MAX_S: float = 300
+    """Recordings longer than this, other than voice notes up to ROUTER_FAST_VOICE_MAX_S, always use thomasmol/whisper-diarization, for its diarization."""
+    ROUTER_EWMA_ALPHA: float = 0.2
+    """Weight of the latest prediction in the moving averages of each backend's queue and run times."""
+    ROUTER_FAST_VOICE_MAX_S: float = 1800
+    """Voice notes longer than this always use thomasmol/whisper-diarization, whose long recordings are split into chunks transcribed in parallel."""
+    ROUTER_EXPLORE_S: float = 600
+    """A backend no job was routed to for this long gets the next job it could take, to measure its latency again. That job may take up to ROUTER_EXPLORE_MAX_EXTRA_S longer."""
+    ROUTER_EXPLORE_MAX_EXTRA_S: float = 60
+    """Backends estimated to take longer than this more than the fastest are not tried again, not to delay a user's job by much."""
+    HEDGE_AFTER_S: float | None = None
+    """If set, thomasmol predictions still starting after this long, e.g. waiting for a cold boot, are sent again. The first to finish is kept, and the other cancelled."""
+    HEDGE_MODEL_VERSION: str | None = None
+    """Version of thomasmol/whisper-diarization hedges are sent to, e.g. one which is kept warm. Required to hedge, and must differ from MODEL_VERSION, whose hedges would wait for the same cold boot."""
+    HEDGE_MAX_CONCURRENT: int = 2
+    """Cap on hedges running at once, as each is billed."""
+    LOCAL_WHISPER_MODEL: str | None = None
+    """faster-whisper model, e.g. 'small.en'. If set, short recordings may be transcribed on this machine's CPU, without diarization. Requires the `local` extra."""
+    LOCAL_MAX_S: float = 120
+    """Recordings longer than this are never transcribed locally."""
+    LOCAL_WORKERS: int = 1
+    """Processes transcribing locally. Each loads its own copy of the model."""
+    LOCAL_CPU_THREADS: int = 4
+    """Threads used by each local process."""
+    LOCAL_COMPUTE_TYPE: str = "int8"
+    VOICE_BATCH_S: float = 0
+    """Voice messages in a chat sent within this many seconds of each other are transcribed together, as one prediction. 0 disables batching."""
+    VOICE_BATCH_MAX: int = 10
+    """A batch is transcribed as soon as it has this many voice messages."""
+    VOICE_BATCH_GAP_S: float = 3
+    """Silence between voice messages joined for a batch. Longer than the 2s gap thomasmol groups segments of the same speaker across."""
+    TRANSCRIPT_CACHE_PATH: Path = Path("credentials/transcripts.sqlite3")
+    """SQLite database of previous transcripts, so re-sent files are answered without transcribing them again."""
+    TRANSCRIPT_CACHE_TTL_S: int = 30 * 24 * 3600
+    TRANSCRIPT_CACHE_MAX_ENTRIES: int = 1000
+    REPLICATE_WEBHOOK_URL: str | None = None
+    """
+    Public URL which reaches the webhook receiver. If set, Replicate sends prediction events to it, instead of predictions being polled.
+
+    Events only reach the process which created the prediction, so each worker needs its own URL and port. A front-end which queues jobs for workers runs no receiver.
+    """
+    REPLICATE_WEBHOOK_HOST: str = "0.0.0.0"  # noqa: S104
+    REPLICATE_WEBHOOK_PORT: int = 8080
+    REPLICATE_WEBHOOK_POLL_S: float = 60
+    """With webhooks, predictions are still polled this often, in case a webhook is lost."""
+    POLL_STARTING_S: float = 2
+    """How often predictions waiting for a worker are polled."""
+    POLL_PROCESSING_S: float = 5
+    """How often running predictions are polled, to update their logs."""
+    POLL_MAX_BACKOFF_S: float = 120
+    POLL_MAX_REQUESTS_PER_S: float = 5
+    """Cap on polling requests to Replicate, shared by all jobs."""
+    EDIT_RATE_PER_S: float = 20
+    """Cap on message edits across all chats."""
+    EDIT_CHAT_RATE_PER_S: float = 1
+    """Cap on message edits in a single chat."""
+    JOB_QUEUE_PATH: Path | None = None
+    """If set, this process only queues files in this SQLite database, for workers to process. See `workers.worker`."""
+    JOB_QUEUE_POLL_S: float = 0.5
+    WORKER_SESSION_FILE: Path = Path("credentials/worker")
+    """Telethon session of a worker, used to download media. Each worker on a host needs its own."""
+    WORKER_NAME: str | None = None
+    """Identifies the jobs claimed by a worker. Must be unique across workers, and the same across restarts. Defaults to the host name and WORKER_SESSION_FILE."""
+    WORKER_CONCURRENCY: int = 4
+    """Jobs run by a worker at once."""
+    JOB_STORE_PATH: Path = Path("credentials/jobs.sqlite3")
+    """SQLite database of jobs in progress, which are resumed on startup."""
+    DOWNLOAD_CONCURRENCY: int = 4
+    """Files downloaded at once. Further jobs wait in a queue, taking turns across senders, as do the stages below."""
+    PREPROCESS_CONCURRENCY: int = 2
+    TRANSCRIBE_CONCURRENCY: int = 8
+    SUMMARY_CONCURRENCY: int = 4
     OPENAI_BASE_URL: str
     OPENAI_API_KEY: SecretStr
     OPENAI_MODEL_NAME: str
+    OPENAI_TIMEOUT_S: float = 300
+    """Timeout of a completion. Long, as minutes of long meetings take minutes to generate."""
+    OPENAI_MAX_RETRIES: int = 3
+    OPENAI_MAX_CONNECTIONS: int = 20
+    SUMMARY_CACHE_PATH: Path = Path("credentials/summaries.sqlite3")
+    """SQLite database of minutes, keyed by a hash of the model, prompts and transcript."""
+    SUMMARY_CACHE_TTL_S: int = 30 * 24 * 3600
+    SUMMARY_CACHE_MAX_ENTRIES: int = 1000
+    STREAM_MINUTES: bool = True
+    """Show the minutes in the chat as they are generated, before sending them as a file."""
+    SUMMARY_CHUNK_TOKENS: int = 12_000
+    """Transcripts longer than this are summarized in chunks of about this many tokens, which are then combined."""
+    SUMMARY_CHUNK_CONCURRENCY: int = 8
+    """Chunks of one transcript summarized at once."""
     HF_TOKEN: SecretStr
 
     TZ: str
@@ -36,5 +163,17 @@ class _Settings(BaseSettings):
             raise ValueError(msg)
         return v
 
+    @model_validator(mode="after")
+    def _check_hedge_version(self) -> Self:
+        if self.HEDGE_AFTER_S is not None and self.HEDGE_MODEL_VERSION in {
+            None,
+            self.MODEL_VERSION,
+        }:
+            msg = (
+                "HEDGE_AFTER_S requires a HEDGE_MODEL_VERSION other than MODEL_VERSION"
+            )
+            raise ValueError(msg)
+        return self
+
 
 Settings = _Settings.model_validate({})
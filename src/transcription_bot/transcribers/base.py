@@ -1,10 +1,19 @@
 from abc import ABC, abstractmethod
 from collections.abc import Callable, Coroutine
-from typing import Concatenate
+from dataclasses import dataclass
+from typing import Any, Concatenate
 
 from transcription_bot.types import PredictionStatus
 
 
+@dataclass(frozen=True)
+class Timings:
+    """How long a finished job waited for the backend, and then ran."""
+
+    queue_s: float
+    run_s: float
+
+
 class BaseTranscriber(ABC):
     """Base class for classes implementing external audio transcription."""
 
@@ -13,6 +22,16 @@ class BaseTranscriber(ABC):
     async def cancel(pred_id: str) -> None:
         """Cancel a running prediction."""
 
+    @property
+    @abstractmethod
+    def raw_output(self) -> Any:
+        """Output of the model before processing, once the job is done."""
+
+    @property
+    def timings(self) -> Timings | None:
+        """How long the job queued and ran, once it is done. None if the backend does not report it."""
+        return None
+
     @abstractmethod
     async def get_result(self) -> tuple[str | None, PredictionStatus]:
         """Wait for prediction result to complete."""
@@ -25,3 +44,16 @@ class BaseTranscriber(ABC):
         update_interval: int = 3,
     ) -> str:
         """Transcribe and diarize an audio file."""
+
+
+class ResumableTranscriber(BaseTranscriber):
+    """A transcriber whose jobs outlive the bot, so they can be re-attached to after a restart. Other jobs are sent again."""
+
+    @abstractmethod
+    async def attach(
+        self,
+        pred_id: str,
+        log_cb: Callable[Concatenate[str, ...], Coroutine] | None,
+        update_interval: int = 3,
+    ) -> None:
+        """Follow a prediction sent before, e.g. by the bot before it restarted, instead of sending a new job."""
@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import operator
+from collections import defaultdict
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Concatenate
+
+from transcription_bot.audio.chunks import Chunk
+from transcription_bot.audio.vad import Interval, OffsetMap
+from transcription_bot.transcribers.replicate.thomasmol import (
+    Segment,
+    ThomasmolTranscriber,
+    format_segments,
+    map_segment_times,
+)
+from transcription_bot.types import PredictionStatus
+
+_logger = logging.getLogger(__name__)
+
+type PredictionCallback = Callable[[int, str], Coroutine[Any, Any, None]]
+"""Called with the index of a chunk and the id of the prediction created for it."""
+
+
+@dataclass(frozen=True)
+class UploadedChunk:
+    """A chunk of a recording, uploaded to file storage."""
+
+    url: str
+    chunk: Chunk
+
+
+def _intersection(*intervals: Interval) -> float:
+    """Return the length of the intersection of the intervals."""
+    return max(
+        0.0,
+        min(end for _, end in intervals) - max(start for start, _ in intervals),
+    )
+
+
+def _new_speaker_label(known: set[str]) -> str:
+    n = 0
+    while f"SPEAKER_{n:02d}" in known:
+        n += 1
+    return f"SPEAKER_{n:02d}"
+
+
+def reconcile_speakers(
+    previous: list[Segment],
+    current: list[Segment],
+    window: Interval,
+    known: set[str],
+) -> dict[str, str]:
+    """
+    Map the speaker labels of a chunk to the labels used in the previous chunk.
+
+    Diarization labels are only consistent within a chunk. Both chunks transcribe the audio in the overlapping `window`,
+    so labels are paired greedily by how long they speak at the same time there. Unpaired labels get new labels not in `known`.
+    """
+    overlaps: dict[tuple[str, str], float] = defaultdict(float)
+    for p in previous:
+        for c in current:
+            overlaps[(p.speaker, c.speaker)] += _intersection(
+                (p.start, p.end), (c.start, c.end), window
+            )
+
+    mapping: dict[str, str] = {}
+    for (prev_label, label), overlap in sorted(
+        overlaps.items(), key=lambda item: item[1], reverse=True
+    ):
+        if overlap > 0 and label not in mapping and prev_label not in mapping.values():
+            mapping[label] = prev_label
+
+    used = known | set(mapping.values())
+    for label in dict.fromkeys(s.speaker for s in current):
+        if label not in mapping:
+            mapping[label] = _new_speaker_label(used)
+            used.add(mapping[label])
+    return mapping
+
+
+def stitch(results: list[list[Segment]], chunks: list[Chunk]) -> list[Segment]:
+    """
+    Join the segments of each chunk into a single transcript.
+
+    Timestamps are shifted to be relative to the whole recording, speaker labels are made consistent across chunks,
+    and only segments within each chunk's core are kept, so the overlaps are not duplicated.
+    """
+    stitched: list[Segment] = []
+    known: set[str] = set()
+    previous: list[Segment] = []
+    previous_end = 0.0
+    for i, (segments, chunk) in enumerate(zip(results, chunks, strict=True)):
+        shifted = [
+            map_segment_times(s, partial(operator.add, chunk.start)) for s in segments
+        ]
+        mapping = (
+            reconcile_speakers(previous, shifted, (chunk.start, previous_end), known)
+            if i
+            else {s.speaker: s.speaker for s in shifted}
+        )
+        relabelled = [
+            s.model_copy(update={"speaker": mapping[s.speaker]}) for s in shifted
+        ]
+        known |= set(mapping.values())
+
+        is_last = i == len(chunks) - 1
+        stitched += [
+            s
+            for s in relabelled
+            if chunk.core_start <= (s.start + s.end) / 2 < chunk.core_end
+            or (is_last and (s.start + s.end) / 2 >= chunk.core_end)
+        ]
+        previous, previous_end = relabelled, chunk.end
+    return stitched
+
+
+class ChunkedTranscriber:
+    """
+    Transcribes a long recording as concurrent predictions, one per chunk, then stitches the results together.
+
+    Wall-clock time is roughly that of the longest chunk, rather than of the whole recording.
+    """
+
+    def __init__(
+        self,
+        make_transcriber: Callable[[], ThomasmolTranscriber],
+        chunks: list[UploadedChunk],
+        max_concurrency: int,
+        offset_map: OffsetMap | None = None,
+    ) -> None:
+        """
+        Prepare a chunked prediction pipeline.
+
+        `make_transcriber`: Returns a new transcriber for a single chunk.
+        `max_concurrency`: Maximum number of predictions running at once.
+        `offset_map`: Set if silences were trimmed from the audio the chunks were cut from.
+        """
+        self.make_transcriber = make_transcriber
+        self.chunks = chunks
+        self.offset_map = offset_map
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._running: set[ThomasmolTranscriber] = set()
+        """Transcribers whose predictions may still be running, to cancel."""
+        self._logs: dict[int, str] = {}
+        self._raw_outputs: list[Any] = [None] * len(chunks)
+        self._cancelled = False
+        self._task: asyncio.Task[list[tuple[list[Segment] | None, PredictionStatus]]]
+
+    async def _log_chunk(
+        self,
+        index: int,
+        progress: str,
+        log_cb: Callable[Concatenate[str, ...], Coroutine],
+    ) -> None:
+        """Combine the latest log line of each chunk into one update."""
+        lines = progress.splitlines()
+        self._logs[index] = lines[-1] if lines else ""
+        await log_cb(
+            "\n".join(
+                f"Part {i + 1}/{len(self.chunks)}: {line}"
+                for i, line in sorted(self._logs.items())
+            )
+        )
+
+    async def _transcribe_chunk(
+        self,
+        index: int,
+        chunk: UploadedChunk,
+        log_cb: Callable[Concatenate[str, ...], Coroutine] | None,
+        pred_id: str | None,
+        on_created: PredictionCallback | None,
+    ) -> tuple[list[Segment] | None, PredictionStatus]:
+        async with self._semaphore:
+            if self._cancelled:
+                return None, "canceled"
+            transcriber = self.make_transcriber()
+            self._running.add(transcriber)
+            chunk_log_cb = (
+                partial(self._log_chunk, index, log_cb=log_cb) if log_cb else None
+            )
+            if pred_id:
+                await transcriber.attach(pred_id, log_cb=chunk_log_cb)
+            else:
+                pred_id = await transcriber.send_job(chunk.url, log_cb=chunk_log_cb)
+                if on_created:
+                    await on_created(index, pred_id)
+            if self._cancelled:
+                # Cancelled while the prediction was being created
+                await transcriber.cancel(pred_id)
+            prediction = await transcriber.wait()
+            self._running.discard(transcriber)
+            _logger.info(
+                "Chunk %s/%s finished: %s",
+                index + 1,
+                len(self.chunks),
+                prediction.status,
+            )
+            if prediction.status == "failed" and not self._cancelled:
+                # The transcript is incomplete without this chunk
+                await self.cancel()
+            self._raw_outputs[index] = prediction.output
+            segments = (
+                transcriber.parse_output(prediction.output)
+                if prediction.output
+                else None
+            )
+            return segments, prediction.status
+
+    @property
+    def raw_output(self) -> list[Any]:
+        """Output of the model for each chunk, before processing."""
+        return self._raw_outputs
+
+    def send_jobs(
+        self,
+        log_cb: Callable[Concatenate[str, ...], Coroutine] | None,
+        predictions: list[str | None] | None = None,
+        on_created: PredictionCallback | None = None,
+    ) -> None:
+        """
+        Start transcribing all chunks, at most `max_concurrency` at a time.
+
+        Optionally, provide a callback which will be called with the latest log line of each chunk.
+
+        `predictions`: Predictions sent before for some chunks, to re-attach to instead of sending new jobs.
+        `on_created`: Called whenever a new prediction is created, e.g. to save it.
+        """
+        self._task = asyncio.create_task(
+            self._transcribe_chunks(log_cb, predictions, on_created)
+        )
+
+    async def _transcribe_chunks(
+        self,
+        log_cb: Callable[Concatenate[str, ...], Coroutine] | None,
+        predictions: list[str | None] | None,
+        on_created: PredictionCallback | None,
+    ) -> list[tuple[list[Segment] | None, PredictionStatus]]:
+        """Transcribe every chunk. If one raises, or this is cancelled, the predictions of the others are cancelled too."""
+        pred_ids: list[str | None] = predictions or [None] * len(self.chunks)
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(
+                        self._transcribe_chunk(i, chunk, log_cb, pred_id, on_created)
+                    )
+                    for i, (chunk, pred_id) in enumerate(
+                        zip(self.chunks, pred_ids, strict=True)
+                    )
+                ]
+        except BaseException:
+            # Cancelling the tasks leaves their predictions running, and billed
+            await self.cancel()
+            raise
+        return [task.result() for task in tasks]
+
+    async def get_result(self) -> tuple[str | None, PredictionStatus]:
+        """Wait for all chunks to complete, and return the stitched transcript."""
+        results = await self._task
+        statuses = {status for _, status in results}
+        # Chunks are cancelled once one fails
+        for status in ("failed", "canceled"):
+            if status in statuses:
+                return None, status
+        if any(segments is None for segments, _ in results):
+            return None, "failed"
+
+        segments = stitch(
+            [segments or [] for segments, _ in results],
+            [chunk.chunk for chunk in self.chunks],
+        )
+        if self.offset_map:
+            segments = [
+                map_segment_times(s, self.offset_map.to_original) for s in segments
+            ]
+        return format_segments(segments), "succeeded"
+
+    async def cancel(self) -> None:
+        """
+        Cancel all running predictions, and skip chunks which have not started.
+
+        Failures to cancel are logged rather than raised, not to replace the error which cancelled the chunks.
+        """
+        self._cancelled = True
+        pred_ids = {t: t.prediction.id for t in self._running if t.prediction}
+        self._running.difference_update(pred_ids)
+        results = await asyncio.gather(
+            *(t.cancel(pred_id) for t, pred_id in pred_ids.items()),
+            return_exceptions=True,
+        )
+        for pred_id, result in zip(pred_ids.values(), results, strict=True):
+            if isinstance(result, BaseException):
+                _logger.error(
+                    "Failed to cancel prediction %s", pred_id, exc_info=result
+                )
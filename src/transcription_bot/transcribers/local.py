@@ -0,0 +1,243 @@
+"""
+Transcribe on this machine's CPU, without Replicate's round-trip, queue or cold starts.
+
+A Whisper engine, e.g. faster-whisper with int8 weights, is loaded once in each process of a pool, and jobs run in those processes.
+Worthwhile for short recordings, which take a fraction of their duration to transcribe.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Callable, Coroutine
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from typing import Any, Concatenate, Protocol, cast
+
+from transcription_bot.audio.vad import OffsetMap
+from transcription_bot.transcribers.base import BaseTranscriber, Timings
+from transcription_bot.transcribers.replicate.thomasmol import (
+    Output,
+    Segment,
+    Word,
+    format_segments,
+    map_segment_times,
+)
+from transcription_bot.types import PredictionStatus
+
+_logger = logging.getLogger(__name__)
+
+_SPEAKER = "SPEAKER_00"
+"""Local transcripts are not diarized, so everything is attributed to one speaker."""
+
+
+class Engine(Protocol):
+    """Transcribes audio in a worker process."""
+
+    def transcribe(self, audio: str, language: str | None = None) -> Output:
+        """Transcribe a local path or URL. `language` overrides the engine's default, e.g. as detected by a probe."""
+        ...
+
+
+class WhisperEngine:
+    """faster-whisper (CTranslate2) on the CPU. Requires the `local` extra."""
+
+    def __init__(
+        self,
+        model: str,
+        compute_type: str = "int8",
+        cpu_threads: int = 0,
+        language: str | None = "en",
+    ) -> None:
+        """
+        Load the model, downloading it on first use.
+
+        `model`: A model size such as `small.en`, or a path to a converted model.
+        `cpu_threads`: Threads used per process. 0 uses CTranslate2's default.
+        `language`: Language code of the speech, unless a job sets its own. None detects it, which is slower.
+        """
+        # Optional dependency, only imported in worker processes
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads
+        )
+        self.language = language
+
+    def transcribe(self, audio: str, language: str | None = None) -> Output:
+        """Transcribe a local path or URL, with word timestamps."""
+        segments, info = self.model.transcribe(
+            audio,
+            language=language or self.language,
+            word_timestamps=True,
+            vad_filter=True,
+        )
+        return Output(
+            language=info.language,
+            num_speakers=1,
+            segments=[
+                Segment(
+                    avg_logprob=s.avg_logprob,
+                    start=s.start,
+                    end=s.end,
+                    speaker=_SPEAKER,
+                    text=s.text.strip(),
+                    words=[
+                        Word(
+                            start=w.start,
+                            end=w.end,
+                            probability=w.probability,
+                            word=w.word,
+                        )
+                        for w in s.words or []
+                    ],
+                )
+                for s in segments
+            ],
+        )
+
+
+_engine: Engine | None = None
+"""The engine of this worker process."""
+
+
+def _load_engine(make_engine: Callable[[], Engine]) -> None:
+    global _engine  # noqa: PLW0603
+    _engine = make_engine()
+    _logger.info("Loaded local transcription engine %s", type(_engine).__name__)
+
+
+def _transcribe(
+    audio: str, language: str | None
+) -> tuple[dict[str, Any], float, float]:
+    """Transcribe in a worker process. Returns the output, and when transcription started and finished."""
+    started = time.time()
+    output = cast(Engine, _engine).transcribe(audio, language)
+    return output.model_dump(), started, time.time()
+
+
+def make_pool(
+    make_engine: Callable[[], Engine],
+    workers: int,
+    mp_context: BaseContext | None = None,
+) -> ProcessPoolExecutor:
+    """
+    Return a pool of processes, each loading an engine when it starts.
+
+    `make_engine`: Must be picklable, e.g. a `partial` of `WhisperEngine`.
+    `workers`: Each holds a copy of the model in memory, and transcribes one file at a time.
+    """
+    return ProcessPoolExecutor(
+        workers, mp_context, initializer=_load_engine, initargs=(make_engine,)
+    )
+
+
+_cancel_events: dict[str, asyncio.Event] = {}
+"""Set to cancel the local job with that id."""
+
+
+class LocalTranscriber(BaseTranscriber):
+    """
+    Transcribes a single file in a pool made by `make_pool`.
+
+    Jobs do not outlive the bot, so they are sent again, instead of re-attached to, after a restart.
+    """
+
+    def __init__(
+        self,
+        pool: Executor,
+        offset_map: OffsetMap | None = None,
+        language: str | None = None,
+    ) -> None:
+        """
+        Prepare a local job.
+
+        `offset_map`: If silences were trimmed from the audio, used to map timestamps back to the original file.
+        `language`: Language code of the speech, e.g. as detected by a probe. None uses the engine's default.
+        """
+        self.pool = pool
+        self.offset_map = offset_map
+        self.language = language
+        self.pred_id: str | None = None
+        self._future: asyncio.Future[tuple[dict[str, Any], float, float]] | None = None
+        self._submitted = 0.0
+        self._cancelled = asyncio.Event()
+        self._output: dict[str, Any] | None = None
+        self._timings: Timings | None = None
+
+    @staticmethod
+    async def cancel(pred_id: str) -> None:
+        """
+        Cancel a local job.
+
+        A file already being transcribed cannot be interrupted, so the job is marked cancelled and its result discarded.
+        """
+        if event := _cancel_events.get(pred_id):
+            event.set()
+
+    @property
+    def raw_output(self) -> Any:
+        """Output in the format of thomasmol/whisper-diarization, once the job is done."""
+        return self._output
+
+    @property
+    def timings(self) -> Timings | None:
+        """How long the job waited for a free process, and then ran, once it is done."""
+        return self._timings
+
+    async def send_job(
+        self,
+        file_url: str,
+        log_cb: Callable[Concatenate[str, ...], Coroutine] | None,
+        update_interval: int = 3,  # noqa: ARG002
+    ) -> str:
+        """Start transcribing the file. Returns an id to cancel the job with."""
+        self.pred_id = f"local-{uuid.uuid4().hex}"
+        _cancel_events[self.pred_id] = self._cancelled
+        self._submitted = time.time()
+        self._future = asyncio.get_running_loop().run_in_executor(
+            self.pool, _transcribe, file_url, self.language
+        )
+        _logger.info("Transcribing %s locally as %s", file_url, self.pred_id)
+        if log_cb:
+            await log_cb("processing: Transcribing on the bot's server...")
+        return self.pred_id
+
+    def parse_output(self, output: dict[str, Any]) -> list[Segment]:
+        """Return the segments, with timestamps relative to the original file."""
+        segments = Output.model_validate(output).segments
+        if self.offset_map:
+            segments = [
+                map_segment_times(s, self.offset_map.to_original) for s in segments
+            ]
+        return segments
+
+    async def get_result(self) -> tuple[str | None, PredictionStatus]:
+        """Wait for the job to finish or be cancelled."""
+        if not self._future:
+            msg = "No job running!"
+            raise ValueError(msg)
+
+        cancelled = asyncio.create_task(self._cancelled.wait())
+        try:
+            await asyncio.wait(
+                {self._future, cancelled}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            cancelled.cancel()
+            _cancel_events.pop(cast(str, self.pred_id), None)
+
+        if self._cancelled.is_set():
+            # Still running in its process, so its result is dropped when it arrives
+            self._future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            return None, "canceled"
+
+        try:
+            output, started, finished = self._future.result()
+        except Exception:
+            _logger.exception("Local transcription %s failed", self.pred_id)
+            return None, "failed"
+
+        self._output = output
+        self._timings = Timings(max(started - self._submitted, 0), finished - started)
+        return format_segments(self.parse_output(output)), "succeeded"
@@ -2,15 +2,24 @@ import asyncio
 import logging
 from abc import abstractmethod
 from collections.abc import Callable, Coroutine
-from typing import Any, Concatenate
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Concatenate, cast
 
 import httpx
 import replicate
 import replicate.version
 from replicate.prediction import Prediction
 
+from transcription_bot.audio.vad import OffsetMap
 from transcription_bot.handlers.types import TranscriptionTimeoutError
-from transcription_bot.transcribers.base import BaseTranscriber
+from transcription_bot.transcribers.base import ResumableTranscriber, Timings
+from transcription_bot.transcribers.replicate.poller import PredictionPoller
+from transcription_bot.transcribers.replicate.versions import (
+    ModelVersionCache,
+    fetch_model_version,
+)
+from transcription_bot.transcribers.replicate.webhooks import EVENTS, WebhookReceiver
 from transcription_bot.types import (
     PredictionStatus,
 )
@@ -22,19 +31,69 @@ class MaxAttemptsExceededError(Exception):
     """Too many attempts to connect to replicate failed."""
 
 
-class ReplicateTranscriberBase(BaseTranscriber):
+@dataclass(frozen=True)
+class Hedging:
+    """
+    Send a prediction again if it is still starting after `after_s`, e.g. waiting for a cold boot, and keep whichever finishes first.
+
+    The other prediction is cancelled.
+    """
+
+    after_s: float
+    version: str
+    """Version of the same model for the hedge, e.g. one which is kept warm."""
+    budget: asyncio.Semaphore
+    """Shared by all transcribers, to cap how many hedges run at once. Predictions are not hedged while it is exhausted."""
+
+
+type HedgeCallback = Callable[[str], Coroutine[Any, Any, None]]
+
+
+class ReplicateTranscriberBase(ResumableTranscriber):
     """Base class for transcription using Replicate models."""
 
-    def __init__(self, version: str) -> None:
-        """Prepare a prediction pipeline."""
+    def __init__(  # noqa: PLR0913
+        self,
+        version: str,
+        versions: ModelVersionCache | None = None,
+        offset_map: OffsetMap | None = None,
+        webhooks: WebhookReceiver | None = None,
+        poller: PredictionPoller | None = None,
+        hedging: Hedging | None = None,
+        on_hedged: HedgeCallback | None = None,
+    ) -> None:
+        """
+        Prepare a prediction pipeline.
+
+        `versions`: Shared cache of model versions. If not provided, the version is fetched for every job.
+        `offset_map`: If silences were trimmed from the audio, used to map timestamps back to the original file.
+        `webhooks`: If provided, the prediction is updated by webhooks, and only polled as a fallback.
+        `poller`: If provided, the prediction is polled by this shared poller, instead of by its own tasks.
+        `hedging`: If provided, predictions slow to start are hedged with a second one.
+        `on_hedged`: Called with the id of the hedge, if one is sent, e.g. to save it so it can be cancelled after a restart.
+        """
         self.model_version = version
+        self.versions = versions
+        self.offset_map = offset_map
+        self.webhooks = webhooks
+        self.poller = poller
+        self.hedging = hedging
+        self.on_hedged = on_hedged
         self.prediction = None
+        self._log_cb: Callable[Concatenate[str, ...], Coroutine] | None = None
+        self._updated = asyncio.Event()
+        self._hedge_task: asyncio.Task[Prediction | None] | None = None
+        self.tasks: set[asyncio.Task] = set()
         super().__init__()
 
     @abstractmethod
     def _get_model_name(self) -> str:
         """Return the model name as found on Replicate."""
 
+    @abstractmethod
+    def _make_hedge(self, version: str) -> "ReplicateTranscriberBase":
+        """Return a transcriber for a hedge of this job, sent to `version` with the same parameters, and not hedged itself."""
+
     @abstractmethod
     def _get_model_params(self, file_url: str) -> dict[str, Any]:
         """
@@ -47,72 +106,220 @@ class ReplicateTranscriberBase(BaseTranscriber):
     def _process_output(self, model_output: Any) -> str:
         """Process the output from a model."""
 
-    def _construct_model(self) -> replicate.version.Version:
-        model = replicate.models.get(self._get_model_name())
-        _logger.info("Constructed Replicate model %s", model.name)
-        return model.versions.get(self.model_version)
+    async def _construct_model(self) -> replicate.version.Version:
+        if self.versions:
+            return await self.versions.get(self._get_model_name(), self.model_version)
+        return await asyncio.to_thread(
+            fetch_model_version, self._get_model_name(), self.model_version
+        )
 
     def _is_prediction_running(self) -> bool:
         if not self.prediction:
             return False
         return self.prediction.status in ("starting", "processing")
 
+    def _log(
+        self,
+        log_cb: Callable[Concatenate[str, ...], Coroutine],
+        prediction: Prediction,
+    ) -> None:
+        logs = prediction.logs
+        _logger.info("Prediciton logs: %s", logs)
+        task = asyncio.create_task(
+            log_cb(f"{prediction.status}: {logs or "Waiting in queue..."}")
+        )
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
     async def _update_progress(
         self,
         log_cb: Callable[Concatenate[str, ...], Coroutine],
         update_interval: int,
         prediction: Prediction,
     ) -> None:
-        self.tasks = set()
-
         while self._is_prediction_running():
-            logs = prediction.logs
-            _logger.info("Prediciton logs: %s", logs)
-            task = asyncio.create_task(
-                log_cb(f"{prediction.status}: {logs or "Waiting in queue..."}")
-            )
-            self.tasks.add(task)
-            task.add_done_callback(self.tasks.discard)
+            self._log(log_cb, prediction)
             await asyncio.sleep(update_interval)
             await prediction.async_reload()
 
         _logger.info("_update_progress exited.")
 
+    def _on_webhook(self, payload: dict[str, Any]) -> None:
+        """Update the prediction from an event. Events may arrive out of order, so a finished prediction is left as is."""
+        if not self._is_prediction_running():
+            return
+        prediction = cast(Prediction, self.prediction)
+        # Only fields of the prediction, whose values its instance holds: replicate's models use pydantic's v1 API,
+        # so they have no `model_fields`, while `__fields__` is deprecated by v2
+        fields = vars(prediction)
+        for name, value in payload.items():
+            if name in fields:
+                setattr(prediction, name, value)
+        if self._log_cb and self._is_prediction_running():
+            self._log(self._log_cb, prediction)
+        self._updated.set()
+
+    def _on_poll(self, prediction: Prediction) -> None:
+        if self._log_cb and self._is_prediction_running():
+            self._log(self._log_cb, prediction)
+        self._updated.set()
+
+    async def _wait_for_updates(
+        self, prediction: Prediction, fallback_poll_s: float | None
+    ) -> None:
+        """
+        Wait for webhooks or the poller to finish the prediction.
+
+        `fallback_poll_s`: Poll if no update arrives in this time. None if the poller is used.
+        """
+        while True:
+            self._updated.clear()
+            if not self._is_prediction_running():
+                return
+            try:
+                await asyncio.wait_for(self._updated.wait(), fallback_poll_s)
+            except TimeoutError:
+                _logger.info("No webhook for %s, polling", prediction.id)
+                await prediction.async_reload()
+
     @staticmethod
     async def cancel(pred_id: str) -> None:
         """Cancel a running prediction."""
         await replicate.predictions.async_cancel(pred_id)
 
-    async def get_result(
-        self, max_attempts: int = 3
-    ) -> tuple[str | None, PredictionStatus]:
-        """Wait for result to be done."""
-        if not self.prediction:
+    @property
+    def raw_output(self) -> Any:
+        """Output of the model before processing, once the prediction is done."""
+        return self.prediction.output if self.prediction else None
+
+    @property
+    def timings(self) -> Timings | None:
+        """How long the prediction waited for a worker, and its `predict_time`, once it is done."""
+        prediction = self.prediction
+        if not (
+            prediction
+            and prediction.created_at
+            and prediction.started_at
+            and prediction.metrics
+            and "predict_time" in prediction.metrics
+        ):
+            return None
+        try:
+            queued_s = (
+                datetime.fromisoformat(prediction.started_at)
+                - datetime.fromisoformat(prediction.created_at)
+            ).total_seconds()
+        except ValueError:
+            _logger.warning("Unexpected timestamps of prediction %s", prediction.id)
+            return None
+        return Timings(max(queued_s, 0), float(prediction.metrics["predict_time"]))
+
+    async def wait(self, max_attempts: int = 3) -> Prediction:
+        """
+        Wait for the prediction to finish, and return it.
+
+        If the prediction was hedged, whichever of it and the hedge finishes first is kept, and the other is cancelled.
+        """
+        if not self._hedge_task:
+            return await self._wait(max_attempts)
+
+        hedge_task = self._hedge_task
+        prediction = cast(Prediction, self.prediction)
+        primary = asyncio.create_task(self._wait(max_attempts))
+        try:
+            done, _ = await asyncio.wait(
+                {primary, hedge_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if primary not in done:
+                hedge = await hedge_task
+                if hedge and hedge.status == "succeeded":
+                    _logger.info("Hedge %s finished first", hedge.id)
+                    await self.cancel(prediction.id)
+                    self.prediction = hedge
+                    return hedge
+            return await primary
+        finally:
+            primary.cancel()
+            hedge_task.cancel()
+            # Let the hedge be cancelled on Replicate
+            await asyncio.gather(primary, hedge_task, return_exceptions=True)
+            # `primary` never runs its own cleanup if it was cancelled before starting
+            self._unfollow(prediction)
+
+    async def _hedge(self, file_url: str, update_interval: int) -> Prediction | None:
+        """
+        Send the job again if the prediction is still starting after the deadline, and wait for it.
+
+        Returns the finished hedge, or None if none was sent. The hedge is cancelled if this is cancelled, e.g. as the prediction finished first.
+        """
+        hedging = cast(Hedging, self.hedging)
+        await asyncio.sleep(hedging.after_s)
+        prediction = cast(Prediction, self.prediction)
+        if prediction.status != "starting":
+            return None
+        if hedging.budget.locked():
+            _logger.info("Not hedging %s, too many hedges running", prediction.id)
+            return None
+
+        async with hedging.budget:
+            hedge = self._make_hedge(hedging.version)
+            pred_id = await hedge.send_job(file_url, None, update_interval)
+            _logger.info(
+                "Prediction %s still starting after %ss, hedged with %s",
+                prediction.id,
+                hedging.after_s,
+                pred_id,
+            )
+            try:
+                if self.on_hedged:
+                    await self.on_hedged(pred_id)
+                return await hedge._wait()  # noqa: SLF001
+            finally:
+                if hedge._is_prediction_running():  # noqa: SLF001
+                    await self.cancel(pred_id)
+
+    async def _wait(self, max_attempts: int = 3) -> Prediction:
+        prediction = self.prediction
+        if not prediction:
             msg = "No prediction running!"
             raise ValueError(msg)
 
         success = False
         attempts = 0
-        while not success:
-            if attempts > max_attempts:
-                raise TranscriptionTimeoutError
-            try:
-                await self.prediction.async_wait()
-                success = True
-            except httpx.ConnectTimeout:
-                _logger.info(
-                    "Failed transcription due to httpx.ConnectTimeout, retrying"
-                )
-                attempts += 1
-
-        _logger.info("Prediction metrics: %s", self.prediction.metrics)
+        try:
+            while not success:
+                if attempts > max_attempts:
+                    raise TranscriptionTimeoutError
+                try:
+                    if self.poller:
+                        await self._wait_for_updates(prediction, None)
+                    elif self.webhooks:
+                        await self._wait_for_updates(
+                            prediction, self.webhooks.fallback_poll_s
+                        )
+                    else:
+                        await prediction.async_wait()
+                    success = True
+                except httpx.ConnectTimeout:
+                    _logger.info(
+                        "Failed transcription due to httpx.ConnectTimeout, retrying"
+                    )
+                    attempts += 1
+        finally:
+            # Also if the prediction lost to a hedge
+            self._unfollow(prediction)
+        _logger.info("Prediction metrics: %s", prediction.metrics)
+        return prediction
 
+    async def get_result(
+        self, max_attempts: int = 3
+    ) -> tuple[str | None, PredictionStatus]:
+        """Wait for result to be done."""
+        prediction = await self.wait(max_attempts)
         processed_output = (
-            self._process_output(self.prediction.output)
-            if self.prediction.output
-            else None
+            self._process_output(prediction.output) if prediction.output else None
         )
-        return (processed_output, self.prediction.status)
+        return (processed_output, prediction.status)
 
     async def send_job(
         self,
@@ -126,8 +333,14 @@ class ReplicateTranscriberBase(BaseTranscriber):
         Returns the id of the prediction that can be used for cancellation.
 
         Optionally, provide a callback which will be called with the current log lines, called every `update_interval` seconds.
+        With webhooks or the shared poller, it is called whenever the prediction is updated instead.
         """
-        version = self._construct_model()
+        version = await self._construct_model()
+        webhook_params = (
+            {"webhook": self.webhooks.url, "webhook_events_filter": EVENTS}
+            if self.webhooks
+            else {}
+        )
 
         async def get_prediction(max_attempts: int = 3) -> Prediction:
             attempts = 0
@@ -137,7 +350,9 @@ class ReplicateTranscriberBase(BaseTranscriber):
                     raise MaxAttemptsExceededError
                 try:
                     prediction = await replicate.predictions.async_create(
-                        version, input=self._get_model_params(file_url)
+                        version,
+                        input=self._get_model_params(file_url),
+                        **webhook_params,
                     )
 
                 except httpx.ConnectTimeout:
@@ -150,12 +365,53 @@ class ReplicateTranscriberBase(BaseTranscriber):
 
         prediction = await get_prediction()
         _logger.info("Prediction created for file %s", file_url)
+        self._follow(prediction, log_cb, update_interval)
+        if self.hedging:
+            self._hedge_task = asyncio.create_task(
+                self._hedge(file_url, update_interval)
+            )
+        return prediction.id
+
+    async def attach(
+        self,
+        pred_id: str,
+        log_cb: Callable[Concatenate[str, ...], Coroutine] | None,
+        update_interval: int = 3,
+    ) -> None:
+        """Follow a prediction sent before, e.g. by the bot before it restarted, instead of sending a new job."""
+        prediction = await replicate.predictions.async_get(pred_id)
+        _logger.info("Re-attached to prediction %s: %s", pred_id, prediction.status)
+        self._follow(prediction, log_cb, update_interval)
+
+    def _unfollow(self, prediction: Prediction) -> None:
+        """Stop receiving updates of a prediction. Safe to call more than once."""
+        if self.webhooks:
+            self.webhooks.unwatch(prediction.id)
+        if self.poller:
+            self.poller.unwatch(prediction.id)
 
-        if log_cb:
+    def _follow(
+        self,
+        prediction: Prediction,
+        log_cb: Callable[Concatenate[str, ...], Coroutine] | None,
+        update_interval: int,
+    ) -> None:
+        """Keep the prediction updated, calling `log_cb` with its logs."""
+        self.prediction = prediction
+        self._log_cb = log_cb
+        if self.webhooks:
+            self.webhooks.watch(prediction.id, self._on_webhook)
+        if self.poller:
+            self.poller.watch(
+                prediction,
+                self._on_poll,
+                self.webhooks.fallback_poll_s if self.webhooks else 0,
+            )
+        if self.webhooks or self.poller:
+            if log_cb:
+                self._log(log_cb, prediction)
+        elif log_cb:
             self.update_task = asyncio.create_task(
                 self._update_progress(log_cb, update_interval, prediction),
             )
             _logger.info("Created task for logging callback.")
-
-        self.prediction = prediction
-        return prediction.id
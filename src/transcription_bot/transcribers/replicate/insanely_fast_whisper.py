@@ -3,6 +3,9 @@ from typing import Any, Literal
 from pydantic import BaseModel, TypeAdapter
 
 from transcription_bot.transcribers.replicate.base import ReplicateTranscriberBase
+from transcription_bot.transcribers.replicate.poller import PredictionPoller
+from transcription_bot.transcribers.replicate.versions import ModelVersionCache
+from transcription_bot.transcribers.replicate.webhooks import WebhookReceiver
 
 
 class ParamsWithoutUrl(BaseModel):
@@ -40,13 +43,27 @@ class Output(BaseModel):
 class InsanelyFastWhisper(ReplicateTranscriberBase):
     """Uses vaibhavs10/incredibly-fast-whisper."""
 
-    def __init__(self, version: str, params: ParamsWithoutUrl) -> None:
+    MODEL_NAME = "vaibhavs10/incredibly-fast-whisper"
+
+    def __init__(
+        self,
+        version: str,
+        params: ParamsWithoutUrl,
+        versions: ModelVersionCache | None = None,
+        webhooks: WebhookReceiver | None = None,
+        poller: PredictionPoller | None = None,
+    ) -> None:
         """Prepare a prediction pipeline."""
         self.params = params
-        super().__init__(version)
+        super().__init__(version, versions, webhooks=webhooks, poller=poller)
+
+    def _make_hedge(self, version: str) -> "InsanelyFastWhisper":
+        return InsanelyFastWhisper(
+            version, self.params, self.versions, self.webhooks, self.poller
+        )
 
     def _get_model_name(self) -> str:
-        return "vaibhavs10/incredibly-fast-whisper"
+        return self.MODEL_NAME
 
     def _get_model_params(self, file_url: str) -> dict[str, Any]:
         params_with_url = Params(**self.params.model_dump(), audio=file_url)
@@ -0,0 +1,147 @@
+"""
+Refresh all running predictions from a single loop, instead of one polling task per job.
+
+Each prediction is polled often while starting, less often while processing, and with exponential backoff after errors.
+Requests are capped at `max_requests_per_s` overall, so the request rate stops growing with the number of jobs once the cap is reached.
+"""
+
+import asyncio
+import contextlib
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import httpx
+from replicate.exceptions import ReplicateError
+from replicate.prediction import Prediction
+
+_logger = logging.getLogger(__name__)
+
+type PollCallback = Callable[[Prediction], None]
+"""Called with the prediction after each refresh."""
+
+
+@dataclass(eq=False)
+class _Watch:
+    prediction: Prediction
+    callback: PollCallback
+    min_interval_s: float
+    due: float
+    errors: int = 0
+
+
+class PredictionPoller:
+    """Polls every watched prediction until it finishes."""
+
+    def __init__(
+        self,
+        starting_s: float,
+        processing_s: float,
+        max_backoff_s: float,
+        max_requests_per_s: float,
+    ) -> None:
+        """
+        Prepare a poller. Call `start` to start polling.
+
+        `starting_s`: Interval while a prediction is waiting for a worker, so the start is noticed quickly.
+        `processing_s`: Interval while a prediction is running, which only updates its logs.
+        `max_backoff_s`: Longest interval after repeated errors.
+        """
+        self.starting_s = starting_s
+        self.processing_s = processing_s
+        self.max_backoff_s = max_backoff_s
+        self.max_requests_per_s = max_requests_per_s
+        self._watches: dict[str, _Watch] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        """Start polling in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop polling."""
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    def watch(
+        self, prediction: Prediction, callback: PollCallback, min_interval_s: float = 0
+    ) -> None:
+        """
+        Poll a prediction until it finishes, calling `callback` after each refresh.
+
+        `min_interval_s`: Poll no more often than this, e.g. if the prediction is also updated by webhooks.
+        """
+        loop = asyncio.get_running_loop()
+        self._watches[prediction.id] = _Watch(
+            prediction,
+            callback,
+            min_interval_s,
+            loop.time() + self._interval(prediction, min_interval_s),
+        )
+        self._wakeup.set()
+
+    def unwatch(self, pred_id: str) -> None:
+        """Stop polling a prediction."""
+        self._watches.pop(pred_id, None)
+
+    def _interval(
+        self, prediction: Prediction, min_interval_s: float, errors: int = 0
+    ) -> float:
+        interval = (
+            self.starting_s if prediction.status == "starting" else self.processing_s
+        )
+        if errors:
+            interval = min(self.max_backoff_s, interval * 2**errors)
+        return max(interval, min_interval_s)
+
+    async def _refresh(self, watch: _Watch) -> None:
+        prediction = watch.prediction
+        try:
+            await prediction.async_reload()
+            watch.errors = 0
+        except (httpx.HTTPError, ReplicateError):
+            watch.errors += 1
+            _logger.warning(
+                "Failed to refresh prediction %s (%s in a row)",
+                prediction.id,
+                watch.errors,
+                exc_info=True,
+            )
+
+        if prediction.status not in ("starting", "processing"):
+            self.unwatch(prediction.id)
+        watch.due = asyncio.get_running_loop().time() + self._interval(
+            prediction, watch.min_interval_s, watch.errors
+        )
+        watch.callback(prediction)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            due = sorted(
+                (w for w in self._watches.values() if w.due <= now),
+                key=lambda w: w.due,
+            )[: max(1, int(self.max_requests_per_s))]
+
+            if not due:
+                next_due = min((w.due for w in self._watches.values()), default=None)
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self._wakeup.wait(),
+                        next_due - now if next_due is not None else None,
+                    )
+                continue
+
+            results = await asyncio.gather(
+                *(self._refresh(w) for w in due), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    _logger.error("Failed to poll prediction", exc_info=result)
+            # Spread requests out, so they never exceed the rate limit
+            await asyncio.sleep(len(due) / self.max_requests_per_s)
@@ -0,0 +1,87 @@
+"""
+Detect the language and number of speakers of a long recording from a short clip of its start, before transcribing all of it.
+
+thomasmol/whisper-diarization is otherwise told the speech is English, so a recording in another language takes a full-length
+prediction to produce a useless transcript. Autodetecting the number of speakers over the whole recording also lengthens diarization.
+"""
+
+import asyncio
+import logging
+from typing import cast
+
+from pydantic import ValidationError
+from replicate.prediction import Prediction
+
+from transcription_bot.transcribers.replicate.thomasmol import (
+    Output,
+    ThomasmolParamsWithoutUrl,
+    ThomasmolTranscriber,
+)
+
+_logger = logging.getLogger(__name__)
+
+PROBE_PARAMS = ThomasmolParamsWithoutUrl(
+    language=None, num_speakers=None, transcript_output_format="segments_only"
+)
+"""Parameters of probe predictions, detecting both the language and the number of speakers."""
+
+
+def params_from_output(
+    output: Output, *, speakers: bool = False
+) -> ThomasmolParamsWithoutUrl:
+    """
+    Return parameters for transcribing the whole recording, from the output of its probe.
+
+    `speakers`: Also fix the number of speakers to those heard in the probe. Speakers who only talk later are attributed to others.
+    """
+    return ThomasmolParamsWithoutUrl(
+        language=output.language,
+        num_speakers=output.num_speakers if speakers and output.num_speakers else None,
+    )
+
+
+async def probe(
+    transcriber: ThomasmolTranscriber,
+    clip_url: str,
+    timeout_s: float,
+    *,
+    speakers: bool = False,
+) -> ThomasmolParamsWithoutUrl | None:
+    """
+    Transcribe the clip, and return parameters for transcribing the whole recording.
+
+    `transcriber`: Created with `PROBE_PARAMS`.
+    `timeout_s`: The probe is cancelled if it takes longer, e.g. waiting for a cold boot, so it never delays the main job by much.
+    `speakers`: See `params_from_output`.
+
+    Returns None if the probe failed or timed out, to transcribe with the default parameters.
+    """
+    try:
+        async with asyncio.timeout(timeout_s):
+            await transcriber.send_job(clip_url, None)
+            prediction = await transcriber.wait()
+    except TimeoutError:
+        _logger.warning("Probe of %s timed out after %ss", clip_url, timeout_s)
+        if transcriber.prediction:
+            await transcriber.cancel(cast(Prediction, transcriber.prediction).id)
+        return None
+    except Exception:
+        _logger.exception("Probe of %s failed", clip_url)
+        return None
+
+    if prediction.status != "succeeded" or not prediction.output:
+        _logger.warning("Probe of %s ended %s", clip_url, prediction.status)
+        return None
+
+    try:
+        output = Output.model_validate(prediction.output)
+    except ValidationError:
+        _logger.exception("Probe of %s returned unexpected output", clip_url)
+        return None
+    _logger.info(
+        "Probe of %s detected language %s, %s speakers",
+        clip_url,
+        output.language,
+        output.num_speakers,
+    )
+    return params_from_output(output, speakers=speakers)
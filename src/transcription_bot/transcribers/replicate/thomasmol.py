@@ -1,8 +1,17 @@
+from collections.abc import Callable
 from typing import Any, Literal
 
 from pydantic import BaseModel, PositiveInt
 
-from transcription_bot.transcribers.replicate.base import ReplicateTranscriberBase
+from transcription_bot.audio.vad import OffsetMap
+from transcription_bot.transcribers.replicate.base import (
+    HedgeCallback,
+    Hedging,
+    ReplicateTranscriberBase,
+)
+from transcription_bot.transcribers.replicate.poller import PredictionPoller
+from transcription_bot.transcribers.replicate.versions import ModelVersionCache
+from transcription_bot.transcribers.replicate.webhooks import WebhookReceiver
 
 
 class Word(BaseModel):
@@ -22,7 +31,27 @@ class Segment(BaseModel):
     speaker: str
     start: float
     text: str
-    words: list[Word]
+    words: list[Word] = []
+    """Missing from `segments_only` output, e.g. of probes."""
+
+
+def map_segment_times(segment: Segment, f: Callable[[float], float]) -> Segment:
+    """Return a copy of the segment with `f` applied to the timestamps of it and its words."""
+    return segment.model_copy(
+        update={
+            "start": f(segment.start),
+            "end": f(segment.end),
+            "words": [
+                word.model_copy(update={"start": f(word.start), "end": f(word.end)})
+                for word in segment.words
+            ],
+        }
+    )
+
+
+def format_segments(segments: list[Segment]) -> str:
+    """Format segments as a transcript, one paragraph per segment."""
+    return "\n\n".join([f"{s.speaker}: {s.text}" for s in segments])
 
 
 class Output(BaseModel):
@@ -74,18 +103,50 @@ class ThomasmolParams(ThomasmolParamsWithoutUrl):
 class ThomasmolTranscriber(ReplicateTranscriberBase):
     """Uses thomasmol/whisper-diarization."""
 
-    def __init__(self, version: str, params: ThomasmolParamsWithoutUrl) -> None:
+    MODEL_NAME = "thomasmol/whisper-diarization"
+
+    def __init__(  # noqa: PLR0913
+        self,
+        version: str,
+        params: ThomasmolParamsWithoutUrl,
+        versions: ModelVersionCache | None = None,
+        offset_map: OffsetMap | None = None,
+        webhooks: WebhookReceiver | None = None,
+        poller: PredictionPoller | None = None,
+        hedging: Hedging | None = None,
+        on_hedged: HedgeCallback | None = None,
+    ) -> None:
         """Prepare a prediction pipeline."""
         self.params = params
-        super().__init__(version)
+        super().__init__(
+            version, versions, offset_map, webhooks, poller, hedging, on_hedged
+        )
+
+    def _make_hedge(self, version: str) -> "ThomasmolTranscriber":
+        return ThomasmolTranscriber(
+            version,
+            self.params,
+            self.versions,
+            self.offset_map,
+            self.webhooks,
+            self.poller,
+        )
 
     def _get_model_name(self) -> str:
-        return "thomasmol/whisper-diarization"
+        return self.MODEL_NAME
 
     def _get_model_params(self, file_url: str) -> dict[str, Any]:
         params_with_url = ThomasmolParams(**self.params.model_dump(), file_url=file_url)
         return params_with_url.model_dump(exclude_none=True)
 
+    def parse_output(self, model_output: Any) -> list[Segment]:
+        """Return the segments, with timestamps relative to the original file."""
+        segments = Output.model_validate(model_output).segments
+        if self.offset_map:
+            segments = [
+                map_segment_times(s, self.offset_map.to_original) for s in segments
+            ]
+        return segments
+
     def _process_output(self, model_output: Any) -> str:
-        output = Output.model_validate(model_output)
-        return "\n\n".join([f"{s.speaker}: {s.text}" for s in output.segments])
+        return format_segments(self.parse_output(model_output))
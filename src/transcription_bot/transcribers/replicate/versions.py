@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import time
+
+import replicate
+import replicate.version
+
+_logger = logging.getLogger(__name__)
+
+
+def fetch_model_version(model_name: str, version: str) -> replicate.version.Version:
+    """Fetch a model version from Replicate. Blocking."""
+    model = replicate.models.get(model_name)
+    _logger.info("Constructed Replicate model %s", model.name)
+    return model.versions.get(version)
+
+
+class ModelVersionCache:
+    """
+    Process-wide cache of Replicate model versions.
+
+    Looking up a version costs two blocking HTTP round-trips, so entries are kept for `ttl_s` seconds before being refreshed.
+    """
+
+    def __init__(self, ttl_s: float) -> None:
+        """Create an empty cache whose entries expire after `ttl_s` seconds."""
+        self.ttl_s = ttl_s
+        self._entries: dict[
+            tuple[str, str], tuple[float, replicate.version.Version]
+        ] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, model_name: str, version: str) -> replicate.version.Version:
+        """
+        Return the model version, fetching it if it is missing or expired.
+
+        If a refresh fails, the stale version is returned instead.
+        """
+        key = (model_name, version)
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl_s:
+                return entry[1]
+
+            try:
+                fetched = await asyncio.to_thread(
+                    fetch_model_version, model_name, version
+                )
+            except Exception:
+                if not entry:
+                    raise
+                _logger.exception(
+                    "Failed to refresh %s:%s, using cached version", model_name, version
+                )
+                return entry[1]
+
+            self._entries[key] = (time.monotonic(), fetched)
+            return fetched
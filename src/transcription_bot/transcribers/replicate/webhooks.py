@@ -0,0 +1,158 @@
+"""
+Receive prediction events from Replicate as webhooks, instead of polling each prediction.
+
+Replicate POSTs the prediction to the webhook URL whenever it starts, logs, outputs or completes.
+The receiver is a minimal HTTP server, which verifies the signature of each request and passes the prediction to whoever is watching it.
+"""
+
+import asyncio
+import json
+import logging
+from collections.abc import Callable
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import urlsplit
+
+import replicate
+from replicate.webhook import WebhookSigningSecret, WebhookValidationError
+
+_logger = logging.getLogger(__name__)
+
+type WebhookCallback = Callable[[dict[str, Any]], None]
+"""Called with the prediction sent by Replicate."""
+
+EVENTS = ["start", "output", "logs", "completed"]
+"""Events requested for each prediction."""
+
+_MAX_BODY_BYTES = 64 * 1024 * 1024
+"""The whole output of a prediction is sent in the body, which is large for long recordings."""
+
+_MAX_PENDING = 100
+"""Events for unwatched predictions kept, as they may arrive before the prediction is watched."""
+
+_READ_TIMEOUT_S = 60
+"""Connections which take longer than this to send their request are closed, so stalled clients do not pile up."""
+
+_TOLERANCE_S = 300
+"""Requests signed longer ago than this are rejected, to prevent replays."""
+
+
+class WebhookReceiver:
+    """An HTTP server receiving prediction events from Replicate."""
+
+    def __init__(
+        self,
+        url: str,
+        host: str,
+        port: int,
+        secret: WebhookSigningSecret | None,
+        fallback_poll_s: float,
+    ) -> None:
+        """
+        Prepare a receiver. Call `start` to start listening.
+
+        `url`: Public URL Replicate sends events to, which must reach `host`:`port`. Only requests to its path are accepted.
+        `secret`: Used to verify requests came from Replicate. If None, requests are not verified, which is only safe for testing.
+        `fallback_poll_s`: Predictions are still polled this often, in case a webhook is lost.
+        """
+        self.url = url
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.fallback_poll_s = fallback_poll_s
+        self._path = urlsplit(url).path or "/"
+        self._callbacks: dict[str, WebhookCallback] = {}
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        """Start listening for webhooks."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        _logger.info("Listening for Replicate webhooks on %s:%s", self.host, self.port)
+
+    async def close(self) -> None:
+        """Stop listening for webhooks."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def watch(self, pred_id: str, callback: WebhookCallback) -> None:
+        """Call `callback` with each event for a prediction, including any which arrived already."""
+        self._callbacks[pred_id] = callback
+        if payload := self._pending.pop(pred_id, None):
+            callback(payload)
+
+    def unwatch(self, pred_id: str) -> None:
+        """Stop watching a prediction."""
+        self._callbacks.pop(pred_id, None)
+
+    def _dispatch(self, payload: dict[str, Any]) -> None:
+        pred_id = payload["id"]
+        if callback := self._callbacks.get(pred_id):
+            callback(payload)
+            return
+
+        # The event may have arrived before `async_create` returned. Keep only the latest.
+        self._pending.pop(pred_id, None)
+        self._pending[pred_id] = payload
+        while len(self._pending) > _MAX_PENDING:
+            del self._pending[next(iter(self._pending))]
+
+    def _receive(
+        self, method: str, path: str, headers: dict[str, str], body: bytes
+    ) -> HTTPStatus:
+        if method != "POST" or path != self._path:
+            return HTTPStatus.NOT_FOUND
+
+        if self.secret:
+            try:
+                replicate.webhooks.validate(
+                    headers=headers,
+                    body=body.decode(),
+                    secret=self.secret,
+                    tolerance=_TOLERANCE_S,
+                )
+            except WebhookValidationError:
+                _logger.warning("Rejected webhook with invalid signature")
+                return HTTPStatus.UNAUTHORIZED
+
+        payload = json.loads(body)
+        if not isinstance(payload, dict) or not isinstance(payload.get("id"), str):
+            _logger.warning("Received webhook without a prediction")
+            return HTTPStatus.BAD_REQUEST
+        self._dispatch(payload)
+        return HTTPStatus.OK
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Handle a single HTTP/1.1 request, then close the connection."""
+        try:
+            async with asyncio.timeout(_READ_TIMEOUT_S):
+                method, path, _ = (await reader.readline()).decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()).strip():
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > _MAX_BODY_BYTES:
+                    status = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+                else:
+                    body = await reader.readexactly(length)
+                    status = self._receive(method, urlsplit(path).path, headers, body)
+        except TimeoutError:
+            _logger.warning("Timed out reading webhook")
+            status = HTTPStatus.REQUEST_TIMEOUT
+        except (ValueError, asyncio.IncompleteReadError):
+            _logger.exception("Received malformed webhook")
+            status = HTTPStatus.BAD_REQUEST
+
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Length: 0\r\nConnection: close\r\n\r\n".encode()
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
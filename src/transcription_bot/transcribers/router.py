@@ -0,0 +1,140 @@
+"""
+Pick the transcription backend expected to finish a job soonest.
+
+Meetings always use thomasmol/whisper-diarization, for its diarization and word timestamps.
+Short recordings and voice notes may use vaibhavs10/incredibly-fast-whisper, or very short ones this machine's CPU, instead,
+if it is currently faster: latency is estimated from moving averages of the queue and run times of recent jobs on each backend.
+A backend not used for a while is tried again, as its latency may have changed since, e.g. once it has warmed up,
+unless it is estimated to be much slower: that job is a real user's, who waits for the extra time.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Literal
+
+from transcription_bot.transcribers.base import Timings
+
+_logger = logging.getLogger(__name__)
+
+type Backend = Literal["thomasmol", "fast_whisper", "local"]
+
+
+@dataclass
+class _Latency:
+    queue_s: float = 0
+    """Moving average of the time predictions waited to start."""
+    run_s_per_audio_s: float = 0
+    """Moving average of the run time per second of audio."""
+    samples: int = 0
+    tried_at: float = float("-inf")
+    """When a job was last routed to the backend, by `time.monotonic`."""
+
+
+class BackendRouter:
+    """Routes each job to a backend, from its duration, media type, and recent latencies of the backends."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        fast_max_s: float | None,
+        alpha: float = 0.2,
+        local_max_s: float | None = None,
+        fast_voice_max_s: float | None = None,
+        explore_s: float = 600,
+        explore_max_extra_s: float = 60,
+    ) -> None:
+        """
+        Create a router with no latencies recorded yet.
+
+        `fast_max_s`: Recordings up to this long, and voice notes, may use the fast backend. If None, it is never used.
+        `alpha`: Weight of the latest prediction in the moving averages.
+        `local_max_s`: Recordings up to this long may be transcribed locally. If None, they never are.
+        `fast_voice_max_s`: Voice notes longer than this do not use the fast backend. If None, voice notes of any length may.
+        `explore_s`: A candidate backend no job was routed to for this long is tried again, instead of the one estimated fastest.
+        `explore_max_extra_s`: A backend is only tried again if it is estimated to take at most this much longer than the fastest.
+        """
+        self.fast_max_s = fast_max_s
+        self.alpha = alpha
+        self.local_max_s = local_max_s
+        self.fast_voice_max_s = fast_voice_max_s
+        self.explore_s = explore_s
+        self.explore_max_extra_s = explore_max_extra_s
+        self._latencies: dict[Backend, _Latency] = {
+            "thomasmol": _Latency(),
+            "fast_whisper": _Latency(),
+            "local": _Latency(),
+        }
+
+    def estimate(self, backend: Backend, duration_s: float) -> float:
+        """
+        Estimate how long a recording of `duration_s` would take on `backend`, queueing included.
+
+        Backends without recorded latencies are estimated to take no time.
+        """
+        latency = self._latencies[backend]
+        return latency.queue_s + latency.run_s_per_audio_s * duration_s
+
+    def choose(self, duration_s: float | None, *, voice: bool = False) -> Backend:
+        """
+        Return the backend for a recording.
+
+        `duration_s`: Unknown recordings are treated as meetings.
+        `voice`: Voice notes have a single speaker, so they need no diarization, up to `fast_voice_max_s`.
+        """
+        if duration_s is None:
+            return "thomasmol"
+
+        candidates: list[Backend] = ["thomasmol"]
+        if self.fast_max_s is not None and (
+            duration_s <= self.fast_max_s
+            or (
+                voice
+                and (
+                    self.fast_voice_max_s is None or duration_s <= self.fast_voice_max_s
+                )
+            )
+        ):
+            candidates.append("fast_whisper")
+        if self.local_max_s is not None and duration_s <= self.local_max_s:
+            candidates.append("local")
+        if len(candidates) == 1:
+            return "thomasmol"
+
+        now = time.monotonic()
+        fastest = min(candidates, key=lambda b: self.estimate(b, duration_s))
+        max_s = self.estimate(fastest, duration_s) + self.explore_max_extra_s
+        stale: list[Backend] = [
+            b
+            for b in candidates
+            if now - self._latencies[b].tried_at >= self.explore_s
+            and self.estimate(b, duration_s) <= max_s
+        ]
+        # Untried, or not tried for a while: measure it again
+        backend = (
+            min(stale, key=lambda b: self._latencies[b].tried_at) if stale else fastest
+        )
+        self._latencies[backend].tried_at = now
+        _logger.info(
+            "Routing %.0fs recording to %s, estimates: %s",
+            duration_s,
+            backend,
+            {b: round(self.estimate(b, duration_s), 1) for b in candidates},
+        )
+        return backend
+
+    def record(self, backend: Backend, duration_s: float, timings: Timings) -> None:
+        """Update the latencies of `backend` with a finished prediction for a recording of `duration_s`."""
+        if duration_s <= 0:
+            return
+        latency = self._latencies[backend]
+        latency.tried_at = time.monotonic()
+        run_s_per_audio_s = timings.run_s / duration_s
+        if not latency.samples:
+            latency.queue_s = timings.queue_s
+            latency.run_s_per_audio_s = run_s_per_audio_s
+        else:
+            latency.queue_s += self.alpha * (timings.queue_s - latency.queue_s)
+            latency.run_s_per_audio_s += self.alpha * (
+                run_s_per_audio_s - latency.run_s_per_audio_s
+            )
+        latency.samples += 1
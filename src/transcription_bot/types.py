@@ -7,3 +7,6 @@ type PredictionStatus = Literal[
     "failed",
     "canceled",
 ]
+
+type AudioCodec = Literal["opus", "flac"]
+"""Codec audio is compressed with before uploading."""
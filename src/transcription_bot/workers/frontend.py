@@ -0,0 +1,146 @@
+"""
+Queue files for workers from the Telegram front-end, and apply the events they publish to the job's messages.
+
+The front-end then only receives messages and sends edits and replies, so CPU-bound work does not compete with the Telegram connection.
+"""
+
+import asyncio
+import base64
+import io
+import logging
+from functools import partial
+from typing import Any, NoReturn, cast
+
+from telethon import Button, TelegramClient
+from telethon.custom import Message
+
+from transcription_bot.handlers.cancel import (
+    register_cancel_callback,
+    unregister_cancel_callback,
+)
+from transcription_bot.handlers.edits import EditScheduler
+from transcription_bot.workers.queue import Event, JobQueue, QueuedJob
+
+_logger = logging.getLogger(__name__)
+
+_MAX_EVENTS = 100
+"""Events applied per poll of the queue."""
+
+
+class Relay:
+    """Queues jobs for workers, and applies the events they publish."""
+
+    def __init__(self, queue: JobQueue, edits: EditScheduler, poll_s: float) -> None:
+        """
+        Prepare a relay. Call `run` once the client is connected.
+
+        `edits`: Sends the edits published by workers.
+        `poll_s`: Interval between polls of the queue for events, while there are none.
+        """
+        self.queue = queue
+        self.edits = edits
+        self.poll_s = poll_s
+        self._messages: dict[str, dict[int, Message]] = {}
+        """Messages of each job, by id. Replies sent for workers are keyed by the negative id the worker gave them."""
+        self._cancel_tokens: dict[str, list[str]] = {}
+
+    async def enqueue(self, message: Message, reply_msg: Message) -> None:
+        """Queue the file attached to `message` for a worker, showing its progress in `reply_msg`."""
+        job = QueuedJob(
+            f"{message.chat_id}:{message.id}",
+            cast(int, message.chat_id),
+            message.id,
+            reply_msg.id,
+        )
+        self._messages[job.id] = {message.id: message, reply_msg.id: reply_msg}
+        await self.queue.put(job)
+        _logger.info("Queued job %s", job.id)
+
+    async def _job_messages(
+        self, client: TelegramClient, job_id: str
+    ) -> dict[int, Message] | None:
+        """Return the messages of a job, fetching them if it was queued before the front-end restarted."""
+        if job_id not in self._messages:
+            job = await self.queue.get(job_id)
+            if not job:
+                return None
+            fetched = cast(
+                list[Message | None],
+                await client.get_messages(
+                    job.chat_id, ids=[job.message_id, job.reply_msg_id]
+                ),
+            )
+            self._messages[job_id] = {m.id: m for m in fetched if m}
+        return self._messages[job_id]
+
+    def _buttons(self, job_id: str, buttons: list[list[str]]) -> list[Any]:
+        """Create buttons which send their data back to the worker when pressed."""
+        created = []
+        for text, data in buttons:
+            token = register_cancel_callback(
+                partial(self.queue.send_callback, job_id, data)
+            )
+            self._cancel_tokens.setdefault(job_id, []).append(token)
+            created.append(Button.inline(text, token))
+        return created
+
+    def _finish(self, job_id: str) -> None:
+        self._messages.pop(job_id, None)
+        for token in self._cancel_tokens.pop(job_id, []):
+            unregister_cancel_callback(token)
+
+    async def _apply(self, client: TelegramClient, job_id: str, event: Event) -> None:
+        messages = await self._job_messages(client, job_id)
+        if messages is None:
+            _logger.warning("Dropping event of unknown job %s: %s", job_id, event)
+            return
+        if event["op"] == "done":
+            self._finish(job_id)
+            await self.queue.remove(job_id)
+            return
+
+        target = messages.get(event["ref"])
+        if not target:
+            _logger.warning("Dropping event for unknown message: %s", event)
+            return
+        # Edits are sent in the background, so other ops wait for those published before them
+        match event["op"]:
+            case "edit":
+                self.edits.edit(target, event["text"], **event["kwargs"])
+            case "reply":
+                await self.edits.flush(target)
+                file = None
+                if "file" in event:
+                    file = io.BytesIO(base64.b64decode(event["file"]["data"]))
+                    # Telethon takes the file name from the name attribute
+                    file.name = event["file"]["name"]
+                buttons = (
+                    self._buttons(job_id, event["buttons"])
+                    if "buttons" in event
+                    else None
+                )
+                messages[event["new"]] = cast(
+                    Message,
+                    await target.reply(
+                        event["text"], file=file, buttons=buttons, **event["kwargs"]
+                    ),
+                )
+            case "delete":
+                self.edits.discard(target)
+                await self.edits.flush(target)
+                await target.delete()
+            case op:
+                _logger.warning("Dropping event with unknown op %s", op)
+
+    async def run(self, client: TelegramClient) -> NoReturn:
+        """Apply events published by workers, in order, forever."""
+        while True:
+            events = await self.queue.events(_MAX_EVENTS)
+            for event_id, job_id, event in events:
+                try:
+                    await self._apply(client, job_id, event)
+                except Exception:
+                    _logger.exception("Failed to apply event %s", event)
+                await self.queue.ack([event_id])
+            if len(events) < _MAX_EVENTS:
+                await asyncio.sleep(self.poll_s)
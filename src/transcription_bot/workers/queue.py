@@ -0,0 +1,202 @@
+"""
+Pass jobs from the Telegram front-end to worker processes, and their progress back.
+
+The queue is pluggable: `JobQueue` is implemented by `SqliteJobQueue`, for workers on the same host as the front-end.
+"""
+
+import json
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Collection
+from dataclasses import dataclass
+from typing import Any
+
+from transcription_bot.cache.sqlite import SqliteStore
+
+type Event = dict[str, Any]
+"""An action for the front-end to take on a job's messages. See `RemoteMessage`."""
+
+
+@dataclass(frozen=True)
+class QueuedJob:
+    """A file sent to the bot, to be processed by a worker."""
+
+    id: str
+    chat_id: int
+    message_id: int
+    """The message with the file."""
+    reply_msg_id: int
+    """The message showing the job's progress."""
+
+
+class JobQueue(ABC):
+    """Jobs waiting for or claimed by workers, with the events published by workers and callbacks for them."""
+
+    @abstractmethod
+    async def put(self, job: QueuedJob) -> None:
+        """Add a job for a worker to claim."""
+
+    @abstractmethod
+    async def claim(self, worker: str) -> QueuedJob | None:
+        """Take the oldest job not claimed by another worker, or return None if there is none."""
+
+    @abstractmethod
+    async def release(self, worker: str) -> None:
+        """Return the jobs claimed by `worker` to the queue, e.g. when it restarts."""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> QueuedJob | None:
+        """Return a job which has not been removed."""
+
+    @abstractmethod
+    async def remove(self, job_id: str) -> None:
+        """Forget a finished job."""
+
+    @abstractmethod
+    async def publish(self, job_id: str, event: Event) -> None:
+        """Send an event to the front-end."""
+
+    @abstractmethod
+    async def events(self, limit: int) -> list[tuple[int, str, Event]]:
+        """Return the oldest events not acknowledged yet, as (event id, job id, event)."""
+
+    @abstractmethod
+    async def ack(self, event_ids: Collection[int]) -> None:
+        """Forget events the front-end has applied."""
+
+    @abstractmethod
+    async def send_callback(self, job_id: str, data: str) -> None:
+        """Send the data of a button pressed by a user to the worker running the job."""
+
+    @abstractmethod
+    async def take_callbacks(self, job_ids: Collection[str]) -> list[tuple[str, str]]:
+        """Return and forget the callbacks sent for jobs, as (job id, data)."""
+
+
+class SqliteJobQueue(SqliteStore, JobQueue):
+    """A queue in a SQLite database, shared by the front-end and workers on the same host."""
+
+    _SCHEMA = """
+    PRAGMA journal_mode = WAL;
+    CREATE TABLE IF NOT EXISTS queue (
+        id TEXT PRIMARY KEY,
+        chat_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        reply_msg_id INTEGER NOT NULL,
+        worker TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        event TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS callbacks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    """
+
+    @staticmethod
+    def _job(row: Any) -> QueuedJob:
+        return QueuedJob(
+            row["id"], row["chat_id"], row["message_id"], row["reply_msg_id"]
+        )
+
+    async def put(self, job: QueuedJob) -> None:
+        """Add a job for a worker to claim."""
+        await self._run(
+            lambda db: db.execute(
+                "INSERT OR REPLACE INTO queue VALUES (?, ?, ?, ?, NULL, ?)",
+                (job.id, job.chat_id, job.message_id, job.reply_msg_id, time.time()),
+            )
+        )
+
+    async def claim(self, worker: str) -> QueuedJob | None:
+        """Take the oldest job not claimed by another worker, or return None if there is none."""
+        # A single statement, so workers in other processes cannot claim the same job
+        row = await self._run(
+            lambda db: db.execute(
+                """
+                UPDATE queue SET worker = ? WHERE id = (
+                    SELECT id FROM queue WHERE worker IS NULL ORDER BY created_at LIMIT 1
+                )
+                RETURNING *
+                """,
+                (worker,),
+            ).fetchone()
+        )
+        return self._job(row) if row else None
+
+    async def release(self, worker: str) -> None:
+        """Return the jobs claimed by `worker` to the queue, e.g. when it restarts."""
+        await self._run(
+            lambda db: db.execute(
+                "UPDATE queue SET worker = NULL WHERE worker = ?", (worker,)
+            )
+        )
+
+    async def get(self, job_id: str) -> QueuedJob | None:
+        """Return a job which has not been removed."""
+        row = await self._run(
+            lambda db: db.execute(
+                "SELECT * FROM queue WHERE id = ?", (job_id,)
+            ).fetchone()
+        )
+        return self._job(row) if row else None
+
+    async def remove(self, job_id: str) -> None:
+        """Forget a finished job."""
+        await self._run(
+            lambda db: db.execute("DELETE FROM queue WHERE id = ?", (job_id,))
+        )
+
+    async def publish(self, job_id: str, event: Event) -> None:
+        """Send an event to the front-end."""
+        await self._run(
+            lambda db: db.execute(
+                "INSERT INTO events (job_id, event) VALUES (?, ?)",
+                (job_id, json.dumps(event)),
+            )
+        )
+
+    async def events(self, limit: int) -> list[tuple[int, str, Event]]:
+        """Return the oldest events not acknowledged yet, as (event id, job id, event)."""
+        rows = await self._run(
+            lambda db: db.execute(
+                "SELECT * FROM events ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        )
+        return [(row["id"], row["job_id"], json.loads(row["event"])) for row in rows]
+
+    async def ack(self, event_ids: Collection[int]) -> None:
+        """Forget events the front-end has applied."""
+        await self._run(
+            lambda db: db.executemany(
+                "DELETE FROM events WHERE id = ?", [(i,) for i in event_ids]
+            )
+        )
+
+    async def send_callback(self, job_id: str, data: str) -> None:
+        """Send the data of a button pressed by a user to the worker running the job."""
+        await self._run(
+            lambda db: db.execute(
+                "INSERT INTO callbacks (job_id, data) VALUES (?, ?)", (job_id, data)
+            )
+        )
+
+    async def take_callbacks(self, job_ids: Collection[str]) -> list[tuple[str, str]]:
+        """Return and forget the callbacks sent for jobs, as (job id, data)."""
+        if not job_ids:
+            return []
+        placeholders = ", ".join("?" * len(job_ids))
+        rows = await self._run(
+            lambda db: db.execute(
+                f"DELETE FROM callbacks WHERE job_id IN ({placeholders}) RETURNING *",  # noqa: S608
+                tuple(job_ids),
+            ).fetchall()
+        )
+        return [
+            (row["job_id"], row["data"]) for row in sorted(rows, key=lambda r: r["id"])
+        ]
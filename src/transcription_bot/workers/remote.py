@@ -0,0 +1,149 @@
+"""
+Stand in for Telegram messages in a worker, relaying replies and edits to the front-end as events.
+
+Events are JSON objects with an `op`, applied by the front-end in the order they were published:
+- `edit`: Edit message `ref` to `text`.
+- `reply`: Reply to message `ref` with `text`, and optionally a `file` or inline `buttons`. The reply is message `new`.
+- `delete`: Delete message `ref`.
+- `done`: The job finished.
+"""
+
+import base64
+import io
+import itertools
+from pathlib import Path
+from typing import Any
+
+from telethon.custom import Message
+from telethon.tl.custom.file import File
+from telethon.types import Document
+
+from transcription_bot.workers.queue import JobQueue
+
+_new_ids = itertools.count(-1, -1)
+"""Ids of replies sent by the worker, which are not known until the front-end sends them."""
+
+
+def _button_data(button: Any) -> str:
+    # Newer Telethon versions keep the callback data in the button type
+    data = getattr(button, "data", None) or button.type.data
+    return data.decode()
+
+
+class RemoteMessage:
+    """
+    A message of a job run by a worker. Replies, edits and deletions are published for the front-end to send.
+
+    The rest of `FileMessage`, e.g. downloading the media, is delegated to `message`, fetched by the worker's own client.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        queue: JobQueue,
+        job_id: str,
+        chat_id: int,
+        msg_id: int,
+        text: str = "",
+        message: Message | None = None,
+    ) -> None:
+        """
+        Wrap a message of job `job_id`.
+
+        `msg_id`: The id of the message in Telegram, or a negative id for replies sent by the worker.
+        `message`: The same message, fetched by the worker. Not available for replies sent by the worker.
+        """
+        self._queue = queue
+        self._job_id = job_id
+        self.chat_id = chat_id
+        self.id = msg_id
+        self.text = text
+        self._message = message
+
+    @property
+    def _fetched(self) -> Message:
+        if self._message is None:
+            msg = "Only messages fetched by the worker have media and a sender"
+            raise AttributeError(msg)
+        return self._message
+
+    @property
+    def sender_id(self) -> int | None:
+        """Delegated to the message fetched by the worker, as are the properties below."""
+        return self._fetched.sender_id
+
+    @property
+    def sender(self) -> Any:  # noqa: D102
+        return self._fetched.sender
+
+    @property
+    def client(self) -> Any:  # noqa: D102
+        return self._fetched.client
+
+    @property
+    def file(self) -> File | None:  # noqa: D102
+        return self._fetched.file
+
+    @property
+    def media(self) -> Any:  # noqa: D102
+        return self._fetched.media
+
+    @property
+    def document(self) -> Document | None:  # noqa: D102
+        return self._fetched.document
+
+    @property
+    def audio(self) -> Document | None:  # noqa: D102
+        return self._fetched.audio
+
+    @property
+    def voice(self) -> Document | None:  # noqa: D102
+        return self._fetched.voice
+
+    @property
+    def video(self) -> Document | None:  # noqa: D102
+        return self._fetched.video
+
+    async def download_media(self, *args: Any, **kwargs: Any) -> Any:
+        """Download the media with the worker's client."""
+        return await self._fetched.download_media(*args, **kwargs)
+
+    async def get_sender(self) -> Any:  # noqa: D102
+        return await self._fetched.get_sender()
+
+    async def _publish(self, op: str, **event: Any) -> None:
+        await self._queue.publish(self._job_id, {"op": op, "ref": self.id, **event})
+
+    async def edit(self, text: str, **kwargs: Any) -> "RemoteMessage":
+        """Edit the message. `kwargs` must be serializable, e.g. `parse_mode`."""
+        self.text = text
+        await self._publish("edit", text=text, kwargs=kwargs)
+        return self
+
+    async def reply(
+        self,
+        message: str = "",
+        *,
+        file: Path | io.BytesIO | None = None,
+        buttons: list[Any] | None = None,
+        **kwargs: Any,
+    ) -> "RemoteMessage":
+        """Reply to the message, optionally with a file or inline buttons."""
+        reply = RemoteMessage(
+            self._queue, self._job_id, self.chat_id, next(_new_ids), message
+        )
+        event: dict[str, Any] = {"new": reply.id, "text": message, "kwargs": kwargs}
+        if file:
+            event["file"] = {
+                "name": file.name,
+                "data": base64.b64encode(
+                    file.read_bytes() if isinstance(file, Path) else file.getvalue()
+                ).decode(),
+            }
+        if buttons:
+            event["buttons"] = [[b.text, _button_data(b)] for b in buttons]
+        await self._publish("reply", **event)
+        return reply
+
+    async def delete(self) -> None:
+        """Delete the message."""
+        await self._publish("delete")
@@ -0,0 +1,147 @@
+"""
+Run jobs queued by the Telegram front-end. Start with `python -m transcription_bot.workers.worker`.
+
+Several workers, on the same host as the front-end, can share a queue. Each logs in with its own session, to download media,
+and needs its own REPLICATE_WEBHOOK_URL and REPLICATE_WEBHOOK_PORT if webhooks are enabled.
+Jobs interrupted by a restart are resumed from the job store, re-attaching to their predictions.
+"""
+
+import asyncio
+import logging
+import socket
+from typing import NoReturn, cast
+
+import uvloop
+from telethon import TelegramClient
+from telethon.custom import Message
+from telethon.events import StopPropagation
+
+from transcription_bot.handlers.cancel import cancel_job
+from transcription_bot.handlers.main import handle_file, resume_job
+from transcription_bot.main import bootstrap
+from transcription_bot.services import Services
+from transcription_bot.settings import Settings
+from transcription_bot.utils.logger import setup_logging
+from transcription_bot.workers.queue import JobQueue, QueuedJob, SqliteJobQueue
+from transcription_bot.workers.remote import RemoteMessage
+
+_logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Claims jobs from the queue and runs them, up to `concurrency` at once."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        name: str,
+        client: TelegramClient,
+        queue: JobQueue,
+        services: Services,
+        concurrency: int,
+        poll_s: float,
+    ) -> None:
+        """
+        Prepare a worker. Call `run` to start claiming jobs.
+
+        `name`: Identifies the worker's claims in the queue. Must be unique, and the same across restarts.
+        `client`: Used to download media.
+        `poll_s`: Interval between polls of the queue.
+        """
+        self.name = name
+        self.client = client
+        self.queue = queue
+        self.services = services
+        self.concurrency = concurrency
+        self.poll_s = poll_s
+        self._running: dict[str, asyncio.Task[None]] = {}
+
+    async def _process(self, job: QueuedJob) -> None:
+        _logger.info("Running job %s", job.id)
+        reply_msg = RemoteMessage(
+            self.queue, job.id, job.chat_id, job.reply_msg_id, "Processing..."
+        )
+        try:
+            message = cast(
+                Message | None,
+                await self.client.get_messages(job.chat_id, ids=job.message_id),
+            )
+            if message:
+                remote = RemoteMessage(
+                    self.queue,
+                    job.id,
+                    job.chat_id,
+                    job.message_id,
+                    message.text or "",
+                    message,
+                )
+                stored = await self.services.job_store.get(job.chat_id, job.message_id)
+                # Jobs interrupted while downloading have nothing to resume, so are run again
+                if stored and stored.stage != "download":
+                    await resume_job(remote, reply_msg, stored, self.services)
+                else:
+                    await handle_file(remote, reply_msg, self.services)
+            else:
+                _logger.warning("Message of job %s was deleted", job.id)
+        except StopPropagation:
+            pass
+        except Exception:
+            _logger.exception("Job %s failed", job.id)
+        # Not reached if the worker is stopped, so the job is run again once it restarts
+        await self.queue.publish(job.id, {"op": "done"})
+
+    async def _relay_callbacks(self) -> None:
+        for job_id, data in await self.queue.take_callbacks(list(self._running)):
+            _logger.info("Received callback for job %s: %s", job_id, data)
+            try:
+                await cancel_job(data)
+            except Exception:
+                _logger.exception("Failed to cancel job %s", job_id)
+
+    def _claimed(self, job: QueuedJob) -> None:
+        task = asyncio.create_task(self._process(job))
+        self._running[job.id] = task
+        task.add_done_callback(lambda _: self._running.pop(job.id, None))
+
+    async def run(self) -> NoReturn:
+        """Claim and run jobs forever. Jobs claimed before a restart are run again."""
+        await self.queue.release(self.name)
+        while True:
+            await self._relay_callbacks()
+            while len(self._running) < self.concurrency and (
+                job := await self.queue.claim(self.name)
+            ):
+                self._claimed(job)
+            await asyncio.sleep(self.poll_s)
+
+
+async def main() -> NoReturn:
+    """Start a worker."""
+    setup_logging()
+    if not Settings.JOB_QUEUE_PATH:
+        msg = "JOB_QUEUE_PATH must be set to run workers"
+        raise SystemExit(msg)
+
+    services = await bootstrap()
+    name = (
+        Settings.WORKER_NAME or f"{socket.gethostname()}:{Settings.WORKER_SESSION_FILE}"
+    )
+    client = TelegramClient(
+        Settings.WORKER_SESSION_FILE,
+        Settings.API_ID,
+        Settings.API_HASH.get_secret_value(),
+    )
+    await client.start()  # pyright:  ignore[reportGeneralTypeIssues]
+    queue = await asyncio.to_thread(SqliteJobQueue, Settings.JOB_QUEUE_PATH)
+    worker = Worker(
+        name,
+        client,
+        queue,
+        services,
+        Settings.WORKER_CONCURRENCY,
+        Settings.JOB_QUEUE_POLL_S,
+    )
+    await worker.run()
+
+
+if __name__ == "__main__":
+    uvloop.run(main())
@@ -0,0 +1,28 @@
+from transcription_bot.audio.chunks import plan_chunks, plan_cuts
+
+
+def test_short_recording_not_cut():
+    assert plan_cuts(900, [], chunk_s=600) == []
+
+
+def test_cut_at_longest_nearby_silence():
+    silences = [(560, 561), (590, 600), (800, 820)]
+    assert plan_cuts(1000, silences, chunk_s=600) == [595]
+
+
+def test_cut_at_target_without_silence():
+    assert plan_cuts(2000, [], chunk_s=600) == [600, 1200]
+
+
+def test_plan_chunks_overlap_neighbours():
+    chunks = plan_chunks(2000, [], chunk_s=600, overlap_s=30)
+    assert [(c.core_start, c.core_end) for c in chunks] == [
+        (0, 600),
+        (600, 1200),
+        (1200, 2000),
+    ]
+    assert [(c.start, c.end) for c in chunks] == [
+        (0, 615),
+        (585, 1215),
+        (1185, 2000),
+    ]
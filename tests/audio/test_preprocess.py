@@ -0,0 +1,28 @@
+from transcription_bot.audio.preprocess import has_video_stream, should_extract_audio
+
+_AUDIO_STREAM = {"codec_type": "audio"}
+_VIDEO_STREAM = {"codec_type": "video", "disposition": {"attached_pic": 0}}
+_COVER_ART_STREAM = {"codec_type": "video", "disposition": {"attached_pic": 1}}
+
+
+def test_video_stream_detected():
+    assert has_video_stream({"streams": [_VIDEO_STREAM, _AUDIO_STREAM]})
+
+
+def test_cover_art_is_not_video():
+    assert not has_video_stream({"streams": [_AUDIO_STREAM, _COVER_ART_STREAM]})
+
+
+def test_small_video_is_extracted():
+    probe = {"streams": [_VIDEO_STREAM, _AUDIO_STREAM]}
+    assert should_extract_audio(probe, size=1000, min_bytes=10_000)
+
+
+def test_small_audio_is_skipped():
+    probe = {"streams": [_AUDIO_STREAM]}
+    assert not should_extract_audio(probe, size=1000, min_bytes=10_000)
+
+
+def test_large_audio_is_extracted():
+    probe = {"streams": [_AUDIO_STREAM]}
+    assert should_extract_audio(probe, size=20_000, min_bytes=10_000)
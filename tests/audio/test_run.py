@@ -0,0 +1,30 @@
+import asyncio
+import sys
+
+import ffmpeg
+import pytest
+from transcription_bot.audio import run
+
+
+async def test_failure_raises_ffmpeg_error():
+    with pytest.raises(ffmpeg.Error) as exc_info:
+        await run._communicate(
+            [sys.executable, "-c", "import sys; sys.stderr.write('bad'); sys.exit(1)"]
+        )
+    assert exc_info.value.stderr == b"bad"
+
+
+async def test_missing_binary_raises_file_not_found():
+    with pytest.raises(FileNotFoundError):
+        await run._communicate(["no-such-ffmpeg-binary"])
+
+
+async def test_cancel_kills_process():
+    task = asyncio.create_task(
+        run._communicate([sys.executable, "-c", "import time; time.sleep(30)"])
+    )
+    await asyncio.sleep(0.2)
+    task.cancel()
+    async with asyncio.timeout(5):
+        with pytest.raises(asyncio.CancelledError):
+            await task
@@ -0,0 +1,64 @@
+import pytest
+from transcription_bot.audio.vad import (
+    OffsetMap,
+    parse_silencedetect,
+    select_filter_expr,
+    speech_intervals,
+)
+
+_STDERR = """
+[silencedetect @ 0x5581] silence_start: 0
+[silencedetect @ 0x5581] silence_end: 3.5 | silence_duration: 3.5
+size=N/A time=00:00:10.00 bitrate=N/A speed= 500x
+[silencedetect @ 0x5581] silence_start: 10.25
+[silencedetect @ 0x5581] silence_end: 20 | silence_duration: 9.75
+[silencedetect @ 0x5581] silence_start: 55.5
+"""
+
+
+def test_parse_silencedetect():
+    assert parse_silencedetect(_STDERR, duration=60) == [
+        (0, 3.5),
+        (10.25, 20),
+        (55.5, 60),
+    ]
+
+
+def test_speech_intervals_keeps_padding_around_speech():
+    silences = [(0, 3.5), (10.25, 20), (55.5, 60)]
+    assert speech_intervals(silences, duration=60, keep_silence_s=0.5) == [
+        (3.25, 10.5),
+        (19.75, 55.75),
+    ]
+
+
+def test_speech_intervals_short_silences_kept():
+    assert speech_intervals([(5, 5.2)], duration=10, keep_silence_s=0.5) == [(0, 10)]
+
+
+def test_offset_map_to_original():
+    offset_map = OffsetMap([(3, 10), (20, 50)])
+    assert offset_map.trimmed_duration == 37
+    assert offset_map.to_original(0) == 3
+    assert offset_map.to_original(5) == 8
+    assert offset_map.to_original(7) == 20
+    assert offset_map.to_original(10) == 23
+    # Timestamps past the end are clamped
+    assert offset_map.to_original(100) == 50
+
+
+def test_offset_map_empty_is_identity():
+    assert OffsetMap([]).to_original(12.5) == 12.5
+
+
+def test_select_filter_expr():
+    assert (
+        select_filter_expr([(0, 1.5), (2, 3)])
+        == "between(t,0.000,1.500)+between(t,2.000,3.000)"
+    )
+
+
+@pytest.mark.parametrize("t", [0, 1, 6.9, 7, 36.9])
+def test_offset_map_is_monotonic(t: float):
+    offset_map = OffsetMap([(3, 10), (20, 50)])
+    assert offset_map.to_original(t) <= offset_map.to_original(t + 0.1)
@@ -0,0 +1,127 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from transcription_bot.audio.chunks import Chunk
+from transcription_bot.audio.vad import OffsetMap
+from transcription_bot.cache.jobs import JobStore
+from transcription_bot.transcribers.chunked import UploadedChunk
+
+
+@pytest.fixture()
+def store(tmp_path: Path) -> JobStore:
+    return JobStore(tmp_path / "jobs.sqlite3")
+
+
+async def test_saves_job_through_its_stages(store: JobStore):
+    chunks = [
+        UploadedChunk("http://chunk0", Chunk(0, 110, 0, 100)),
+        UploadedChunk("http://chunk1", Chunk(90, 200, 100, 200)),
+    ]
+    await store.add(1, 2, 3, "document:4")
+    [job] = await store.unfinished()
+    assert (job.stage, job.cache_key, job.url) == ("download", "document:4", None)
+
+    assert job.backend == "thomasmol"
+
+    await store.set_uploaded(
+        1,
+        2,
+        "recording",
+        "http://file",
+        OffsetMap([(0, 10), (20, 30)]),
+        chunks,
+        "fast_whisper",
+    )
+    await store.set_prediction(1, 2, 1, "p1")
+    await store.add_hedge(1, 2, "h1")
+    [job] = await store.unfinished()
+    assert (job.stage, job.backend) == ("transcription", "fast_whisper")
+    assert job.hedges == ["h1"]
+    assert (job.filename, job.url) == ("recording", "http://file")
+    assert job.offset_map == OffsetMap([(0, 10), (20, 30)])
+    assert job.chunks == chunks
+    assert job.predictions == [None, "p1"]
+
+    await store.set_transcript(1, 2, "transcript")
+    [job] = await store.unfinished()
+    assert (job.stage, job.transcript) == ("minutes", "transcript")
+
+
+async def test_gets_job_of_message(store: JobStore):
+    await store.add(1, 2, 3, "document:4")
+    await store.add(1, 5, 6, None)
+
+    job = await store.get(1, 5)
+    assert job
+    assert (job.message_id, job.reply_msg_id) == (5, 6)
+    assert await store.get(1, 7) is None
+
+
+async def test_attached_job_follows_its_owner(store: JobStore):
+    await store.add(1, 2, 3, "document:4")
+    await store.set_uploaded(1, 2, "recording", "http://file", None, [])
+    await store.set_prediction(1, 2, 0, "p1")
+    # Joins while the owner is transcribing
+    await store.add(5, 6, 7, "document:4")
+    await store.attach(5, 6, (1, 2))
+    owner, joiner = await store.unfinished()
+    assert (joiner.stage, joiner.url, joiner.predictions) == (
+        "transcription",
+        "http://file",
+        ["p1"],
+    )
+
+    # Later progress of the owner is copied
+    await store.set_uploaded(1, 2, "recording", "http://other", None, [])
+    await store.set_prediction(1, 2, 0, "p2")
+    owner, joiner = await store.unfinished()
+    assert (joiner.url, joiner.predictions) == ("http://other", ["p2"])
+
+    # Each delivers its own transcript
+    await store.set_transcript(1, 2, "transcript")
+    owner, joiner = await store.unfinished()
+    assert (owner.stage, joiner.stage) == ("minutes", "transcription")
+
+
+async def test_attach_to_finished_owner_is_ignored(store: JobStore):
+    await store.add(5, 6, 7, "document:4")
+    await store.attach(5, 6, (1, 2))
+    [job] = await store.unfinished()
+    assert job.stage == "download"
+
+
+async def test_track_forgets_finished_and_failed_jobs(store: JobStore):
+    await store.add(1, 1, 2, None)
+    await store.add(1, 3, 4, None)
+
+    async with store.track(1, 1):
+        pass
+
+    async def fail() -> None:
+        async with store.track(1, 3):
+            msg = "failed"
+            raise ValueError(msg)
+
+    with pytest.raises(ValueError, match="failed"):
+        await fail()
+
+    assert await store.unfinished() == []
+
+
+async def test_track_keeps_cancelled_jobs(store: JobStore):
+    await store.add(1, 1, 2, None)
+    started = asyncio.Event()
+
+    async def job() -> None:
+        async with store.track(1, 1):
+            started.set()
+            await asyncio.Event().wait()
+
+    task = asyncio.create_task(job())
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert [job.message_id for job in await store.unfinished()] == [1]
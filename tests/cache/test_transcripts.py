@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+from transcription_bot.cache import sqlite
+from transcription_bot.cache.transcripts import CachedTranscript, TranscriptCache
+
+
+@pytest.fixture()
+def cache(tmp_path: Path) -> TranscriptCache:
+    return TranscriptCache(tmp_path / "cache.sqlite3", ttl_s=100, max_entries=2)
+
+
+async def test_roundtrip(cache: TranscriptCache):
+    assert await cache.get("a") is None
+
+    await cache.put("a", "transcript", {"segments": [{"text": "hi"}]})
+    assert await cache.get("a") == CachedTranscript(
+        "transcript", {"segments": [{"text": "hi"}]}
+    )
+
+
+async def test_expired(cache: TranscriptCache, monkeypatch: pytest.MonkeyPatch):
+    now = 1000.0
+    monkeypatch.setattr(sqlite.time, "time", lambda: now)
+    await cache.put("a", "transcript", None)
+
+    now += 99
+    assert await cache.get("a")
+    now += 2
+    assert await cache.get("a") is None
+
+
+async def test_evicts_least_recently_used(
+    cache: TranscriptCache, monkeypatch: pytest.MonkeyPatch
+):
+    now = 1000.0
+    monkeypatch.setattr(sqlite.time, "time", lambda: now)
+    await cache.put("a", "a", None)
+    now += 1
+    await cache.put("b", "b", None)
+    now += 1
+    assert await cache.get("a")
+    now += 1
+    await cache.put("c", "c", None)
+
+    assert await cache.get("a")
+    assert await cache.get("b") is None
+    assert await cache.get("c")
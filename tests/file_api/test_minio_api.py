@@ -1,10 +1,16 @@
+import asyncio
 import json
 import time
 from functools import partial
 from pathlib import Path
 
 import pytest
-from transcription_bot.file_api.minio_api import FileApi
+from transcription_bot.file_api.minio_api import (
+    FileApi,
+    StreamAbortedError,
+    _LoopProgress,
+    _StreamReader,
+)
 from transcription_bot.file_api.policy import Policy
 from transcription_bot.settings import Settings
 
@@ -53,8 +59,96 @@ def test_policy_replaced_correctly():
     ) != json.dumps(Policy.public_read_only())
 
 
-def test_minio_upload(client: FileApi, test_file_path: Path):
+async def test_minio_upload(client: FileApi, test_file_path: Path):
     object_name = "my-test-file"
-    client.upload_file(test_file_path, object_name)
+    await client.upload_file(test_file_path, object_name)
     assert client.client.get_object(client.bucket_name, object_name)
     client.client.remove_object(client.bucket_name, object_name)
+
+
+async def test_minio_upload_reports_progress(client: FileApi, test_file_path: Path):
+    object_name = "my-test-file-progress"
+    updates = []
+
+    async def progress_cb(transferred: int, total: int):
+        updates.append((transferred, total))
+
+    await client.upload_file(test_file_path, object_name, progress_cb=progress_cb)
+    await asyncio.sleep(0.1)  # Let scheduled callbacks run
+    size = test_file_path.stat().st_size
+    assert updates[-1] == (size, size)
+    await client.delete(object_name)
+
+
+async def test_minio_exists_and_delete(client: FileApi, test_file_path: Path):
+    object_name = "my-test-file-exists"
+    assert not await client.exists(object_name)
+    await client.upload_file(test_file_path, object_name)
+    assert await client.exists(object_name)
+    await client.delete(object_name)
+    assert not await client.exists(object_name)
+
+
+async def test_minio_download(client: FileApi, test_file_path: Path, tmp_path: Path):
+    object_name = "my-test-file-download"
+    await client.upload_file(test_file_path, object_name)
+    destination = tmp_path / "downloaded"
+    await client.download_file(object_name, destination)
+    assert destination.read_text() == test_file_path.read_text()
+    await client.delete(object_name)
+
+
+async def test_minio_upload_stream(client: FileApi):
+    object_name = "my-test-file-stream"
+    # Larger than one part, to exercise the multipart upload
+    chunk = b"x" * (1024 * 1024)
+    n_chunks = 12
+
+    async def chunks():
+        for _ in range(n_chunks):
+            yield chunk
+
+    await client.upload_stream(chunks(), object_name, length=len(chunk) * n_chunks)
+    stat = client.client.stat_object(client.bucket_name, object_name)
+    assert stat.size == len(chunk) * n_chunks
+    await client.delete(object_name)
+
+
+async def test_stream_reader_reads_across_chunks():
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=2)
+    reader = _StreamReader(loop, queue)
+
+    async def feed():
+        for chunk in (b"abc", b"de", b"fgh"):
+            await queue.put(chunk)
+        await queue.put(None)
+
+    feeder = asyncio.create_task(feed())
+    parts = [await asyncio.to_thread(reader.read, 4) for _ in range(3)]
+    await feeder
+    assert parts == [b"abcd", b"efgh", b""]
+
+
+async def test_stream_reader_raises_on_abort():
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=2)
+    reader = _StreamReader(loop, queue)
+    await queue.put(b"abc")
+    await queue.put(ValueError())
+
+    with pytest.raises(StreamAbortedError):
+        await asyncio.to_thread(reader.read, 4)
+
+
+async def test_loop_progress_logs_callback_errors(caplog: pytest.LogCaptureFixture):
+    async def progress_cb(current: int, total: int) -> None:
+        msg = f"{current}/{total}"
+        raise RuntimeError(msg)
+
+    progress = _LoopProgress(asyncio.get_running_loop(), progress_cb, total=10)
+    await asyncio.to_thread(progress.update, 4)
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert "Progress callback failed" in caplog.text
+    assert "4/10" in caplog.text
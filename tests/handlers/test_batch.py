@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+from transcription_bot.audio.concat import part_offsets
+from transcription_bot.handlers.batch import VoiceBatcher, split_segments
+from transcription_bot.transcribers.replicate.thomasmol import Segment, Word
+
+
+def _message(chat_id: int, message_id: int) -> SimpleNamespace:
+    return SimpleNamespace(chat_id=chat_id, id=message_id)
+
+
+def _segment(*words: tuple[float, float, str]) -> Segment:
+    return Segment(
+        avg_logprob=-0.1,
+        start=words[0][0],
+        end=words[-1][1],
+        speaker="SPEAKER_00",
+        text=" ".join(w for _, _, w in words),
+        words=[
+            Word(start=s, end=e, probability=0.9, word=f" {w}") for s, e, w in words
+        ],
+    )
+
+
+async def test_batches_messages_within_window():
+    batcher = VoiceBatcher(window_s=0.1, max_messages=10)
+    first = asyncio.create_task(batcher.join(_message(1, 1)))  # type: ignore[arg-type]
+    await asyncio.sleep(0.05)
+    second = asyncio.create_task(batcher.join(_message(1, 2)))  # type: ignore[arg-type]
+    other_chat = asyncio.create_task(batcher.join(_message(2, 3)))  # type: ignore[arg-type]
+    await asyncio.sleep(0.07)
+    # The window restarts with each message
+    assert not first.done()
+
+    batch = await first
+    assert await second is batch
+    assert [m.id for m in batch.messages] == [1, 2]
+    assert [m.id for m in (await other_chat).messages] == [3]
+
+    later = await batcher.join(_message(1, 4))  # type: ignore[arg-type]
+    assert later is not batch
+
+
+async def test_full_batch_closes_at_once():
+    batcher = VoiceBatcher(window_s=10, max_messages=2)
+    batches = await asyncio.wait_for(
+        asyncio.gather(
+            batcher.join(_message(1, 1)),  # type: ignore[arg-type]
+            batcher.join(_message(1, 2)),  # type: ignore[arg-type]
+        ),
+        1,
+    )
+    assert batches[0] is batches[1]
+
+
+def test_part_offsets():
+    assert part_offsets([5, 2.5, 4], gap_s=3) == [0, 8, 13.5]
+
+
+def test_split_segments_by_word():
+    offsets = part_offsets([5, 2.5], gap_s=3)
+    segments = [
+        _segment((0, 1, "Hello"), (1, 2, "there.")),
+        # Grouped across the gap into one segment
+        _segment((4, 5, "Bye."), (8.5, 9, "Second"), (9, 10, "message.")),
+    ]
+    assert split_segments(segments, offsets) == [
+        "Hello there. Bye.",
+        "Second message.",
+    ]
+
+
+def test_split_segments_without_words():
+    segment = _segment((9, 10, "Hi."))
+    segment = segment.model_copy(update={"words": []})
+    assert split_segments([segment], [0, 8, 20]) == ["", "Hi.", ""]
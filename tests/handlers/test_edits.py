@@ -0,0 +1,142 @@
+import asyncio
+from collections.abc import AsyncIterator
+from itertools import pairwise
+from typing import Any
+
+import pytest
+from telethon import errors
+from transcription_bot.handlers import edits as edits_module
+from transcription_bot.handlers.edits import (
+    EditScheduler,
+    ScheduledMessage,
+    TokenBucket,
+)
+
+
+class FakeMessage:
+    def __init__(self, chat_id: int, message_id: int) -> None:
+        self.chat_id = chat_id
+        self.id = message_id
+        self.edits: list[tuple[float, str]] = []
+        self.flood_wait_s = 0
+
+    async def edit(self, text: str, **_: Any) -> None:
+        if self.flood_wait_s:
+            seconds, self.flood_wait_s = self.flood_wait_s, 0
+            raise errors.FloodWaitError(request=None, capture=seconds)
+        self.edits.append((asyncio.get_running_loop().time(), text))
+
+    @property
+    def texts(self) -> list[str]:
+        return [text for _, text in self.edits]
+
+
+@pytest.fixture()
+async def edits() -> AsyncIterator[EditScheduler]:
+    edits = EditScheduler(rate_per_s=100, chat_rate_per_s=10, chat_burst=1)
+    edits.start()
+    yield edits
+    await edits.close()
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2)
+    bucket.take(0)
+    bucket.take(0)
+    assert bucket.wait_time(0) == 0.5
+    assert bucket.wait_time(0.5) == 0
+    bucket.take(0.5)
+    assert bucket.wait_time(0.5) == 0.5
+
+
+async def test_keeps_only_latest_pending_text(edits: EditScheduler):
+    message = FakeMessage(1, 1)
+    edits.edit(message, "0")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.01)
+    # Coalesced while the chat is rate limited
+    for i in range(1, 10):
+        edits.edit(message, f"{i}")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.3)
+    assert message.texts == ["0", "9"]
+
+
+async def test_discards_pending_edit(edits: EditScheduler):
+    message = FakeMessage(1, 1)
+    edits.edit(message, "0")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.01)
+    edits.edit(message, "1")  # pyright: ignore[reportArgumentType]
+    edits.discard(message)  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.3)
+    assert message.texts == ["0"]
+
+
+async def test_skips_unchanged_text(edits: EditScheduler):
+    message = FakeMessage(1, 1)
+    edits.edit(message, "a")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.15)
+    edits.edit(message, "a")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.15)
+    assert message.texts == ["a"]
+
+
+async def test_rate_limits_each_chat(edits: EditScheduler):
+    same_chat = [FakeMessage(1, i) for i in range(3)]
+    other_chat = FakeMessage(2, 1)
+    for message in [*same_chat, other_chat]:
+        edits.edit(message, "a")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.35)
+
+    times = sorted(t for message in same_chat for t, _ in message.edits)
+    assert len(times) == 3
+    assert all(b - a >= 0.09 for a, b in pairwise(times))
+    # Other chats are not held up
+    assert other_chat.edits[0][0] - times[0] < 0.05
+
+
+async def test_defers_on_flood_wait(edits: EditScheduler):
+    message = FakeMessage(1, 1)
+    message.flood_wait_s = 1
+    start = asyncio.get_running_loop().time()
+    edits.edit(message, "a")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.5)
+    assert message.texts == []
+
+    await asyncio.sleep(0.7)
+    assert message.texts == ["a"]
+    assert message.edits[0][0] - start >= 1
+
+
+async def test_forgets_idle_chats(
+    edits: EditScheduler, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(edits_module, "_MAX_CHATS", 2)
+    for chat_id in range(5):
+        edits.edit(FakeMessage(chat_id, 1), "a")  # pyright: ignore[reportArgumentType]
+        await asyncio.sleep(0.15)
+    assert len(edits._chats) <= 2
+
+
+async def test_scheduled_message(edits: EditScheduler):
+    message = FakeMessage(1, 1)
+    message.text = "Processing..."  # pyright: ignore[reportAttributeAccessIssue]
+    scheduled = ScheduledMessage(message, edits)  # pyright: ignore[reportArgumentType]
+    assert scheduled.text == "Processing..."
+    await scheduled.edit("a")
+    assert scheduled.text == "a"
+    await asyncio.sleep(0.05)
+    assert message.texts == ["a"]
+
+
+async def test_flush_waits_for_pending_edit(edits: EditScheduler):
+    first, second = FakeMessage(1, 1), FakeMessage(1, 2)
+    edits.edit(first, "a")  # pyright: ignore[reportArgumentType]
+    # Held back by the chat's rate limit
+    edits.edit(second, "b")  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.01)
+    assert second.texts == []
+
+    async with asyncio.timeout(1):
+        await edits.flush(second)  # pyright: ignore[reportArgumentType]
+    assert second.texts == ["b"]
+    # Returns at once if nothing is pending
+    await edits.flush(second)  # pyright: ignore[reportArgumentType]
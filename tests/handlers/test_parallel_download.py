@@ -0,0 +1,94 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator
+from pathlib import Path
+from types import SimpleNamespace
+from typing import cast
+
+import pytest
+from telethon import TelegramClient
+from telethon.types import Document
+from transcription_bot.handlers.parallel_download import (
+    PART_SIZE,
+    download_parallel,
+    split_parts,
+)
+
+
+def test_split_parts_covers_all_parts():
+    size = 10 * PART_SIZE + 1
+    ranges = split_parts(size, 4)
+    parts = [part for r in ranges for part in r]
+    assert parts == list(range(11))
+    assert len(ranges) == 4
+
+
+def test_split_parts_fewer_parts_than_connections():
+    ranges = split_parts(PART_SIZE * 2, 8)
+    assert ranges == [range(1), range(1, 2)]
+
+
+def test_split_parts_single_connection():
+    assert split_parts(PART_SIZE * 3, 1) == [range(3)]
+
+
+class FakeClient:
+    """Serves `data` from `iter_download`. Fails requests at offset `fail_at`."""
+
+    def __init__(self, data: bytes, fail_at: int | None = None) -> None:
+        self.data = data
+        self.fail_at = fail_at
+
+    async def iter_download(
+        self,
+        _: object,
+        *,
+        offset: int,
+        limit: int,
+        request_size: int,
+        file_size: int,
+    ) -> AsyncIterator[bytes]:
+        assert file_size == len(self.data)
+        for i in range(limit):
+            start = offset + i * request_size
+            if start == self.fail_at:
+                msg = "Connection lost"
+                raise ConnectionError(msg)
+            await asyncio.sleep(0)
+            yield self.data[start : start + request_size]
+
+
+def _document(size: int) -> Document:
+    return cast(Document, SimpleNamespace(size=size))
+
+
+async def test_download_parallel_writes_every_range(tmp_path: Path):
+    data = os.urandom(5 * PART_SIZE + 123)
+    progress: list[tuple[int, int]] = []
+
+    async def on_progress(received: int, total: int) -> None:
+        progress.append((received, total))
+
+    path = await download_parallel(
+        cast(TelegramClient, FakeClient(data)),
+        _document(len(data)),
+        tmp_path / "file",
+        4,
+        on_progress,
+    )
+    assert path.read_bytes() == data
+    assert progress[-1] == (len(data), len(data))
+    assert len(progress) == 6
+
+
+async def test_download_parallel_deletes_partial_file(tmp_path: Path):
+    data = os.urandom(4 * PART_SIZE)
+    client = FakeClient(data, fail_at=3 * PART_SIZE)
+    with pytest.raises(ExceptionGroup):
+        await download_parallel(
+            cast(TelegramClient, client),
+            _document(len(data)),
+            tmp_path / "file",
+            2,
+        )
+    assert not (tmp_path / "file").exists()
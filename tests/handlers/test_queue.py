@@ -0,0 +1,161 @@
+import asyncio
+from typing import Any
+
+from transcription_bot.handlers.queue import FairStage, queued
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_limits_concurrency():
+    stage = FairStage("transcription", concurrency=2)
+    running = peak = 0
+
+    async def job() -> None:
+        nonlocal running, peak
+        async with stage.slot(sender=1):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(job() for _ in range(5)))
+
+    assert peak == 2
+    assert stage.waiting == 0
+
+
+async def test_admits_round_robin_across_senders():
+    stage = FairStage("download", concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    async def job(sender: int, name: str) -> None:
+        async with stage.slot(sender):
+            order.append(name)
+            await release.wait()
+
+    tasks = [asyncio.create_task(job(1, "a0"))]
+    await _settle()
+    tasks += [asyncio.create_task(job(1, f"a{i}")) for i in range(1, 4)]
+    await _settle()
+    tasks += [asyncio.create_task(job(2, f"b{i}")) for i in range(2)]
+    await _settle()
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert order == ["a0", "a1", "b0", "a2", "b1", "a3"]
+
+
+async def test_reports_positions_as_queue_drains():
+    stage = FairStage("download", concurrency=1)
+    releases = [asyncio.Event() for _ in range(3)]
+    positions: dict[int, list[int]] = {1: [], 2: []}
+
+    async def job(i: int) -> None:
+        async def on_position(position: int) -> None:
+            positions[i].append(position)
+
+        async with stage.slot(sender=i, on_position=on_position):
+            await releases[i].wait()
+
+    tasks = []
+    for i in range(3):
+        tasks.append(asyncio.create_task(job(i)))
+        await _settle()
+
+    assert positions == {1: [1], 2: [2]}
+    for release in releases:
+        release.set()
+        await _settle()
+    await asyncio.gather(*tasks)
+
+    assert positions == {1: [1], 2: [2, 1]}
+
+
+async def test_cancelled_waiter_leaves_queue():
+    stage = FairStage("download", concurrency=1)
+    release = asyncio.Event()
+    admitted = []
+
+    async def job(sender: int) -> None:
+        async with stage.slot(sender):
+            admitted.append(sender)
+            await release.wait()
+
+    first = asyncio.create_task(job(1))
+    await _settle()
+    cancelled = asyncio.create_task(job(2))
+    last = asyncio.create_task(job(3))
+    await _settle()
+    assert stage.waiting == 2
+
+    cancelled.cancel()
+    await _settle()
+    assert stage.waiting == 1
+
+    release.set()
+    await asyncio.gather(first, last)
+    assert admitted == [1, 3]
+
+
+async def test_waiter_cancelled_as_slot_is_released():
+    stage = FairStage("download", concurrency=1)
+    hold = asyncio.Event()
+    admitted = []
+
+    async def job(sender: int) -> None:
+        async with stage.slot(sender):
+            admitted.append(sender)
+            await hold.wait()
+
+    a = asyncio.create_task(job(1))
+    await _settle()
+    b = asyncio.create_task(job(2))
+    c = asyncio.create_task(job(3))
+    await _settle()
+
+    # a releases its slot before b's task runs to leave the queue
+    hold.set()
+    b.cancel()
+    await asyncio.gather(a, c)
+    assert b.cancelled()
+    assert admitted == [1, 3]
+    assert stage.waiting == 0
+
+
+class FakeMessage:
+    def __init__(self, text: str, sender_id: int = 1) -> None:
+        self.text = text
+        self.sender_id = sender_id
+        self.edits: list[str] = []
+
+    async def edit(self, text: str, **_: Any) -> None:
+        self.text = text
+        self.edits.append(text)
+
+
+async def test_queued_shows_position_then_restores_text():
+    stage = FairStage("transcription", concurrency=1)
+    release = asyncio.Event()
+    first, second = FakeMessage("Transcribing..."), FakeMessage("Transcribing...", 2)
+
+    async def job(msg: FakeMessage) -> None:
+        async with queued(stage, msg, msg):  # type: ignore[arg-type]
+            await release.wait()
+
+    tasks = [asyncio.create_task(job(first))]
+    await _settle()
+    tasks.append(asyncio.create_task(job(second)))
+    await _settle()
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert first.edits == []
+    assert second.edits == [
+        "Transcribing...\nPosition 1 in queue for transcription...",
+        "Transcribing...",
+    ]
@@ -0,0 +1,201 @@
+import asyncio
+import itertools
+from collections.abc import AsyncIterator, Callable
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from telethon.events import StopPropagation
+
+pytest.importorskip("python_utils")
+
+from transcription_bot.cache.jobs import JobStore  # noqa: E402
+from transcription_bot.cache.summaries import SummaryCache  # noqa: E402
+from transcription_bot.cache.transcripts import TranscriptCache  # noqa: E402
+from transcription_bot.handlers import main  # noqa: E402
+from transcription_bot.handlers.edits import EditScheduler  # noqa: E402
+from transcription_bot.handlers.queue import FairStage, Stages  # noqa: E402
+from transcription_bot.handlers.single_flight import SingleFlight  # noqa: E402
+from transcription_bot.services import Services  # noqa: E402
+from transcription_bot.transcribers.base import (  # noqa: E402
+    BaseTranscriber,
+    ResumableTranscriber,
+)
+from transcription_bot.transcribers.router import BackendRouter  # noqa: E402
+from transcription_bot.types import PredictionStatus  # noqa: E402
+
+_ids = itertools.count(100)
+
+
+class FakeMessage:
+    def __init__(self, chat_id: int, message_id: int, text: str = "") -> None:
+        self.chat_id = chat_id
+        self.id = message_id
+        self.text = text
+        self.sender_id = 1
+        # The bot's owner, who is not notified of their own jobs
+        self.sender = SimpleNamespace(username="me", first_name="Me")
+        self.replies: list[Any] = []
+        self.sent: list[FakeMessage] = []
+        self.deleted = False
+
+    async def edit(self, text: str, **_: Any) -> None:
+        self.text = text
+
+    async def reply(self, text: str = "", file: Any = None, **_: Any) -> "FakeMessage":
+        self.replies.append(file or text)
+        self.sent.append(FakeMessage(self.chat_id, next(_ids), text))
+        return self.sent[-1]
+
+    async def delete(self) -> None:
+        self.deleted = True
+
+
+class FakeTranscriber(ResumableTranscriber):
+    """Re-attaches to a prediction which finishes at once."""
+
+    def __init__(self) -> None:
+        self.attached: list[str] = []
+
+    @staticmethod
+    async def cancel(pred_id: str) -> None:
+        pass
+
+    @property
+    def raw_output(self) -> Any:
+        return None
+
+    async def get_result(self) -> tuple[str | None, PredictionStatus]:
+        return "SPEAKER_00: Hello.", "succeeded"
+
+    async def send_job(self, *_: Any, **__: Any) -> str:
+        msg = "Should re-attach instead of sending a new job"
+        raise AssertionError(msg)
+
+    async def attach(self, pred_id: str, *_: Any, **__: Any) -> None:
+        self.attached.append(pred_id)
+
+
+@pytest.fixture()
+async def services(tmp_path: Path) -> AsyncIterator[Services]:
+    edits = EditScheduler(rate_per_s=1000, chat_rate_per_s=1000)
+    edits.start()
+    yield Services(
+        file_api=None,  # pyright: ignore[reportArgumentType]
+        model_versions=None,  # pyright: ignore[reportArgumentType]
+        transcript_cache=TranscriptCache(tmp_path / "transcripts", 3600, 10),
+        summary_cache=SummaryCache(tmp_path / "summaries", 3600, 10),
+        job_store=JobStore(tmp_path / "jobs"),
+        openai=None,  # pyright: ignore[reportArgumentType]
+        edits=edits,
+        stages=Stages(*(FairStage(name, 1) for name in ("a", "b", "c", "d"))),
+        jobs=SingleFlight(edits),
+        router=BackendRouter(None),
+    )
+    await edits.close()
+
+
+async def _minutes(*_: Any) -> str:
+    return "Minutes."
+
+
+def _make_transcriber(
+    transcriber: FakeTranscriber,
+) -> Callable[..., BaseTranscriber]:
+    return lambda *_, **__: transcriber
+
+
+async def test_resumes_transcription_and_delivers(
+    services: Services, monkeypatch: pytest.MonkeyPatch
+):
+    transcriber = FakeTranscriber()
+    monkeypatch.setattr(Services, "make_transcriber", _make_transcriber(transcriber))
+    monkeypatch.setattr(main, "generate_summary", _minutes)
+
+    store = services.job_store
+    await store.add(1, 2, 3, "document:4")
+    await store.set_uploaded(1, 2, "recording", "http://file", None, [])
+    await store.set_prediction(1, 2, 0, "p1")
+    [stored] = await store.unfinished()
+
+    message, reply_msg = FakeMessage(1, 2), FakeMessage(1, 3, "Processing...")
+    await main.resume_job(message, reply_msg, stored, services)  # pyright: ignore[reportArgumentType]
+
+    assert transcriber.attached == ["p1"]
+    # Besides any preview of the minutes
+    files = [r.name for r in message.replies if not isinstance(r, str)]
+    assert files == [
+        "recording.txt",
+        "recording_minutes.txt",
+    ]
+    cached = await services.transcript_cache.get("document:4")
+    assert cached
+    assert cached.transcript == "SPEAKER_00: Hello."
+    assert await store.unfinished() == []
+
+
+async def test_asks_to_resend_file_not_uploaded(services: Services):
+    await services.job_store.add(1, 2, 3, "document:4")
+    [stored] = await services.job_store.unfinished()
+
+    message, reply_msg = FakeMessage(1, 2), FakeMessage(1, 3, "Processing...")
+    await main.resume_job(message, reply_msg, stored, services)  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.05)
+
+    assert "send it again" in reply_msg.text
+    assert await services.job_store.unfinished() == []
+
+
+async def test_failed_minutes_remove_preview(
+    services: Services, monkeypatch: pytest.MonkeyPatch
+):
+    errors: list[str] = []
+
+    async def no_minutes(*_: Any) -> None:
+        return None
+
+    async def notify_error(_: Any, err_msg: str, *__: Any) -> None:
+        errors.append(err_msg)
+
+    monkeypatch.setattr(main, "generate_summary", no_minutes)
+    monkeypatch.setattr(main, "notify_error", notify_error)
+    await services.job_store.add(1, 2, 3, "document:4")
+    await services.job_store.set_uploaded(1, 2, "recording", "http://file", None, [])
+    await services.job_store.set_transcript(1, 2, "SPEAKER_00: Hello.")
+    [stored] = await services.job_store.unfinished()
+
+    message, reply_msg = FakeMessage(1, 2), FakeMessage(1, 3, "Processing...")
+    with pytest.raises(StopPropagation):
+        await main.resume_job(message, reply_msg, stored, services)  # pyright: ignore[reportArgumentType]
+
+    assert errors == ["Failed to generate minutes!"]
+    [preview] = message.sent
+    assert preview.deleted
+
+
+async def test_failed_minutes_reported_after_transcript(
+    services: Services, monkeypatch: pytest.MonkeyPatch
+):
+    transcriber = FakeTranscriber()
+    monkeypatch.setattr(Services, "make_transcriber", _make_transcriber(transcriber))
+    message, reply_msg = FakeMessage(1, 2), FakeMessage(1, 3, "Processing...")
+
+    async def no_minutes(*_: Any) -> None:
+        return None
+
+    async def notify_error(*_: Any) -> None:
+        message.replies.append("error")
+
+    monkeypatch.setattr(main, "generate_summary", no_minutes)
+    monkeypatch.setattr(main, "notify_error", notify_error)
+    await services.job_store.add(1, 2, 3, "document:4")
+    await services.job_store.set_uploaded(1, 2, "recording", "http://file", None, [])
+    await services.job_store.set_prediction(1, 2, 0, "p1")
+    [stored] = await services.job_store.unfinished()
+
+    with pytest.raises(StopPropagation):
+        await main.resume_job(message, reply_msg, stored, services)  # pyright: ignore[reportArgumentType]
+
+    files = [r if isinstance(r, str) else r.name for r in message.replies]
+    assert files.index("recording.txt") < files.index("error")
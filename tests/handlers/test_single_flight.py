@@ -0,0 +1,155 @@
+import asyncio
+import itertools
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+from telethon.events import StopPropagation
+from transcription_bot.handlers import cancel
+from transcription_bot.handlers.edits import EditScheduler
+from transcription_bot.handlers.single_flight import SharedJob, SingleFlight
+
+_ids = itertools.count()
+
+
+class FakeMessage:
+    def __init__(self, text: str = "Processing...") -> None:
+        self.chat_id = next(_ids)
+        self.id = 1
+        self.text = text
+        self.buttons: list[Any] = []
+        self.deleted = False
+
+    async def edit(self, text: str, **_: Any) -> None:
+        self.text = text
+
+    async def reply(self, text: str, buttons: list[Any]) -> "FakeMessage":
+        self.buttons.extend(buttons)
+        return FakeMessage(text)
+
+    async def delete(self) -> None:
+        self.deleted = True
+
+
+@pytest.fixture()
+async def edits() -> AsyncIterator[EditScheduler]:
+    edits = EditScheduler(rate_per_s=1000, chat_rate_per_s=1000)
+    edits.start()
+    yield edits
+    await edits.close()
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _press_cancel(token: str) -> None:
+    await cancel._cancel_callbacks.pop(token)()
+
+
+async def test_identical_requests_share_one_job(edits: EditScheduler):
+    jobs = SingleFlight[str](edits)
+    release = asyncio.Event()
+    calls = 0
+
+    async def work(job: SharedJob[str]) -> str:
+        nonlocal calls
+        calls += 1
+        await job.edit("Downloading...")
+        await release.wait()
+        await job.edit("Done")
+        return "transcript"
+
+    first, second = FakeMessage(), FakeMessage()
+    results = asyncio.gather(
+        jobs.run("document:1", first, work),  # pyright: ignore[reportArgumentType]
+        jobs.run("document:1", second, work),  # pyright: ignore[reportArgumentType]
+    )
+    await _settle()
+    # The later subscriber is brought up to date
+    assert first.text == second.text == "Downloading..."
+    release.set()
+
+    assert await results == ["transcript", "transcript"]
+    assert calls == 1
+    await _settle()
+    assert first.text == second.text == "Done"
+
+
+async def test_joiner_told_the_owner(edits: EditScheduler):
+    jobs = SingleFlight[str](edits)
+    release = asyncio.Event()
+    joined = []
+
+    async def work(_: SharedJob[str]) -> str:
+        await release.wait()
+        return "transcript"
+
+    async def on_join(owner: tuple[int, int]) -> None:
+        joined.append(owner)
+
+    results = asyncio.gather(
+        jobs.run("document:1", FakeMessage(), work, (1, 2), on_join),  # pyright: ignore[reportArgumentType]
+        jobs.run("document:1", FakeMessage(), work, (3, 4), on_join),  # pyright: ignore[reportArgumentType]
+    )
+    await _settle()
+    release.set()
+    await results
+    assert joined == [(1, 2)]
+
+
+async def test_unkeyed_requests_are_not_shared(edits: EditScheduler):
+    jobs = SingleFlight[int](edits)
+    calls = 0
+
+    async def work(_: SharedJob[int]) -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return calls
+
+    await asyncio.gather(
+        jobs.run(None, FakeMessage(), work),  # pyright: ignore[reportArgumentType]
+        jobs.run(None, FakeMessage(), work),  # pyright: ignore[reportArgumentType]
+    )
+    assert calls == 2
+
+
+async def test_cancelled_only_when_every_subscriber_cancels(edits: EditScheduler):
+    jobs = SingleFlight[str](edits)
+    cancelled = asyncio.Event()
+
+    async def work(job: SharedJob[str]) -> str:
+        await job.show_cancel_button(_cancel)
+        await cancelled.wait()
+        await job.hide_cancel_button()
+        return "canceled"
+
+    async def _cancel() -> None:
+        cancelled.set()
+
+    first, second = FakeMessage(), FakeMessage()
+    first_result = asyncio.create_task(
+        jobs.run("document:1", first, work)  # pyright: ignore[reportArgumentType]
+    )
+    await _settle()
+    second_result = asyncio.create_task(
+        jobs.run("document:1", second, work)  # pyright: ignore[reportArgumentType]
+    )
+    await _settle()
+    assert first.buttons
+    assert second.buttons
+    # Registered in the order the buttons were shown
+    first_token, second_token = list(cancel._cancel_callbacks)[-2:]
+
+    await _press_cancel(first_token)
+    with pytest.raises(StopPropagation):
+        await first_result
+    assert not cancelled.is_set()
+    assert not second_result.done()
+
+    await _press_cancel(second_token)
+    assert cancelled.is_set()
+    with pytest.raises(StopPropagation):
+        await second_result
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import threading
+import time
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import pytest
+from openai import AsyncOpenAI
+from transcription_bot.cache.summaries import SummaryCache
+from transcription_bot.handlers.summary import (
+    estimate_tokens,
+    generate_summary,
+    split_transcript,
+)
+from transcription_bot.settings import Settings
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """
+    Answers chat completions after `delay_s`, with the number of the request.
+
+    Streamed completions send their first word at once, and the rest after `delay_s`.
+    Other completions are held while `release` is clear.
+    """
+
+    request_queue_size = 64
+
+    def __init__(self, delay_s: float) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeOpenAIHandler)
+        self.delay_s = delay_s
+        self.prompts: list[str] = []
+        self.running = 0
+        self.max_running = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server: FakeOpenAI
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.prompts.append(body["messages"][-1]["content"])
+            n = len(server.prompts)
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+        if body.get("stream"):
+            self._stream(f"summary {n} in words", server.delay_s)
+        else:
+            server.release.wait()
+            time.sleep(server.delay_s)
+            self._reply(body, f"summary {n}")
+        with server.lock:
+            server.running -= 1
+
+    def _stream(self, content: str, delay_s: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        first, *rest = content.split(" ")
+        for i, word in enumerate([first, *(f" {w}" for w in rest)]):
+            chunk = {
+                "id": "chatcmpl",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "model",
+                "choices": [{"index": 0, "delta": {"content": word}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            if i == 0:
+                time.sleep(delay_s)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _reply(self, body: dict[str, Any], text: str) -> None:
+        content = json.dumps(
+            {
+                "id": "chatcmpl",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *_: Any) -> None:
+        pass
+
+
+@pytest.fixture()
+def fake_openai() -> Iterator[FakeOpenAI]:
+    server = FakeOpenAI(delay_s=0.2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture()
+def client(fake_openai: FakeOpenAI) -> AsyncOpenAI:
+    return AsyncOpenAI(api_key="key", base_url=fake_openai.url)
+
+
+async def _wait_until(condition: Callable[[], bool]) -> None:
+    async with asyncio.timeout(5):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def _transcript(turns: int) -> str:
+    return "\n\n".join(
+        f"SPEAKER_0{i % 2}: " + " ".join(f"word{i}" for _ in range(20))
+        for i in range(turns)
+    )
+
+
+def test_split_transcript_along_turns():
+    transcript = _transcript(10)
+    turns = transcript.split("\n\n")
+
+    chunks = split_transcript(
+        transcript, max_tokens=estimate_tokens("\n\n".join(turns[:3]))
+    )
+
+    assert len(chunks) == 4
+    assert "\n\n".join(chunks) == transcript
+    assert all(chunk.split("\n\n")[0] in turns for chunk in chunks)
+
+
+def test_split_transcript_splits_long_turns_between_words():
+    transcript = "SPEAKER_00: " + " ".join(["word"] * 100)
+
+    chunks = split_transcript(transcript, max_tokens=25)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 25 for chunk in chunks)
+    assert " ".join(chunks) == transcript
+
+
+async def test_short_transcript_in_one_call(
+    client: AsyncOpenAI, fake_openai: FakeOpenAI
+):
+    assert await generate_summary(client, _transcript(3)) == "summary 1"
+    assert len(fake_openai.prompts) == 1
+
+
+async def test_long_transcript_is_mapped_then_reduced(
+    client: AsyncOpenAI, fake_openai: FakeOpenAI, monkeypatch: pytest.MonkeyPatch
+):
+    transcript = _transcript(40)
+    monkeypatch.setattr(
+        Settings, "SUMMARY_CHUNK_TOKENS", estimate_tokens(transcript) // 8
+    )
+    monkeypatch.setattr(Settings, "SUMMARY_CHUNK_CONCURRENCY", 10)
+    chunks = split_transcript(transcript, Settings.SUMMARY_CHUNK_TOKENS)
+    assert len(chunks) >= 8
+
+    fake_openai.release.clear()
+    task = asyncio.create_task(generate_summary(client, transcript))
+    # Chunks are summarized concurrently
+    await _wait_until(lambda: fake_openai.running == len(chunks))
+    fake_openai.release.set()
+    minutes = await task
+
+    *maps, reduce = fake_openai.prompts
+    assert len(maps) == len(chunks)
+    assert minutes == f"summary {len(maps) + 1}"
+    assert "Part 1:\nsummary" in reduce
+
+
+async def test_chunk_concurrency_is_capped(
+    client: AsyncOpenAI, fake_openai: FakeOpenAI, monkeypatch: pytest.MonkeyPatch
+):
+    transcript = _transcript(40)
+    monkeypatch.setattr(
+        Settings, "SUMMARY_CHUNK_TOKENS", estimate_tokens(transcript) // 8
+    )
+    monkeypatch.setattr(Settings, "SUMMARY_CHUNK_CONCURRENCY", 2)
+
+    fake_openai.release.clear()
+    task = asyncio.create_task(generate_summary(client, transcript))
+    await _wait_until(lambda: fake_openai.running == 2)
+    fake_openai.release.set()
+    await task
+
+    assert fake_openai.max_running == 2
+
+
+async def test_long_notes_are_combined_before_reduce(
+    client: AsyncOpenAI, fake_openai: FakeOpenAI, monkeypatch: pytest.MonkeyPatch
+):
+    fake_openai.delay_s = 0
+    transcript = _transcript(4)
+    # Room for a few notes per call
+    monkeypatch.setattr(Settings, "SUMMARY_CHUNK_TOKENS", 10)
+    monkeypatch.setattr(Settings, "SUMMARY_CHUNK_CONCURRENCY", 10)
+    chunks = split_transcript(transcript, Settings.SUMMARY_CHUNK_TOKENS)
+
+    minutes = await generate_summary(client, transcript)
+
+    prompts = fake_openai.prompts
+    combines = [p for p in prompts if "Combine them" in p]
+    assert len(prompts) == len(chunks) + len(combines) + 1
+    # Combined over several rounds, two notes at least at a time
+    assert len(chunks) // 3 < len(combines) < len(chunks)
+    assert all(p.count("Part ") >= 2 for p in combines)
+    assert "Write detailed minutes" in prompts[-1]
+    assert minutes == f"summary {len(prompts)}"
+
+
+async def test_streams_minutes(client: AsyncOpenAI, fake_openai: FakeOpenAI):
+    loop = asyncio.get_running_loop()
+    progress: list[tuple[float, str]] = []
+    start = loop.time()
+
+    minutes = await generate_summary(
+        client, _transcript(3), lambda text: progress.append((loop.time(), text))
+    )
+
+    assert minutes == "summary 1 in words"
+    assert [text for _, text in progress] == [
+        "summary",
+        "summary 1",
+        "summary 1 in",
+        "summary 1 in words",
+    ]
+    # The first words arrive long before the completion is done
+    assert progress[0][0] - start < fake_openai.delay_s / 2
+
+
+async def test_streams_progress_of_chunks_then_minutes(
+    client: AsyncOpenAI, fake_openai: FakeOpenAI, monkeypatch: pytest.MonkeyPatch
+):
+    transcript = _transcript(40)
+    monkeypatch.setattr(
+        Settings, "SUMMARY_CHUNK_TOKENS", estimate_tokens(transcript) // 2
+    )
+    progress: list[str] = []
+
+    minutes = await generate_summary(client, transcript, progress.append)
+
+    *maps, _ = fake_openai.prompts
+    assert progress[: len(maps)] == [
+        f"Summarized {i}/{len(maps)} parts of the meeting..."
+        for i in range(1, len(maps) + 1)
+    ]
+    assert progress[-1] == minutes
+
+
+async def test_minutes_are_cached(
+    client: AsyncOpenAI,
+    fake_openai: FakeOpenAI,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+):
+    cache = SummaryCache(tmp_path / "summaries.sqlite3", ttl_s=100, max_entries=10)
+    transcript = _transcript(3)
+
+    assert await generate_summary(client, transcript, cache=cache) == "summary 1"
+    assert await generate_summary(client, transcript, cache=cache) == "summary 1"
+    assert len(fake_openai.prompts) == 1
+
+    monkeypatch.setattr(Settings, "OPENAI_MODEL_NAME", "other-model")
+    assert await generate_summary(client, transcript, cache=cache) == "summary 2"
+
+
+async def test_chunk_size_only_keys_chunked_transcripts(
+    client: AsyncOpenAI,
+    fake_openai: FakeOpenAI,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+):
+    cache = SummaryCache(tmp_path / "summaries.sqlite3", ttl_s=100, max_entries=10)
+    transcript = _transcript(3)
+    await generate_summary(client, transcript, cache=cache)
+
+    # Still fits in one chunk
+    monkeypatch.setattr(
+        Settings, "SUMMARY_CHUNK_TOKENS", Settings.SUMMARY_CHUNK_TOKENS // 2
+    )
+    assert await generate_summary(client, transcript, cache=cache) == "summary 1"
+    assert len(fake_openai.prompts) == 1
@@ -0,0 +1,153 @@
+import datetime
+import json
+import threading
+import time
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import httpx
+import pytest
+import replicate
+from replicate.version import Version
+from transcription_bot.transcribers.replicate import base
+from transcription_bot.transcribers.replicate.thomasmol import ThomasmolTranscriber
+
+OUTPUT = {
+    "language": "en",
+    "num_speakers": 1,
+    "segments": [
+        {
+            "avg_logprob": -0.1,
+            "start": 0,
+            "end": 1,
+            "speaker": "SPEAKER_00",
+            "text": "Hello.",
+            "words": [],
+        }
+    ],
+}
+
+
+def prediction_json(pred_id: str, status: str, **kwargs: Any) -> dict[str, Any]:
+    return {
+        "id": pred_id,
+        "model": ThomasmolTranscriber.MODEL_NAME,
+        "version": "version",
+        "status": status,
+        "input": {},
+        "output": None,
+        "logs": "",
+        "error": None,
+        "metrics": None,
+        "created_at": None,
+        "started_at": None,
+        "completed_at": None,
+        "urls": {},
+    } | kwargs
+
+
+class FakeReplicate(ThreadingHTTPServer):
+    """
+    Serves Replicate's predictions API.
+
+    Predictions of version `cold` stay starting until cancelled. Others start processing after `run_s`, and succeed `run_s` later.
+    Their updates are sent to their webhook, signed by `sign`, unless `send_webhooks` is False.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeReplicateHandler)
+        self.run_s = 0.05
+        self.send_webhooks = True
+        self.sign: Callable[[str], dict[str, str]] = lambda _: {}
+        self.predictions: dict[str, dict[str, Any]] = {}
+        self.created: list[dict[str, Any]] = []
+        """Bodies of the requests which created predictions."""
+        self.cancelled: list[str] = []
+        self.polls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def create(self, version: str, webhook: str | None = None) -> dict[str, Any]:
+        """Create a prediction, and start running it."""
+        with self._lock:
+            pred_id = f"p{len(self.predictions) + 1}"
+            self.predictions[pred_id] = prediction_json(
+                pred_id, "starting", version=version
+            )
+        threading.Thread(target=self._run, args=(pred_id, webhook)).start()
+        return self.predictions[pred_id]
+
+    def _run(self, pred_id: str, webhook: str | None) -> None:
+        if self.predictions[pred_id]["version"] == "cold":
+            return
+        for update in (
+            {"status": "processing", "logs": "Transcribing..."},
+            {"status": "succeeded", "logs": "Transcribing...\nDone", "output": OUTPUT},
+        ):
+            time.sleep(self.run_s)
+            with self._lock:
+                prediction = self.predictions[pred_id]
+                if prediction["status"] == "canceled":
+                    return
+                prediction |= update
+            if webhook and self.send_webhooks:
+                body = json.dumps(prediction)
+                httpx.post(webhook, content=body, headers=self.sign(body))
+
+    def cancel(self, pred_id: str) -> dict[str, Any]:
+        with self._lock:
+            self.cancelled.append(pred_id)
+            self.predictions[pred_id]["status"] = "canceled"
+            return self.predictions[pred_id]
+
+
+class _FakeReplicateHandler(BaseHTTPRequestHandler):
+    server: FakeReplicate
+
+    def _reply(self, status: int, body: dict[str, Any]) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self) -> None:  # noqa: N802
+        if self.path.endswith("/cancel"):
+            self._reply(200, self.server.cancel(self.path.split("/")[-2]))
+            return
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.created.append(body)
+        self._reply(201, self.server.create(body["version"], body.get("webhook")))
+
+    def do_GET(self) -> None:  # noqa: N802
+        self.server.polls += 1
+        self._reply(200, self.server.predictions[self.path.split("/")[-1]])
+
+    def log_message(self, *_: Any) -> None:
+        pass
+
+
+@pytest.fixture()
+def fake_replicate(monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeReplicate]:
+    server = FakeReplicate()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = replicate.Client("token", base_url=server.url)
+    client.poll_interval = 0.01
+    monkeypatch.setattr(replicate, "predictions", client.predictions)
+    monkeypatch.setattr(
+        base,
+        "fetch_model_version",
+        lambda _, version: Version(
+            id=version,
+            created_at=datetime.datetime.now(tz=datetime.UTC),
+            cog_version="",
+            openapi_schema={},
+        ),
+    )
+    yield server
+    server.shutdown()
@@ -0,0 +1,76 @@
+import asyncio
+
+from transcription_bot.transcribers.replicate.base import HedgeCallback, Hedging
+from transcription_bot.transcribers.replicate.thomasmol import (
+    ThomasmolParamsWithoutUrl,
+    ThomasmolTranscriber,
+)
+
+from tests.transcribers.replicate.conftest import OUTPUT, FakeReplicate
+
+
+def _transcriber(
+    version: str, hedging: Hedging, on_hedged: HedgeCallback | None = None
+) -> ThomasmolTranscriber:
+    return ThomasmolTranscriber(
+        version, ThomasmolParamsWithoutUrl(), hedging=hedging, on_hedged=on_hedged
+    )
+
+
+async def test_hedge_wins_when_prediction_is_stuck_starting(
+    fake_replicate: FakeReplicate,
+):
+    hedges = []
+
+    async def on_hedged(pred_id: str) -> None:
+        hedges.append(pred_id)
+
+    transcriber = _transcriber(
+        "cold", Hedging(0.1, "warm", asyncio.Semaphore(1)), on_hedged
+    )
+    pred_id = await transcriber.send_job("http://file", None)
+    result, status = await transcriber.get_result()
+    assert (result, status) == ("SPEAKER_00: Hello.", "succeeded")
+    assert fake_replicate.cancelled == [pred_id]
+    assert hedges == ["p2"]
+    assert fake_replicate.predictions["p2"]["version"] == "warm"
+    assert transcriber.raw_output == OUTPUT
+
+
+async def test_hedge_cancelled_when_prediction_finishes_first(
+    fake_replicate: FakeReplicate,
+):
+    fake_replicate.run_s = 0.3
+    # The prediction starts late, then finishes before its hedge
+    transcriber = _transcriber("warm", Hedging(0.1, "warm", asyncio.Semaphore(1)))
+    await transcriber.send_job("http://file", None)
+    _, status = await transcriber.get_result()
+    assert status == "succeeded"
+    assert fake_replicate.cancelled == ["p2"]
+
+
+async def test_no_hedge_when_prediction_starts_in_time(
+    fake_replicate: FakeReplicate,
+):
+    transcriber = _transcriber("warm", Hedging(0.2, "warm", asyncio.Semaphore(1)))
+    await transcriber.send_job("http://file", None)
+    _, status = await transcriber.get_result()
+    assert status == "succeeded"
+    assert list(fake_replicate.predictions) == ["p1"]
+
+
+async def test_hedges_capped_by_budget(fake_replicate: FakeReplicate):
+    hedging = Hedging(0.1, "cold", asyncio.Semaphore(1))
+    transcribers = [_transcriber("cold", hedging) for _ in range(3)]
+    for transcriber in transcribers:
+        await transcriber.send_job("http://file", None)
+    waits = [asyncio.create_task(t.wait()) for t in transcribers]
+    await asyncio.sleep(0.3)
+    # 3 predictions and a single hedge
+    assert len(fake_replicate.predictions) == 4
+
+    for transcriber in transcribers:
+        await transcriber.cancel(transcriber.prediction.id)  # type: ignore[union-attr]
+    await asyncio.gather(*waits)
+    # The hedge was cancelled with its prediction
+    assert len(fake_replicate.cancelled) == 4
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Any
+
+import httpx
+import pytest
+from transcription_bot.transcribers.replicate.poller import PredictionPoller
+
+
+class FakePrediction:
+    """Reloads through `statuses`, raising for any which is an exception."""
+
+    def __init__(self, pred_id: str, statuses: list[Any]) -> None:
+        self.id = pred_id
+        self.status = "starting"
+        self.statuses = statuses
+        self.reloads: list[float] = []
+
+    async def async_reload(self) -> None:
+        self.reloads.append(asyncio.get_running_loop().time())
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        self.status = status
+
+
+@pytest.fixture()
+async def poller():
+    poller = PredictionPoller(
+        starting_s=0.01, processing_s=0.05, max_backoff_s=0.2, max_requests_per_s=1000
+    )
+    poller.start()
+    yield poller
+    await poller.close()
+
+
+async def _watch(poller: PredictionPoller, prediction: FakePrediction) -> list[str]:
+    """Poll until the prediction finishes, and return the status seen by each callback."""
+    seen = []
+    done = asyncio.Event()
+
+    def callback(p: FakePrediction) -> None:
+        seen.append(p.status)
+        if p.status not in ("starting", "processing"):
+            done.set()
+
+    poller.watch(prediction, callback)  # pyright: ignore[reportArgumentType]
+    await asyncio.wait_for(done.wait(), 5)
+    return seen
+
+
+async def test_polls_until_finished(poller: PredictionPoller):
+    prediction = FakePrediction(
+        "p1", ["starting", "processing", "processing", "succeeded"]
+    )
+    assert await _watch(poller, prediction) == [
+        "starting",
+        "processing",
+        "processing",
+        "succeeded",
+    ]
+
+
+async def test_polls_processing_less_often(poller: PredictionPoller):
+    prediction = FakePrediction("p1", ["starting", "processing", "succeeded"])
+    await _watch(poller, prediction)
+    starting_gap = prediction.reloads[1] - prediction.reloads[0]
+    processing_gap = prediction.reloads[2] - prediction.reloads[1]
+    assert starting_gap < 0.05 <= processing_gap
+
+
+async def test_backs_off_after_errors(poller: PredictionPoller):
+    error = httpx.ConnectError("down")
+    prediction = FakePrediction("p1", [error, error, error, "succeeded"])
+    assert await _watch(poller, prediction) == [
+        "starting",
+        "starting",
+        "starting",
+        "succeeded",
+    ]
+    gaps = [
+        b - a for a, b in zip(prediction.reloads, prediction.reloads[1:], strict=False)
+    ]
+    assert gaps[0] < gaps[1] < gaps[2]
+
+
+async def test_shares_rate_limit():
+    poller = PredictionPoller(
+        starting_s=0, processing_s=0, max_backoff_s=0, max_requests_per_s=10
+    )
+    poller.start()
+    predictions = [FakePrediction(f"p{i}", ["succeeded"]) for i in range(20)]
+    try:
+        await asyncio.gather(*(_watch(poller, p) for p in predictions))
+    finally:
+        await poller.close()
+
+    # All are due at once, but only 10 are sent in the first second
+    reloads = sorted(p.reloads[0] for p in predictions)
+    assert reloads[9] - reloads[0] < 0.5
+    assert reloads[10] - reloads[0] >= 0.9
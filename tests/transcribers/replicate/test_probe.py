@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+from replicate.prediction import Prediction
+from transcription_bot.transcribers.replicate.probe import (
+    PROBE_PARAMS,
+    params_from_output,
+    probe,
+)
+from transcription_bot.transcribers.replicate.thomasmol import (
+    Output,
+    ThomasmolTranscriber,
+)
+
+_OUTPUT = {
+    "language": "de",
+    "num_speakers": 3,
+    "segments": [
+        {
+            "avg_logprob": -0.1,
+            "start": 0,
+            "end": 1,
+            "speaker": "SPEAKER_00",
+            "text": "Hallo.",
+            "words": [],
+        }
+    ],
+}
+
+
+class FakeProbe(ThomasmolTranscriber):
+    """Its prediction ends with `status` and `output` after `run_s`."""
+
+    def __init__(
+        self,
+        status: str = "succeeded",
+        run_s: float = 0,
+        output: dict[str, Any] | None = _OUTPUT,
+    ) -> None:
+        super().__init__("version", PROBE_PARAMS)
+        self.status = status
+        self.run_s = run_s
+        self.output = output
+        self.cancelled: list[str] = []
+
+    async def send_job(self, file_url: str, *_: Any) -> str:
+        self.prediction = SimpleNamespace(id="p1", input={"file_url": file_url})  # type: ignore[assignment]
+        return "p1"
+
+    async def wait(self, *_: Any) -> Prediction:
+        await asyncio.sleep(self.run_s)
+        output = self.output if self.status == "succeeded" else None
+        return SimpleNamespace(status=self.status, output=output)  # type: ignore[return-value]
+
+    async def cancel(self, pred_id: str) -> None:  # type: ignore[override]
+        self.cancelled.append(pred_id)
+
+
+def test_params_from_output():
+    output = Output.model_validate(_OUTPUT)
+    params = params_from_output(output)
+    assert (params.language, params.num_speakers) == ("de", None)
+    params = params_from_output(output, speakers=True)
+    assert (params.language, params.num_speakers) == ("de", 3)
+    # Other parameters keep their defaults
+    assert params.prompt == "Hello."
+
+    silent = Output(language="en", num_speakers=0, segments=[])
+    assert params_from_output(silent, speakers=True).num_speakers is None
+
+
+async def test_probe_detects_params():
+    params = await probe(FakeProbe(), "http://clip", 1, speakers=True)
+    assert params
+    assert (params.language, params.num_speakers) == ("de", 3)
+
+
+async def test_probe_accepts_segments_without_words():
+    segments_only = _OUTPUT | {
+        "segments": [
+            {k: v for k, v in segment.items() if k != "words"}
+            for segment in _OUTPUT["segments"]
+        ]
+    }
+    params = await probe(FakeProbe(output=segments_only), "http://clip", 1)
+    assert params
+    assert params.language == "de"
+
+
+async def test_probe_failure_falls_back_to_defaults():
+    assert await probe(FakeProbe("failed"), "http://clip", 1) is None
+
+
+async def test_probe_unexpected_output_falls_back_to_defaults():
+    assert await probe(FakeProbe(output={"segments": "?"}), "http://clip", 1) is None
+
+
+async def test_probe_cancelled_on_timeout():
+    transcriber = FakeProbe(run_s=1)
+    assert await probe(transcriber, "http://clip", 0.05) is None
+    assert transcriber.cancelled == ["p1"]
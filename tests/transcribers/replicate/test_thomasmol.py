@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from transcription_bot.audio.vad import OffsetMap
+from transcription_bot.transcribers.base import Timings
+from transcription_bot.transcribers.replicate.thomasmol import (
+    ThomasmolParamsWithoutUrl,
+    ThomasmolTranscriber,
+)
+
+
+def _segment(speaker: str, text: str, start: float, end: float) -> dict:
+    return {
+        "avg_logprob": -0.1,
+        "start": start,
+        "end": end,
+        "speaker": speaker,
+        "text": text,
+        "words": [{"start": start, "end": end, "probability": 0.9, "word": text}],
+    }
+
+
+_OUTPUT = {
+    "language": "en",
+    "num_speakers": 2,
+    "segments": [
+        _segment("SPEAKER_00", "Hello.", 0, 2),
+        _segment("SPEAKER_01", "Hi there.", 8, 9),
+    ],
+}
+
+
+def test_process_output():
+    transcriber = ThomasmolTranscriber("version", ThomasmolParamsWithoutUrl())
+    assert (
+        transcriber._process_output(_OUTPUT)
+        == "SPEAKER_00: Hello.\n\nSPEAKER_01: Hi there."
+    )
+
+
+def test_parse_output_maps_trimmed_timestamps():
+    transcriber = ThomasmolTranscriber(
+        "version",
+        ThomasmolParamsWithoutUrl(),
+        offset_map=OffsetMap([(10, 15), (100, 200)]),
+    )
+    segments = transcriber.parse_output(_OUTPUT)
+    assert (segments[0].start, segments[0].end) == (10, 12)
+    assert (segments[1].start, segments[1].end) == (103, 104)
+    assert (segments[1].words[0].start, segments[1].words[0].end) == (103, 104)
+
+
+def test_timings_from_prediction():
+    transcriber = ThomasmolTranscriber("version", ThomasmolParamsWithoutUrl())
+    assert transcriber.timings is None
+
+    transcriber.prediction = SimpleNamespace(  # type: ignore[assignment]
+        id="p",
+        created_at="2024-05-01T10:00:00.000000Z",
+        started_at="2024-05-01T10:00:12.500000Z",
+        metrics={"predict_time": 30.25},
+    )
+    assert transcriber.timings == Timings(queue_s=12.5, run_s=30.25)
@@ -0,0 +1,42 @@
+import pytest
+from transcription_bot.transcribers.replicate import versions
+from transcription_bot.transcribers.replicate.versions import ModelVersionCache
+
+
+@pytest.fixture()
+def fetches(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, str]]:
+    calls = []
+
+    def fake_fetch(model_name: str, version: str):
+        calls.append((model_name, version))
+        return f"{model_name}:{version}:{len(calls)}"
+
+    monkeypatch.setattr(versions, "fetch_model_version", fake_fetch)
+    return calls
+
+
+async def test_version_fetched_once_within_ttl(fetches):
+    cache = ModelVersionCache(ttl_s=60)
+    first = await cache.get("owner/model", "abc")
+    second = await cache.get("owner/model", "abc")
+    assert first == second
+    assert len(fetches) == 1
+
+
+async def test_version_refreshed_after_ttl(fetches):
+    cache = ModelVersionCache(ttl_s=0)
+    await cache.get("owner/model", "abc")
+    await cache.get("owner/model", "abc")
+    assert len(fetches) == 2
+
+
+@pytest.mark.usefixtures("fetches")
+async def test_stale_version_returned_if_refresh_fails(monkeypatch):
+    cache = ModelVersionCache(ttl_s=0)
+    first = await cache.get("owner/model", "abc")
+
+    def failing_fetch(*_: str):
+        raise ConnectionError
+
+    monkeypatch.setattr(versions, "fetch_model_version", failing_fetch)
+    assert await cache.get("owner/model", "abc") == first
@@ -0,0 +1,177 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections.abc import AsyncIterator
+
+import httpx
+import pytest
+from replicate.prediction import Prediction
+from replicate.webhook import WebhookSigningSecret
+from transcription_bot.transcribers.replicate import webhooks
+from transcription_bot.transcribers.replicate.thomasmol import (
+    ThomasmolParamsWithoutUrl,
+    ThomasmolTranscriber,
+)
+from transcription_bot.transcribers.replicate.webhooks import WebhookReceiver
+
+from tests.transcribers.replicate.conftest import FakeReplicate, prediction_json
+
+_SECRET = WebhookSigningSecret(key="whsec_" + base64.b64encode(b"secret").decode())
+
+
+def _sign(body: str, secret: WebhookSigningSecret = _SECRET) -> dict[str, str]:
+    webhook_id, timestamp = "msg_1", str(int(time.time()))
+    key = base64.b64decode(secret.key.split("_")[1])
+    digest = hmac.new(
+        key, f"{webhook_id}.{timestamp}.{body}".encode(), hashlib.sha256
+    ).digest()
+    return {
+        "webhook-id": webhook_id,
+        "webhook-timestamp": timestamp,
+        "webhook-signature": f"v1,{base64.b64encode(digest).decode()}",
+    }
+
+
+@pytest.fixture()
+def signed_replicate(fake_replicate: FakeReplicate) -> FakeReplicate:
+    fake_replicate.sign = _sign
+    return fake_replicate
+
+
+@pytest.fixture()
+async def receiver() -> AsyncIterator[WebhookReceiver]:
+    receiver = WebhookReceiver(
+        "http://127.0.0.1/replicate", "127.0.0.1", 0, _SECRET, fallback_poll_s=10
+    )
+    await receiver.start()
+    assert receiver._server
+    port = receiver._server.sockets[0].getsockname()[1]
+    receiver.url = f"http://127.0.0.1:{port}/replicate"
+    yield receiver
+    await receiver.close()
+
+
+async def test_receiver_rejects_invalid_signature(receiver: WebhookReceiver):
+    received = []
+    receiver.watch("p1", received.append)
+    body = json.dumps(prediction_json("p1", "processing"))
+    wrong = WebhookSigningSecret(key="whsec_" + base64.b64encode(b"wrong").decode())
+
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            receiver.url, content=body, headers=_sign(body, wrong)
+        )
+        assert response.status_code == 401
+        response = await client.post(receiver.url, content=body, headers=_sign(body))
+        assert response.status_code == 200
+
+    assert [p["status"] for p in received] == ["processing"]
+
+
+async def test_receiver_keeps_events_until_watched(receiver: WebhookReceiver):
+    async with httpx.AsyncClient() as client:
+        for status in ("starting", "processing"):
+            body = json.dumps(prediction_json("p1", status))
+            await client.post(receiver.url, content=body, headers=_sign(body))
+
+    received = []
+    receiver.watch("p1", received.append)
+    assert [p["status"] for p in received] == ["processing"]
+
+
+async def test_receiver_rejects_payload_without_prediction(receiver: WebhookReceiver):
+    async with httpx.AsyncClient() as client:
+        for body in ("[]", json.dumps({"status": "processing"})):
+            response = await client.post(
+                receiver.url, content=body, headers=_sign(body)
+            )
+            assert response.status_code == 400
+
+
+async def test_receiver_times_out_stalled_requests(
+    receiver: WebhookReceiver, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(webhooks, "_READ_TIMEOUT_S", 0.1)
+    assert receiver._server
+    port = receiver._server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"POST /replicate HTTP/1.1\r\nContent-Length: 10\r\n\r\n")
+    async with asyncio.timeout(5):
+        status_line = await reader.readline()
+    writer.close()
+    assert status_line.startswith(b"HTTP/1.1 408")
+
+
+async def test_result_delivered_by_webhook(
+    receiver: WebhookReceiver, signed_replicate: FakeReplicate
+):
+    transcriber = ThomasmolTranscriber(
+        "version", ThomasmolParamsWithoutUrl(), webhooks=receiver
+    )
+    logs = []
+
+    async def log_cb(progress: str) -> None:
+        logs.append(progress)
+
+    await transcriber.send_job("http://file", log_cb=log_cb)
+    result, status = await transcriber.get_result()
+
+    assert (result, status) == ("SPEAKER_00: Hello.", "succeeded")
+    assert signed_replicate.created[0]["webhook"] == receiver.url
+    assert signed_replicate.created[0]["webhook_events_filter"] == [
+        "start",
+        "output",
+        "logs",
+        "completed",
+    ]
+    assert "processing: Transcribing..." in logs
+    assert signed_replicate.polls == 0
+
+
+@pytest.mark.filterwarnings("error")
+def test_webhook_updates_only_prediction_fields():
+    transcriber = ThomasmolTranscriber("version", ThomasmolParamsWithoutUrl())
+    transcriber.prediction = Prediction(**prediction_json("p1", "starting"))
+
+    transcriber._on_webhook(
+        prediction_json("p1", "processing", logs="Transcribing...") | {"extra": 1}
+    )
+
+    assert transcriber.prediction.status == "processing"
+    assert transcriber.prediction.logs == "Transcribing..."
+    assert not hasattr(transcriber.prediction, "extra")
+
+
+async def test_polls_if_webhooks_are_lost(
+    receiver: WebhookReceiver, fake_replicate: FakeReplicate
+):
+    fake_replicate.send_webhooks = False
+    receiver.fallback_poll_s = 0.05
+    transcriber = ThomasmolTranscriber(
+        "version", ThomasmolParamsWithoutUrl(), webhooks=receiver
+    )
+
+    await transcriber.send_job("http://file", log_cb=None)
+    result, status = await transcriber.get_result()
+
+    assert (result, status) == ("SPEAKER_00: Hello.", "succeeded")
+    assert fake_replicate.polls > 0
+
+
+async def test_reattaches_to_running_prediction(
+    receiver: WebhookReceiver, signed_replicate: FakeReplicate
+):
+    # Sent before a restart
+    pred_id = signed_replicate.create("version", receiver.url)["id"]
+    transcriber = ThomasmolTranscriber(
+        "version", ThomasmolParamsWithoutUrl(), webhooks=receiver
+    )
+
+    await transcriber.attach(pred_id, log_cb=None)
+    result, status = await transcriber.get_result()
+
+    assert (result, status) == ("SPEAKER_00: Hello.", "succeeded")
+    assert signed_replicate.created == []
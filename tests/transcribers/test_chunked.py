@@ -0,0 +1,217 @@
+import asyncio
+from types import SimpleNamespace
+from typing import ClassVar
+
+import pytest
+from transcription_bot.audio.chunks import Chunk
+from transcription_bot.transcribers.chunked import (
+    ChunkedTranscriber,
+    UploadedChunk,
+    reconcile_speakers,
+    stitch,
+)
+from transcription_bot.transcribers.replicate.thomasmol import Segment
+
+
+def _segment(speaker: str, start: float, end: float, text: str = "") -> Segment:
+    return Segment(
+        avg_logprob=0, start=start, end=end, speaker=speaker, text=text, words=[]
+    )
+
+
+def test_reconcile_speakers_by_overlap():
+    previous = [_segment("SPEAKER_00", 90, 95), _segment("SPEAKER_01", 95, 100)]
+    # Labels are swapped in the next chunk
+    current = [
+        _segment("SPEAKER_01", 90, 95),
+        _segment("SPEAKER_00", 95, 100),
+        _segment("SPEAKER_02", 120, 130),
+    ]
+    mapping = reconcile_speakers(
+        previous, current, (90, 100), {"SPEAKER_00", "SPEAKER_01"}
+    )
+    assert mapping == {
+        "SPEAKER_01": "SPEAKER_00",
+        "SPEAKER_00": "SPEAKER_01",
+        "SPEAKER_02": "SPEAKER_02",
+    }
+
+
+def test_reconcile_speakers_new_labels_do_not_collide():
+    previous = [_segment("SPEAKER_00", 90, 100)]
+    current = [_segment("SPEAKER_00", 90, 100), _segment("SPEAKER_01", 110, 120)]
+    mapping = reconcile_speakers(
+        previous, current, (90, 100), {"SPEAKER_00", "SPEAKER_01"}
+    )
+    assert mapping == {"SPEAKER_00": "SPEAKER_00", "SPEAKER_01": "SPEAKER_02"}
+
+
+def test_stitch_shifts_and_deduplicates_overlap():
+    chunks = [Chunk(0, 110, 0, 100), Chunk(90, 200, 100, 200)]
+    results = [
+        [_segment("SPEAKER_00", 0, 50, "a"), _segment("SPEAKER_01", 92, 105, "b")],
+        # Relative to the start of the chunk, with swapped labels
+        [_segment("SPEAKER_00", 2, 15, "b"), _segment("SPEAKER_01", 20, 40, "c")],
+    ]
+    stitched = stitch(results, chunks)
+    assert [(s.text, s.speaker, s.start) for s in stitched] == [
+        ("a", "SPEAKER_00", 0),
+        ("b", "SPEAKER_01", 92),
+        ("c", "SPEAKER_02", 110),
+    ]
+
+
+class _FakeTranscriber:
+    running = 0
+    max_running = 0
+
+    def __init__(self) -> None:
+        self.prediction = None
+
+    async def send_job(self, file_url: str, log_cb=None) -> str:  # noqa: ARG002
+        self.prediction = SimpleNamespace(id=file_url, status="succeeded")
+        return file_url
+
+    async def attach(self, pred_id: str, log_cb=None) -> None:  # noqa: ARG002
+        self.prediction = SimpleNamespace(id=f"attached:{pred_id}", status="succeeded")
+
+    async def wait(self):
+        _FakeTranscriber.running += 1
+        _FakeTranscriber.max_running = max(
+            _FakeTranscriber.max_running, _FakeTranscriber.running
+        )
+        await asyncio.sleep(0.01)
+        _FakeTranscriber.running -= 1
+        self.prediction.output = self.prediction.id
+        return self.prediction
+
+    def parse_output(self, output: str) -> list[Segment]:
+        return [_segment("SPEAKER_00", 1, 2, output)]
+
+
+async def test_chunked_transcriber_caps_concurrency():
+    chunks = [
+        UploadedChunk(
+            f"chunk{i}", Chunk(i * 100, i * 100 + 100, i * 100, i * 100 + 100)
+        )
+        for i in range(5)
+    ]
+    transcriber = ChunkedTranscriber(_FakeTranscriber, chunks, max_concurrency=2)
+    transcriber.send_jobs(log_cb=None)
+    result, status = await transcriber.get_result()
+    assert status == "succeeded"
+    assert result
+    # Chunks do not overlap, so speakers cannot be matched across them
+    assert [line.split(": ")[1] for line in result.split("\n\n")] == [
+        f"chunk{i}" for i in range(5)
+    ]
+    assert _FakeTranscriber.max_running == 2
+
+
+async def test_chunked_transcriber_reattaches_to_sent_predictions():
+    chunks = [
+        UploadedChunk(
+            f"chunk{i}", Chunk(i * 100, i * 100 + 100, i * 100, i * 100 + 100)
+        )
+        for i in range(3)
+    ]
+    created = []
+
+    async def on_created(index: int, pred_id: str) -> None:
+        created.append((index, pred_id))
+
+    transcriber = ChunkedTranscriber(_FakeTranscriber, chunks, max_concurrency=2)
+    transcriber.send_jobs(
+        log_cb=None, predictions=["p0", None, "p2"], on_created=on_created
+    )
+    result, status = await transcriber.get_result()
+
+    assert status == "succeeded"
+    assert result
+    assert [line.split(": ")[1] for line in result.split("\n\n")] == [
+        "attached:p0",
+        "chunk1",
+        "attached:p2",
+    ]
+    assert created == [(1, "chunk1")]
+
+
+class _FailingTranscriber(_FakeTranscriber):
+    """Predictions of `chunk1` raise. Others run until cancelled."""
+
+    cancelled: ClassVar[list[str]] = []
+
+    async def wait(self):
+        if self.prediction.id == "chunk1":
+            msg = "Replicate is down"
+            raise ConnectionError(msg)
+        while self.prediction.status != "canceled":
+            await asyncio.sleep(0.01)
+        return self.prediction
+
+    async def cancel(self, pred_id: str) -> None:
+        _FailingTranscriber.cancelled.append(pred_id)
+        self.prediction.status = "canceled"
+
+
+async def test_chunked_transcriber_cancels_siblings_on_error():
+    chunks = [
+        UploadedChunk(
+            f"chunk{i}", Chunk(i * 100, i * 100 + 100, i * 100, i * 100 + 100)
+        )
+        for i in range(3)
+    ]
+    transcriber = ChunkedTranscriber(_FailingTranscriber, chunks, max_concurrency=3)
+    transcriber.send_jobs(log_cb=None)
+    with pytest.raises(ExceptionGroup):
+        await transcriber.get_result()
+    # Including the chunk whose wait raised, as its prediction may still be running
+    assert sorted(_FailingTranscriber.cancelled) == ["chunk0", "chunk1", "chunk2"]
+
+
+class _UncancellableTranscriber(_FakeTranscriber):
+    """`chunk0` succeeds, and `chunk1` fails once it did. Cancelling `chunk2` raises."""
+
+    cancelled: ClassVar[list[str]] = []
+
+    async def wait(self):
+        if self.prediction.id == "chunk1":
+            await asyncio.sleep(0.05)
+            self.prediction.status = "failed"
+        while self.prediction.status not in ("succeeded", "failed", "canceled"):
+            await asyncio.sleep(0.01)
+        self.prediction.output = (
+            self.prediction.id if self.prediction.status == "succeeded" else None
+        )
+        return self.prediction
+
+    async def send_job(self, file_url: str, log_cb=None) -> str:
+        await super().send_job(file_url, log_cb)
+        if file_url != "chunk0":
+            self.prediction.status = "processing"
+        return file_url
+
+    async def cancel(self, pred_id: str) -> None:
+        _UncancellableTranscriber.cancelled.append(pred_id)
+        self.prediction.status = "canceled"
+        msg = "Replicate is down"
+        raise ConnectionError(msg)
+
+
+async def test_chunked_transcriber_cancels_only_running_predictions(
+    caplog: pytest.LogCaptureFixture,
+):
+    chunks = [
+        UploadedChunk(
+            f"chunk{i}", Chunk(i * 100, i * 100 + 100, i * 100, i * 100 + 100)
+        )
+        for i in range(3)
+    ]
+    transcriber = ChunkedTranscriber(
+        _UncancellableTranscriber, chunks, max_concurrency=3
+    )
+    transcriber.send_jobs(log_cb=None)
+    # The failure to cancel is logged, rather than replacing the chunk's failure
+    assert await transcriber.get_result() == (None, "failed")
+    assert _UncancellableTranscriber.cancelled == ["chunk2"]
+    assert "Failed to cancel prediction chunk2" in caplog.text
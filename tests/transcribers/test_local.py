@@ -0,0 +1,80 @@
+import multiprocessing
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from transcription_bot.audio.vad import OffsetMap
+from transcription_bot.transcribers.local import LocalTranscriber, make_pool
+from transcription_bot.transcribers.replicate.thomasmol import Output, Segment, Word
+
+
+class StubEngine:
+    """Transcribes `audio` as its own text, one second long, in `language`. Sleeps first if it starts with 'slow'."""
+
+    def transcribe(self, audio: str, language: str | None = None) -> Output:
+        if audio.startswith("slow"):
+            time.sleep(0.5)
+        if audio == "broken":
+            msg = "Cannot decode audio"
+            raise ValueError(msg)
+        return Output(
+            language=language or "en",
+            num_speakers=1,
+            segments=[
+                Segment(
+                    avg_logprob=-0.1,
+                    start=0,
+                    end=1,
+                    speaker="SPEAKER_00",
+                    text=audio,
+                    words=[Word(start=0, end=1, probability=0.9, word=audio)],
+                )
+            ],
+        )
+
+
+@pytest.fixture()
+def pool() -> Iterator[ProcessPoolExecutor]:
+    # Forked, so the workers can unpickle the stub engine defined in this module
+    pool = make_pool(StubEngine, 1, multiprocessing.get_context("fork"))
+    yield pool
+    pool.shutdown(cancel_futures=True)
+
+
+async def test_transcribes_in_pool(pool: ProcessPoolExecutor):
+    logs = []
+
+    async def log_cb(text: str) -> None:
+        logs.append(text)
+
+    transcriber = LocalTranscriber(pool, OffsetMap([(10, 20)]))
+    await transcriber.send_job("hello", log_cb)
+    assert await transcriber.get_result() == ("SPEAKER_00: hello", "succeeded")
+    assert logs
+    assert transcriber.raw_output["segments"][0]["text"] == "hello"
+    assert transcriber.timings
+    # Timestamps are mapped back to the original file
+    [segment] = transcriber.parse_output(transcriber.raw_output)
+    assert (segment.start, segment.end) == (10, 11)
+
+
+async def test_cancel_discards_result(pool: ProcessPoolExecutor):
+    transcriber = LocalTranscriber(pool)
+    pred_id = await transcriber.send_job("slow", None)
+    await LocalTranscriber.cancel(pred_id)
+    assert await transcriber.get_result() == (None, "canceled")
+
+
+async def test_engine_error_fails_job(pool: ProcessPoolExecutor):
+    transcriber = LocalTranscriber(pool)
+    await transcriber.send_job("broken", None)
+    assert await transcriber.get_result() == (None, "failed")
+    assert transcriber.timings is None
+
+
+async def test_transcribes_in_job_language(pool: ProcessPoolExecutor):
+    transcriber = LocalTranscriber(pool, language="fr")
+    await transcriber.send_job("bonjour", None)
+    await transcriber.get_result()
+    assert transcriber.raw_output["language"] == "fr"
@@ -0,0 +1,87 @@
+import pytest
+from transcription_bot.transcribers import router as router_module
+from transcription_bot.transcribers.base import Timings
+from transcription_bot.transcribers.router import BackendRouter
+
+
+def test_meetings_use_thomasmol():
+    router = BackendRouter(fast_max_s=300)
+    router.record("thomasmol", 60, Timings(queue_s=100, run_s=60))
+    assert router.choose(3600) == "thomasmol"
+    assert router.choose(None) == "thomasmol"
+    # Voice notes have a single speaker, however long
+    assert router.choose(3600, voice=True) == "fast_whisper"
+
+
+def test_fast_backend_disabled():
+    router = BackendRouter(fast_max_s=None)
+    assert router.choose(10, voice=True) == "thomasmol"
+
+
+def test_routes_short_clips_to_faster_backend():
+    router = BackendRouter(fast_max_s=300)
+    router.record("thomasmol", 60, Timings(queue_s=2, run_s=30))
+    router.record("fast_whisper", 60, Timings(queue_s=20, run_s=6))
+    # 2 + 0.5 * 30 < 20 + 0.1 * 30
+    assert router.choose(30) == "thomasmol"
+    # 2 + 0.5 * 240 > 20 + 0.1 * 240
+    assert router.choose(240) == "fast_whisper"
+
+
+def test_untried_backend_is_tried():
+    router = BackendRouter(fast_max_s=300)
+    router.record("thomasmol", 60, Timings(queue_s=2, run_s=30))
+    assert router.choose(30) == "fast_whisper"
+
+
+def test_moving_average():
+    router = BackendRouter(fast_max_s=300, alpha=0.5)
+    router.record("thomasmol", 10, Timings(queue_s=10, run_s=10))
+    router.record("thomasmol", 10, Timings(queue_s=20, run_s=30))
+    assert router.estimate("thomasmol", 10) == 15 + 2 * 10
+
+
+def test_only_short_recordings_are_transcribed_locally():
+    router = BackendRouter(fast_max_s=None, local_max_s=60)
+    router.record("thomasmol", 60, Timings(queue_s=10, run_s=30))
+    assert router.choose(30) == "local"
+    assert router.choose(120, voice=True) == "thomasmol"
+
+
+def test_long_voice_notes_capped():
+    router = BackendRouter(fast_max_s=300, fast_voice_max_s=1800)
+    router.record("thomasmol", 60, Timings(queue_s=100, run_s=60))
+    assert router.choose(1800, voice=True) == "fast_whisper"
+    assert router.choose(1801, voice=True) == "thomasmol"
+
+
+def test_backend_not_tried_for_a_while_is_tried_again(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    now = 1000.0
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: now)
+    router = BackendRouter(fast_max_s=300, explore_s=600)
+    # A cold start made thomasmol look slow: 30 + 0.5 * 60 > 2 + 0.1 * 60
+    router.record("thomasmol", 60, Timings(queue_s=30, run_s=30))
+    router.record("fast_whisper", 60, Timings(queue_s=2, run_s=6))
+    assert router.choose(60) == "fast_whisper"
+
+    now += 599
+    router.record("fast_whisper", 60, Timings(queue_s=2, run_s=6))
+    assert router.choose(60) == "fast_whisper"
+    now += 1
+    assert router.choose(60) == "thomasmol"
+    # Once per interval
+    assert router.choose(60) == "fast_whisper"
+
+
+def test_much_slower_backend_not_tried_again(monkeypatch: pytest.MonkeyPatch):
+    now = 1000.0
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: now)
+    router = BackendRouter(fast_max_s=300, explore_s=600, explore_max_extra_s=60)
+    # 100 + 0.5 * 60 > 2 + 0.1 * 60 + 60
+    router.record("thomasmol", 60, Timings(queue_s=100, run_s=30))
+    router.record("fast_whisper", 60, Timings(queue_s=2, run_s=6))
+    now += 600
+    assert router.choose(60) == "fast_whisper"
+    assert router.choose(60) == "fast_whisper"
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+from transcription_bot.workers.queue import QueuedJob, SqliteJobQueue
+
+
+@pytest.fixture()
+def queue(tmp_path: Path) -> SqliteJobQueue:
+    return SqliteJobQueue(tmp_path / "queue.sqlite3")
+
+
+async def test_jobs_are_claimed_once_in_order(tmp_path: Path, queue: SqliteJobQueue):
+    other_process = SqliteJobQueue(tmp_path / "queue.sqlite3")
+    for i in range(3):
+        await queue.put(QueuedJob(f"1:{i}", 1, i, i + 100))
+
+    first = await queue.claim("a")
+    second = await other_process.claim("b")
+    third = await queue.claim("a")
+
+    assert [j.id for j in (first, second, third) if j] == ["1:0", "1:1", "1:2"]
+    assert await queue.claim("b") is None
+
+
+async def test_release_returns_claimed_jobs(queue: SqliteJobQueue):
+    await queue.put(QueuedJob("1:1", 1, 1, 2))
+    await queue.claim("a")
+
+    await queue.release("b")
+    assert await queue.claim("b") is None
+    await queue.release("a")
+    assert await queue.claim("b") == QueuedJob("1:1", 1, 1, 2)
+
+
+async def test_events_until_acknowledged(queue: SqliteJobQueue):
+    await queue.publish("1:1", {"op": "edit", "text": "a"})
+    await queue.publish("1:2", {"op": "done"})
+
+    events = await queue.events(limit=10)
+    assert [(job_id, event) for _, job_id, event in events] == [
+        ("1:1", {"op": "edit", "text": "a"}),
+        ("1:2", {"op": "done"}),
+    ]
+
+    await queue.ack([events[0][0]])
+    assert [job_id for _, job_id, _ in await queue.events(limit=10)] == ["1:2"]
+
+
+async def test_callbacks_are_taken_by_job(queue: SqliteJobQueue):
+    await queue.send_callback("1:1", "a")
+    await queue.send_callback("1:2", "b")
+    await queue.send_callback("1:1", "c")
+
+    assert await queue.take_callbacks(["1:1"]) == [("1:1", "a"), ("1:1", "c")]
+    assert await queue.take_callbacks(["1:1"]) == []
+    assert await queue.take_callbacks(["1:2"]) == [("1:2", "b")]
@@ -0,0 +1,95 @@
+import asyncio
+import io
+import itertools
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+from telethon import Button
+from transcription_bot.handlers import cancel
+from transcription_bot.handlers.edits import EditScheduler
+from transcription_bot.workers.frontend import Relay
+from transcription_bot.workers.queue import SqliteJobQueue
+from transcription_bot.workers.remote import RemoteMessage
+
+_ids = itertools.count(1000)
+
+
+class FakeMessage:
+    def __init__(self, text: str = "", **kwargs: Any) -> None:
+        self.chat_id = 1
+        self.id = next(_ids)
+        self.text = text
+        self.kwargs = kwargs
+        self.replies: list[FakeMessage] = []
+        self.deleted = False
+
+    async def edit(self, text: str, **_: Any) -> None:
+        self.text = text
+
+    async def reply(self, text: str, **kwargs: Any) -> "FakeMessage":
+        reply = FakeMessage(text, **kwargs)
+        self.replies.append(reply)
+        return reply
+
+    async def delete(self) -> None:
+        self.deleted = True
+
+
+@pytest.fixture()
+async def edits() -> AsyncIterator[EditScheduler]:
+    edits = EditScheduler(rate_per_s=1000, chat_rate_per_s=1000)
+    edits.start()
+    yield edits
+    await edits.close()
+
+
+async def test_worker_events_are_applied_by_frontend(
+    tmp_path: Path, edits: EditScheduler
+):
+    queue = SqliteJobQueue(tmp_path / "queue.sqlite3")
+    relay = Relay(queue, edits, poll_s=0.01)
+    message, reply_msg = FakeMessage("file"), FakeMessage("Processing...")
+    await relay.enqueue(message, reply_msg)  # type: ignore[arg-type]
+    job = await queue.claim("worker")
+    assert job
+
+    # In the worker
+    file = io.BytesIO(b"transcript")
+    file.name = "recording.txt"
+    remote_msg = RemoteMessage(queue, job.id, job.chat_id, job.message_id)
+    remote_reply = RemoteMessage(queue, job.id, job.chat_id, job.reply_msg_id)
+    await remote_reply.edit("Transcribing...", parse_mode="html")
+    cancel_msg = await remote_reply.reply(
+        "Transcribing...", buttons=[Button.inline("Cancel", "worker-token")]
+    )
+    await remote_msg.reply(file=file)
+    await cancel_msg.delete()
+
+    relay_task = asyncio.create_task(relay.run(None))  # type: ignore[arg-type]
+    for _ in range(100):
+        if not await queue.events(limit=1):
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+
+    assert reply_msg.text == "Transcribing..."
+    [shown_cancel] = reply_msg.replies
+    assert shown_cancel.deleted
+    [sent_file] = message.replies
+    assert sent_file.kwargs["file"].name == "recording.txt"
+    assert sent_file.kwargs["file"].read() == b"transcript"
+
+    # Pressing the button in the front-end sends its data to the worker
+    token = list(cancel._cancel_callbacks)[-1]
+    await cancel.cancel_job(token)
+    assert await queue.take_callbacks([job.id]) == [(job.id, "worker-token")]
+
+    await queue.publish(job.id, {"op": "done"})
+    for _ in range(100):
+        if not await queue.get(job.id):
+            break
+        await asyncio.sleep(0.01)
+    assert await queue.get(job.id) is None
+    relay_task.cancel()